@@ -0,0 +1,88 @@
+"""
+get_current_user per call: with the token and user caches warm, with a cold
+user cache (one identity query), and with no caching at all (JWT decode and
+a full User load, as before the caches). Also times GET /api/auth/me, which
+reads the profile from the database on every call. Drops and rebuilds the
+schema of BENCH_DATABASE_URL; run from the backend directory:
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/dhyan_bench python benchmarks/auth_dependency.py
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+os.environ["RATE_LIMIT_STORAGE_URI"] = "memory://"
+os.environ["PRELOAD_ON_START"] = "false"
+sys.path.insert(0, os.getcwd())
+
+from sqlalchemy import text
+from fastapi.security import HTTPAuthorizationCredentials
+from fastapi.testclient import TestClient
+from database import SessionLocal, engine
+import migrations
+import main
+from models.user import User
+from routers.auth import get_current_user
+from services import auth_service
+from services.auth_service import create_access_token, decode_token
+
+RUNS = 2000
+
+
+def seed() -> int:
+    with engine.connect() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public"))
+        conn.commit()
+    migrations.migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO users (email, name, phone, pan_number, city, is_active, is_admin)
+            SELECT 'u' || i || '@example.com', 'User ' || i, '9876543210', 'ABCDE1234F', 'Guwahati', true, false
+            FROM generate_series(1, 10000) i
+        """))
+        conn.execute(text("ANALYZE"))
+    return 5000
+
+
+def per_call(fn, runs=RUNS) -> float:
+    """Median microseconds per call over batches of 100."""
+    batches = []
+    for _ in range(runs // 100):
+        started = time.perf_counter()
+        for _ in range(100):
+            fn()
+        batches.append((time.perf_counter() - started) / 100)
+    return statistics.median(batches) * 1e6
+
+
+def uncached(token: str):
+    payload = decode_token(token)
+    with SessionLocal() as db:
+        return db.get(User, int(payload["sub"]))
+
+
+if __name__ == "__main__":
+    user_id = seed()
+    token = create_access_token({"sub": str(user_id)})
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    loop = asyncio.new_event_loop()
+
+    def dependency():
+        return loop.run_until_complete(get_current_user(credentials))
+
+    def cold_user_cache():
+        auth_service._user_cache.clear()
+        return dependency()
+
+    dependency()
+    print(f"get_current_user, caches warm: {per_call(dependency, 20_000):.1f} us")
+    print(f"get_current_user, user cache cold: {per_call(cold_user_cache):.1f} us")
+    print(f"jose decode + full User load (no caches): {per_call(lambda: uncached(token)):.1f} us")
+    with TestClient(main.app) as client:
+        headers = {"Authorization": f"Bearer {token}"}
+        me = per_call(lambda: client.get("/api/auth/me", headers=headers), 500)
+        print(f"GET /api/auth/me (profile read fresh): {me:.0f} us, "
+              f"{client.get('/api/auth/me', headers=headers).headers['X-DB-Queries']} queries")
@@ -0,0 +1,76 @@
+"""
+CPU time and PDF bytes per certificate over a batch of CERTIFICATES (default
+10,000) renders with a normalised logo and signature, as the batch resend
+and the receipt export produce them, and per text-only certificate.
+
+Each certificate has its own donation id, name and amount, so nothing but the
+shared images and static blocks can be reused. The images are normalised
+into certificate storage in a temporary directory, and the template refers
+to them by key as an uploaded one does. The database is not touched;
+run from the backend directory:
+
+    python benchmarks/certificate_batch.py
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+os.environ["CERTIFICATE_DIR"] = tempfile.mkdtemp()
+sys.path.insert(0, os.getcwd())
+
+from PIL import Image, ImageDraw
+from services import image_service
+from services.certificate_service import render_80g_certificate
+
+CERTIFICATES = int(os.environ.get("CERTIFICATES", 10_000))
+TEXT_ONLY = 1000
+
+
+def make_images(directory: Path) -> tuple[str, str]:
+    logo = directory / "logo.png"
+    img = Image.new("RGB", (1200, 400), "white")
+    draw = ImageDraw.Draw(img)
+    for i in range(0, 1200, 40):
+        draw.ellipse((i, 100, i + 160, 300), outline=(255, 107, 0), width=6)
+    img.save(logo)
+    signature = directory / "signature.png"
+    img = Image.new("RGBA", (900, 300), (0, 0, 0, 0))
+    ImageDraw.Draw(img).line([(x, 150 + (x * 37) % 120 - 60) for x in range(0, 900, 15)], fill=(20, 20, 80, 255), width=5)
+    img.save(signature)
+    return image_service.normalize_image(logo, "logo"), image_service.normalize_image(signature, "signature")
+
+
+def donor(i: int) -> dict:
+    return dict(
+        donation_id=i, donor_name=f"Donor {i}", donor_pan="ABCDE1234F", donor_father_name="",
+        donor_address=f"{i} MG Road", donor_city="Guwahati", donor_state="Assam", donor_pincode="781001",
+        donor_email=f"donor{i}@example.com", donor_phone="9876543210", amount=500 + i % 997,
+        transaction_id=f"pay_{i}", gateway="RAZORPAY", donation_date=datetime(2025, 4, 1) + timedelta(minutes=i),
+        cause="GAUSEWA",
+    )
+
+
+def batch(template, count: int) -> tuple[float, int, float]:
+    """(CPU ms per certificate, total PDF bytes, wall seconds)"""
+    render_80g_certificate(template=template, **donor(0))  # encode the images and record static blocks
+    cpu, wall, total = time.process_time(), time.perf_counter(), 0
+    for i in range(1, count + 1):
+        total += len(render_80g_certificate(template=template, **donor(i)))
+    return (time.process_time() - cpu) / count * 1000, total, time.perf_counter() - wall
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        logo, signature = make_images(Path(tmp))
+        template = SimpleNamespace(logo_path=logo, signature_path=signature)
+        size = lambda key: image_service.image_file(key).stat().st_size / 1024
+        print(f"logo {size(logo):.0f} KiB, signature {size(signature):.0f} KiB")
+        cpu, total, wall = batch(template, CERTIFICATES)
+        print(f"{CERTIFICATES} certificates: {cpu:.1f} ms CPU/cert, {total / CERTIFICATES / 1024:.1f} KiB/cert, "
+              f"{total / 1024 ** 2:.0f} MiB total, {wall:.0f} s wall")
+        cpu, total, _ = batch(None, TEXT_ONLY)
+        print(f"text only: {cpu:.1f} ms CPU/cert, {total / TEXT_ONLY / 1024:.1f} KiB/cert")
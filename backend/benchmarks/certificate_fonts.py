@@ -0,0 +1,90 @@
+"""
+Render time and PDF size for a certificate with a Hindi donor name and a ₹
+amount, with the fonts in font_dir (backend/fonts).
+
+Cold is the first render in a fresh process, imports excluded: font
+registration and the first subsets are built then. Warm renders repeat one
+name, or use a new name each time (new subset character sets). A Latin-only
+name with the fonts configured, and one with an empty font_dir, give the
+baselines. The database is not touched; run from the backend directory:
+
+    python benchmarks/certificate_fonts.py
+"""
+import itertools
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.getcwd())
+
+COLD_RUNS = 5
+RUNS = 200
+HINDI_NAME = "राम कुमार शर्मा"
+FIRST = ["राम", "सीता", "अर्जुन", "प्रिया", "विकास", "अनीता", "सुरेश", "कविता", "दीपक", "श्रुति"]
+LAST = ["शर्मा", "वर्मा", "त्रिपाठी", "मिश्रा", "द्विवेदी", "चतुर्वेदी", "श्रीवास्तव", "पाण्डेय"]
+
+
+def donor(name: str, i: int = 1) -> dict:
+    return dict(
+        donation_id=i, donor_name=name, donor_pan="ABCDE1234F", donor_father_name="",
+        donor_address="12 MG Road", donor_city="Guwahati", donor_state="Assam", donor_pincode="781001",
+        donor_email="donor@example.com", donor_phone="9876543210", amount=5000, transaction_id=f"pay_{i}",
+        gateway="RAZORPAY", donation_date=datetime(2025, 4, 1), cause="GAUSEWA",
+    )
+
+
+def median_ms(render, donors) -> tuple[float, int]:
+    """(median ms, size of the last PDF)"""
+    times = []
+    for args in itertools.islice(donors, RUNS):
+        started = time.perf_counter()
+        pdf = render(**args)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1000, len(pdf)
+
+
+def child(mode: str) -> None:
+    import services.certificate_layout  # noqa: F401 (ReportLab imports are not part of the render)
+    from services.certificate_service import render_80g_certificate
+    if mode == "--cold":
+        started = time.perf_counter()
+        pdf = render_80g_certificate(**donor(HINDI_NAME))
+        print(f"{(time.perf_counter() - started) * 1000:.1f} {len(pdf)}")
+    else:  # --no-fonts
+        render_80g_certificate(**donor("Asha Das"))
+        ms, size = median_ms(render_80g_certificate, itertools.repeat(donor("Asha Das")))
+        print(f"{ms:.2f} {size}")
+
+
+def run_child(mode: str, env: dict | None = None) -> tuple[float, int]:
+    out = subprocess.run([sys.executable, __file__, mode], capture_output=True, text=True, check=True,
+                         env={**os.environ, **(env or {})}).stdout.split()
+    return float(out[0]), int(out[1])
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] in (["--cold"], ["--no-fonts"]):
+        child(sys.argv[1])
+        sys.exit()
+    from services.certificate_service import render_80g_certificate
+    from services.fonts import registered_families
+    print(f"font_dir families: {', '.join(registered_families()) or 'none'}")
+
+    cold = [run_child("--cold") for _ in range(COLD_RUNS)]
+    print(f"cold, first render in a fresh process: {min(ms for ms, _ in cold):.0f}-{max(ms for ms, _ in cold):.0f} ms, "
+          f"PDF {cold[0][1] / 1024:.1f} KiB")
+    render_80g_certificate(**donor(HINDI_NAME))
+    ms, size = median_ms(render_80g_certificate, itertools.repeat(donor(HINDI_NAME)))
+    print(f"warm, same name: {ms:.2f} ms, PDF {size / 1024:.1f} KiB")
+    names = (f"{first} {middle} {last}" for last, first, middle in itertools.product(LAST, FIRST, FIRST) if first != middle)
+    ms, _ = median_ms(render_80g_certificate, (donor(name, i) for i, name in enumerate(names)))
+    print(f"warm, new names each time: {ms:.2f} ms")
+    ms, size = median_ms(render_80g_certificate, itertools.repeat(donor("Asha Das")))
+    print(f"Latin-only name, fonts configured: {ms:.2f} ms, PDF {size / 1024:.1f} KiB")
+    with tempfile.TemporaryDirectory() as empty:
+        ms, size = run_child("--no-fonts", {"FONT_DIR": empty})
+    print(f"Latin-only name, empty font_dir: {ms:.2f} ms, PDF {size / 1024:.1f} KiB")
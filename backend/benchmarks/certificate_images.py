@@ -0,0 +1,82 @@
+"""
+Certificate render time and PDF size with a ~5 MB logo and signature, as
+uploaded and after normalize_image.
+
+Generates a 3300x2200 JPEG logo and an RGBA noise PNG signature, normalises
+both (into certificate storage, in a temporary directory), then renders a certificate with the logo alone and with both images.
+The cold render is the first with an image (its XObject is encoded then);
+warm is the median of RUNS renders once it is cached. The database is not
+touched; run from the backend directory:
+
+    python benchmarks/certificate_images.py
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+os.environ["CERTIFICATE_DIR"] = tempfile.mkdtemp()
+sys.path.insert(0, os.getcwd())
+
+from PIL import Image, ImageFilter
+from services import image_service
+from services.certificate_layout import _image_xobject
+from services.certificate_service import render_80g_certificate
+
+RUNS = 10
+DONOR = dict(
+    donation_id=1, donor_name="Asha Das", donor_pan="ABCDE1234F", donor_father_name="Ramesh Das",
+    donor_address="12 MG Road", donor_city="Guwahati", donor_state="Assam", donor_pincode="781001",
+    donor_email="asha@example.com", donor_phone="9876543210", amount=5000, transaction_id="pay_1",
+    gateway="RAZORPAY", donation_date=datetime(2025, 4, 1), cause="GAUSEWA",
+)
+
+
+def make_images(directory: Path) -> tuple[Path, Path]:
+    logo = directory / "logo.jpg"
+    noise = Image.frombytes("RGB", (3300, 2200), os.urandom(3300 * 2200 * 3)).filter(ImageFilter.BoxBlur(1))
+    noise.save(logo, "JPEG", quality=95)
+    signature = directory / "signature.png"
+    Image.frombytes("RGBA", (1150, 1150), os.urandom(1150 * 1150 * 4)).save(signature, "PNG")
+    return logo, signature
+
+
+def render(template) -> tuple[float, float, int]:
+    """(cold ms, warm median ms, PDF bytes)"""
+    _image_xobject.cache_clear()
+    started = time.perf_counter()
+    pdf = render_80g_certificate(template=template, **DONOR)
+    cold = time.perf_counter() - started
+    times = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        render_80g_certificate(template=template, **DONOR)
+        times.append(time.perf_counter() - started)
+    return cold * 1000, statistics.median(times) * 1000, len(pdf)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        logo, signature = make_images(Path(tmp))
+        started = time.perf_counter()
+        logo_key = image_service.normalize_image(logo, "logo")
+        signature_key = image_service.normalize_image(signature, "signature")
+        normalising = (time.perf_counter() - started) / 2 * 1000
+
+        small_logo, small_signature = image_service.image_file(logo_key), image_service.image_file(signature_key)
+        render(None)  # imports, fonts and static blocks
+        size = lambda path: f"{path.stat().st_size / 1024:.0f} KiB"
+        cases = [
+            (f"logo as uploaded ({size(logo)})", logo, None),
+            (f"logo normalised ({size(small_logo)})", logo_key, None),
+            (f"+ signature as uploaded ({size(signature)})", logo, signature),
+            (f"+ signature normalised ({size(small_signature)})", logo_key, signature_key),
+        ]
+        for label, logo_path, signature_path in cases:
+            cold, warm, pdf = render(SimpleNamespace(logo_path=str(logo_path), signature_path=signature_path and str(signature_path)))
+            print(f"{label:<36} cold {cold:7.0f} ms, warm {warm:6.1f} ms, PDF {pdf / 1024:7.0f} KiB")
+        print(f"normalize_image: {normalising:.0f} ms per image")
@@ -0,0 +1,107 @@
+"""
+Requests per second for POST /api/donations/create-order with a mocked
+Razorpay gateway, at 1, 50 and 200 concurrent clients.
+
+The app runs under uvicorn in a child process with razorpay_service.create_order
+replaced by a stub (GATEWAY_LATENCY_MS, default 0, simulates the gateway
+round trip) and the create-order rate limit lifted. Each client sends
+requests back to back for DURATION seconds over its own keep-alive
+connection. Drops and rebuilds the schema of BENCH_DATABASE_URL; run from the
+backend directory:
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/dhyan_bench python benchmarks/create_order_load.py
+"""
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+os.environ["RATE_LIMIT_STORAGE_URI"] = "memory://"
+os.environ["RATE_LIMIT_CREATE_ORDER"] = "1000000/minute"
+os.environ["PRELOAD_ON_START"] = "false"
+sys.path.insert(0, os.getcwd())
+
+PORT = 8765
+CLIENTS = (1, 50, 200)
+DURATION = 10
+GATEWAY_LATENCY = int(os.environ.get("GATEWAY_LATENCY_MS", 0)) / 1000
+ORDER = {"amount": 500, "donor": {"name": "Asha Das", "email": "donor@example.com", "phone": "9876543210"}}
+
+
+def seed() -> None:
+    from sqlalchemy import text
+    from database import engine
+    import migrations
+    with engine.connect() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public"))
+        conn.commit()
+    migrations.migrate(engine)
+
+
+def serve() -> None:
+    import itertools
+    import uvicorn
+    from services import razorpay_service
+    ids = itertools.count()
+
+    def create_order(**kwargs):
+        time.sleep(GATEWAY_LATENCY)
+        return {"id": f"order_{next(ids)}"}
+
+    razorpay_service.create_order = create_order
+    uvicorn.run("main:app", port=PORT, log_level="warning", access_log=False)
+
+
+async def load(clients: int) -> tuple[int, int, list[float]]:
+    import httpx
+    ok = failed = 0
+    latencies: list[float] = []
+    deadline = time.perf_counter() + DURATION
+
+    async def client():
+        nonlocal ok, failed
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=30) as http:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = await http.post("/api/donations/create-order", json=ORDER)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code == 200:
+                    ok += 1
+                else:
+                    failed += 1
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return ok, failed, sorted(latencies)
+
+
+async def wait_for_server() -> None:
+    import httpx
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}") as http:
+        for _ in range(100):
+            try:
+                await http.get("/health")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--serve"]:
+        serve()
+        sys.exit()
+    seed()
+    server = subprocess.Popen([sys.executable, __file__, "--serve"])
+    try:
+        asyncio.run(wait_for_server())
+        print(f"create-order, gateway stub latency {GATEWAY_LATENCY * 1000:.0f} ms, {DURATION}s per run")
+        for clients in CLIENTS:
+            ok, failed, latencies = asyncio.run(load(clients))
+            print(f"{clients:4} clients: {ok / DURATION:7.1f} req/s, p50 {statistics.median(latencies) * 1000:6.1f} ms, "
+                  f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:6.1f} ms, {failed} failed")
+    finally:
+        server.terminate()
+        server.wait()
@@ -0,0 +1,83 @@
+"""
+/api/donations/history for a donor with many donations.
+
+Seeds HISTORY_DONATIONS (default 10,000) donations for one user among ten
+times as many for others, then times the first page, an If-None-Match
+revalidation (304) and a walk over every page. Drops and rebuilds the schema
+of BENCH_DATABASE_URL; run from the backend directory:
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/dhyan_bench python benchmarks/history.py
+"""
+import os
+import statistics
+import sys
+import time
+
+os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+os.environ["RATE_LIMIT_STORAGE_URI"] = "memory://"
+os.environ["PRELOAD_ON_START"] = "false"
+sys.path.insert(0, os.getcwd())
+
+from sqlalchemy import text
+from fastapi.testclient import TestClient
+from database import engine
+import migrations
+import main
+from services.auth_service import create_access_token
+
+DONATIONS = int(os.environ.get("HISTORY_DONATIONS", 10_000))
+RUNS = 30
+
+
+def seed() -> int:
+    with engine.connect() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public"))
+        conn.commit()
+    migrations.migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (email, is_active, is_admin) SELECT 'u' || i || '@example.com', true, false FROM generate_series(1, 50) i"))
+        conn.execute(text("""
+            INSERT INTO donations (user_id, donor_name, donor_email, donor_phone, amount_paise, cause, gateway, status, created_at)
+            SELECT CASE WHEN i % 11 = 0 THEN 1 ELSE 2 + i % 49 END, 'Donor', 'd@example.com', '9876543210',
+                   50000 + i % 997, (ARRAY['GAUSEWA','MEDICAL','FEED','RESCUE','GENERAL'])[1 + i % 5]::donationcause,
+                   'RAZORPAY', CASE WHEN i % 10 = 0 THEN 'FAILED' ELSE 'SUCCESS' END::donationstatus,
+                   now() - (11 * :n - i) * interval '6 hours'
+            FROM generate_series(1, 11 * :n) i
+        """), {"n": DONATIONS})
+        # What migration 5 backfills for existing data
+        conn.execute(text("""
+            INSERT INTO donor_summaries (user_id, financial_year, cause, donation_count, amount_paise)
+            SELECT user_id, EXTRACT(YEAR FROM (created_at AT TIME ZONE 'Asia/Kolkata') - INTERVAL '3 months')::int,
+                   cause, count(*), sum(amount_paise)
+            FROM donations WHERE status = 'SUCCESS' GROUP BY 1, 2, 3
+        """))
+        conn.execute(text("ANALYZE"))
+    return 1
+
+
+def timed(client, **kwargs):
+    times = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        response = client.get("/api/donations/history", **kwargs)
+        times.append(time.perf_counter() - started)
+    return response, statistics.median(times) * 1000
+
+
+if __name__ == "__main__":
+    user_id = seed()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+    with TestClient(main.app) as client:
+        page, ms = timed(client, headers=headers)
+        print(f"{DONATIONS} donations, first page: {ms:.1f} ms median, {len(page.content) / 1024:.1f} KiB, "
+              f"{page.headers['X-DB-Queries']} queries")
+        revalidated, ms = timed(client, headers={**headers, "If-None-Match": page.headers["ETag"]})
+        print(f"revalidation: {revalidated.status_code} in {ms:.1f} ms median, {revalidated.headers['X-DB-Queries']} queries")
+        started, pages, before = time.perf_counter(), 0, None
+        while True:
+            params = {"limit": 100, **({"before": before} if before else {})}
+            before = client.get("/api/donations/history", params=params, headers=headers).json()["next_before"]
+            pages += 1
+            if before is None:
+                break
+        print(f"all {pages} pages of 100: {(time.perf_counter() - started) * 1000:.0f} ms")
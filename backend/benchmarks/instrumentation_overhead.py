@@ -0,0 +1,104 @@
+"""
+What the request instrumentation costs: one labelled Prometheus observation,
+and GET /health/live and GET /api/donations/history through main.app compared
+with the same routes and CORS middleware without instrument_request and
+ProfilingMiddleware. Drops and rebuilds the schema of BENCH_DATABASE_URL; run
+from the backend directory:
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/dhyan_bench python benchmarks/instrumentation_overhead.py
+"""
+import os
+import statistics
+import sys
+import time
+
+os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+os.environ["RATE_LIMIT_STORAGE_URI"] = "memory://"
+os.environ["PRELOAD_ON_START"] = "false"
+sys.path.insert(0, os.getcwd())
+
+from sqlalchemy import text
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.testclient import TestClient
+from database import async_engine, engine
+import metrics
+import migrations
+import main
+from services.auth_service import create_access_token
+
+RUNS = 2000
+ROUNDS = 3
+
+
+def seed() -> int:
+    with engine.connect() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public"))
+        conn.commit()
+    migrations.migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (email, is_active, is_admin) VALUES ('donor@example.com', true, false)"))
+        conn.execute(text("""
+            INSERT INTO donations (user_id, donor_name, donor_email, donor_phone, amount_paise, cause, gateway, status, created_at)
+            SELECT 1, 'Donor', 'donor@example.com', '9876543210', 50000 + i, 'GAUSEWA', 'RAZORPAY', 'SUCCESS',
+                   now() - i * interval '1 day'
+            FROM generate_series(1, 100) i
+        """))
+        conn.execute(text("""
+            INSERT INTO donor_summaries (user_id, financial_year, cause, donation_count, amount_paise)
+            SELECT user_id, EXTRACT(YEAR FROM (created_at AT TIME ZONE 'Asia/Kolkata') - INTERVAL '3 months')::int,
+                   cause, count(*), sum(amount_paise)
+            FROM donations GROUP BY 1, 2, 3
+        """))
+        conn.execute(text("ANALYZE"))
+    return 1
+
+
+def uninstrumented() -> FastAPI:
+    """main.app's routes, limiter and CORS middleware, without instrument_request and ProfilingMiddleware."""
+    bare = FastAPI()
+    bare.router.routes = main.app.router.routes
+    bare.state.limiter = main.app.state.limiter
+    bare.exception_handlers = main.app.exception_handlers
+    bare.user_middleware = [m for m in main.app.user_middleware if m.cls is CORSMiddleware]
+    return bare
+
+
+def per_call(fn, runs=RUNS) -> float:
+    """Median microseconds per call over batches of 100."""
+    batches = []
+    for _ in range(runs // 100):
+        started = time.perf_counter()
+        for _ in range(100):
+            fn()
+        batches.append((time.perf_counter() - started) / 100)
+    return statistics.median(batches) * 1e6
+
+
+def endpoint_times(app, headers) -> tuple[float, float]:
+    # Pooled async connections belong to the previous client's event loop
+    async_engine.sync_engine.dispose(close=False)
+    with TestClient(app) as client:
+        assert client.get("/api/donations/history", headers=headers).status_code == 200
+        return (
+            per_call(lambda: client.get("/health/live")),
+            per_call(lambda: client.get("/api/donations/history", headers=headers), 500),
+        )
+
+
+if __name__ == "__main__":
+    user_id = seed()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+    observe = metrics.REQUEST_LATENCY.labels("GET", "/health/live", 200).observe
+    print(f"one labelled histogram observation: {per_call(lambda: observe(0.001), 200_000):.2f} us")
+
+    apps = {"instrumented": main.app, "uninstrumented": uninstrumented()}
+    results = {name: [] for name in apps}
+    for _ in range(ROUNDS):  # interleaved, so drift on a shared machine hits both
+        for name, app in apps.items():
+            results[name].append(endpoint_times(app, headers))
+    for name, times in results.items():
+        live = statistics.median(t[0] for t in times)
+        history = statistics.median(t[1] for t in times)
+        print(f"{name:>15}: /health/live {live:6.0f} us ({1e6 / live:5.0f} req/s), "
+              f"/api/donations/history {history:6.0f} us ({1e6 / history:5.0f} req/s)")
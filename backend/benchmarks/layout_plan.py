@@ -0,0 +1,102 @@
+"""
+The compiled layout plan (certificate_layout.render_plan) against the
+hand-coded story builder it replaced, for the default layout.
+
+The old builder is certificate_service.py as of BASELINE (default: the
+revision before layout_config rendering), loaded from git, so this must run
+inside the repository checkout. Times story construction (best of 7 rounds of
+STORIES calls) and full renders (median of interleaved runs), and compares
+the PDFs of both by sha256, text-only and with a logo and signature.
+font_dir is an empty directory: the old builder has no font fallback, so
+with the shipped fonts the two would not draw the same text. The old builder
+reads images from local paths, so both get the normalised images' local
+copies (image_service.image_file). The database
+is not touched; run from the backend directory:
+
+    python benchmarks/layout_plan.py
+"""
+import hashlib
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+os.environ["FONT_DIR"] = tempfile.mkdtemp()
+os.environ["CERTIFICATE_DIR"] = tempfile.mkdtemp()
+sys.path.insert(0, os.getcwd())
+
+from PIL import Image, ImageDraw
+from services import certificate_service, image_service
+from services.certificate_layout import certificate_story
+
+BASELINE = os.environ.get("BASELINE", "613de1b^")
+STORIES = 2000
+RENDERS = 200
+DONOR = dict(
+    donation_id=1, donor_name="Asha Das", donor_pan="ABCDE1234F", donor_father_name="Ramesh Das",
+    donor_address="12 MG Road", donor_city="Guwahati", donor_state="Assam", donor_pincode="781001",
+    donor_email="asha@example.com", donor_phone="9876543210", amount=5000, transaction_id="pay_1",
+    gateway="RAZORPAY", donation_date=datetime(2025, 4, 1), cause="GAUSEWA",
+)
+
+
+def load_baseline() -> types.ModuleType:
+    source = subprocess.run(
+        ["git", "show", f"{BASELINE}:backend/services/certificate_service.py"],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    module = types.ModuleType("baseline_certificate_service")
+    exec(compile(source, f"{BASELINE}:certificate_service.py", "exec"), module.__dict__)
+    return module
+
+
+def make_images(directory: Path) -> tuple[Path, Path]:
+    logo = directory / "logo.png"
+    img = Image.new("RGB", (1200, 400), "white")
+    ImageDraw.Draw(img).ellipse((400, 50, 800, 350), outline=(255, 107, 0), width=12)
+    img.save(logo)
+    signature = directory / "signature.png"
+    img = Image.new("RGBA", (900, 300), (0, 0, 0, 0))
+    ImageDraw.Draw(img).line([(100, 200), (400, 80), (800, 220)], fill=(20, 20, 80, 255), width=6)
+    img.save(signature)
+    return (image_service.image_file(image_service.normalize_image(logo, "logo")),
+            image_service.image_file(image_service.normalize_image(signature, "signature")))
+
+
+def best_story_us(build, template) -> float:
+    rounds = []
+    for _ in range(7):
+        started = time.perf_counter()
+        for _ in range(STORIES):
+            build(template=template, **DONOR)
+        rounds.append((time.perf_counter() - started) / STORIES)
+    return min(rounds) * 1e6
+
+
+if __name__ == "__main__":
+    baseline = load_baseline()
+    builders = {"hand-coded": baseline.certificate_story, "compiled plan": certificate_story}
+    renderers = {"hand-coded": baseline.render_80g_certificate, "compiled plan": certificate_service.render_80g_certificate}
+    with tempfile.TemporaryDirectory() as tmp:
+        logo, signature = make_images(Path(tmp))
+        templates = {"text only": None, "logo + signature": SimpleNamespace(logo_path=str(logo), signature_path=str(signature))}
+        for label, template in templates.items():
+            digests = {name: hashlib.sha256(render(template=template, **DONOR)).hexdigest() for name, render in renderers.items()}
+            same = "identical" if len(set(digests.values())) == 1 else "DIFFERENT"
+            print(f"{label}: PDFs {same} ({', '.join(f'{n} {d[:12]}' for n, d in digests.items())})")
+
+            stories = {name: best_story_us(build, template) for name, build in builders.items()}
+            times = {name: [] for name in renderers}
+            for _ in range(RENDERS):  # interleaved, so drift on a shared machine hits both
+                for name, render in renderers.items():
+                    started = time.perf_counter()
+                    render(template=template, **DONOR)
+                    times[name].append(time.perf_counter() - started)
+            for name in renderers:
+                print(f"  {name:>13}: story {stories[name]:6.0f} us, full render {statistics.median(times[name]) * 1000:5.2f} ms")
@@ -0,0 +1,117 @@
+"""
+Latency of GET /health and GET /api/donations/history while BURST (default
+100) concurrent POST /api/auth/login requests arrive at once.
+
+The app runs under uvicorn in a child process with the login rate limit
+lifted. Two probe clients poll /health and /api/donations/history back to
+back, first for IDLE seconds with no logins, then until every login of the
+burst has been answered. Logins are counted by status: 200, 429 (shed by the
+hasher queue) and anything else. Drops and rebuilds the schema of
+BENCH_DATABASE_URL; run from the backend directory:
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/dhyan_bench python benchmarks/login_burst.py
+"""
+import asyncio
+import collections
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+os.environ["RATE_LIMIT_STORAGE_URI"] = "memory://"
+os.environ["RATE_LIMIT_LOGIN"] = "1000000/minute"
+os.environ["PRELOAD_ON_START"] = "false"
+sys.path.insert(0, os.getcwd())
+
+PORT = 8766
+BURST = int(os.environ.get("BURST", 100))
+IDLE = 3
+EMAIL, PASSWORD = "donor@example.com", "correct-horse-1"
+
+
+def seed() -> int:
+    from sqlalchemy import text
+    from config import get_settings
+    from database import engine
+    import migrations
+    from services.password_hasher import _hash
+    with engine.connect() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public"))
+        conn.commit()
+    migrations.migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO users (email, hashed_password, is_active, is_admin) VALUES (:email, :hashed, true, false)"),
+            {"email": EMAIL, "hashed": _hash(PASSWORD, get_settings().bcrypt_rounds)},
+        )
+        conn.execute(text("""
+            INSERT INTO donations (user_id, donor_name, donor_email, donor_phone, amount_paise, cause, gateway, status, created_at)
+            SELECT 1, 'Donor', 'donor@example.com', '9876543210', 50000 + i, 'GAUSEWA', 'RAZORPAY', 'SUCCESS',
+                   now() - i * interval '1 day'
+            FROM generate_series(1, 100) i
+        """))
+        conn.execute(text("ANALYZE"))
+    return 1
+
+
+async def probe(http, path: str, headers: dict, done: asyncio.Event) -> list[float]:
+    latencies = []
+    while not done.is_set():
+        started = time.perf_counter()
+        await http.get(path, headers=headers)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def run(user_id: int) -> None:
+    import httpx
+    from services.auth_service import create_access_token
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+    limits = httpx.Limits(max_connections=BURST + 2)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=120, limits=limits) as http:
+        for _ in range(100):
+            try:
+                await http.get("/health")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+        else:
+            raise RuntimeError("server did not start")
+
+        async def phase(logins: int) -> dict[str, list[float]]:
+            done = asyncio.Event()
+            probes = {
+                path: asyncio.create_task(probe(http, path, headers if "donations" in path else {}, done))
+                for path in ("/health", "/api/donations/history")
+            }
+            if logins:
+                body = {"email": EMAIL, "password": PASSWORD}
+                responses = await asyncio.gather(*(http.post("/api/auth/login", json=body) for _ in range(logins)))
+                statuses = collections.Counter(r.status_code for r in responses)
+                print(f"logins: {statuses[200]} served, {statuses[429]} shed with 429, "
+                      f"{logins - statuses[200] - statuses[429]} other {sorted(set(statuses) - {200, 429})}")
+            else:
+                await asyncio.sleep(IDLE)
+            done.set()
+            return {path: sorted(await task) for path, task in probes.items()}
+
+        for label, logins in (("idle", 0), (f"during {BURST} logins", BURST)):
+            for path, latencies in (await phase(logins)).items():
+                print(f"{label:>18} {path:<24} p50 {statistics.median(latencies) * 1000:7.1f} ms, "
+                      f"max {latencies[-1] * 1000:7.1f} ms ({len(latencies)} requests)")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--serve"]:
+        import uvicorn
+        uvicorn.run("main:app", port=PORT, log_level="warning", access_log=False)
+        sys.exit()
+    user_id = seed()
+    server = subprocess.Popen([sys.executable, __file__, "--serve"])
+    try:
+        asyncio.run(run(user_id))
+    finally:
+        server.terminate()
+        server.wait()
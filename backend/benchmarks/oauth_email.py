@@ -0,0 +1,135 @@
+"""
+POST /api/auth/oauth latency for new users while the welcome email goes to a
+slow mail server.
+
+A local SMTP stand-in accepts every message but waits GREETING_DELAY_MS
+(default 300) before greeting each connection, as a distant mail server
+does. The app runs under uvicorn in a child process pointed at it, and SIGNUPS
+(default 60) new users sign in one after another. Prints the p50/p95 sign-in
+latency, how many SMTP connections delivered the emails, and for comparison
+one inline send_email() round trip, which is what each sign-in used to wait
+for. Drops and rebuilds the schema of BENCH_DATABASE_URL; run from the backend
+directory:
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/dhyan_bench python benchmarks/oauth_email.py
+"""
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PORT, SMTP_PORT = 8767, 8025
+SECRET = "bench-nextauth-secret"
+os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+os.environ["RATE_LIMIT_STORAGE_URI"] = "memory://"
+os.environ["PRELOAD_ON_START"] = "false"
+os.environ["NEXTAUTH_SECRET"] = SECRET
+os.environ["SMTP_HOST"] = "127.0.0.1"
+os.environ["SMTP_PORT"] = str(SMTP_PORT)
+os.environ["SMTP_SSL"] = "false"
+os.environ["GMAIL_APP_PASSWORD"] = ""
+sys.path.insert(0, os.getcwd())
+
+SIGNUPS = int(os.environ.get("SIGNUPS", 60))
+GREETING_DELAY = int(os.environ.get("GREETING_DELAY_MS", 300)) / 1000
+
+
+def seed() -> None:
+    from sqlalchemy import text
+    from database import engine
+    import migrations
+    with engine.connect() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public"))
+        conn.commit()
+    migrations.migrate(engine)
+
+
+class SMTPStandIn:
+    """Just enough SMTP for smtplib: every command succeeds and DATA is counted."""
+
+    def __init__(self):
+        self.connections = 0
+        self.messages = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        await asyncio.sleep(GREETING_DELAY)
+        writer.write(b"220 stand-in ESMTP\r\n")
+        while line := await reader.readline():
+            command = line[:4].upper()
+            if command == b"DATA":
+                writer.write(b"354 go ahead\r\n")
+                while (await reader.readline()) not in (b".\r\n", b""):
+                    pass
+                self.messages += 1
+                writer.write(b"250 queued\r\n")
+            elif command == b"QUIT":
+                writer.write(b"221 bye\r\n")
+                break
+            else:
+                writer.write(b"250 ok\r\n")
+            await writer.drain()
+        await writer.drain()
+        writer.close()
+
+
+def assertion(sub: str, email: str) -> str:
+    from jose import jwt
+    from services.auth_service import OAUTH_ASSERTION_AUDIENCE
+    now = int(time.time())
+    claims = {"aud": OAUTH_ASSERTION_AUDIENCE, "iat": now, "exp": now + 60, "provider": "google", "sub": sub, "email": email}
+    return jwt.encode(claims, SECRET, algorithm="HS256")
+
+
+async def run() -> None:
+    import httpx
+    from services import email_service
+    smtp = SMTPStandIn()
+    smtp_server = await asyncio.start_server(smtp.handle, "127.0.0.1", SMTP_PORT)
+    server = subprocess.Popen([sys.executable, __file__, "--serve"])
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=30) as http:
+            for _ in range(100):
+                try:
+                    await http.get("/health")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("server did not start")
+
+            latencies = []
+            for i in range(SIGNUPS):
+                sub, email = f"g-{i}", f"donor{i}@example.com"
+                body = {"provider": "google", "oauth_sub": sub, "email": email, "name": f"Donor {i}"}
+                started = time.perf_counter()
+                response = await http.post("/api/auth/oauth", json=body, headers={"X-OAuth-Assertion": assertion(sub, email)})
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200 and response.json()["is_new_user"], response.text
+            latencies.sort()
+
+            deadline = time.perf_counter() + 60
+            while smtp.messages < SIGNUPS and time.perf_counter() < deadline:
+                await asyncio.sleep(0.1)
+        print(f"{SIGNUPS} new-user sign-ins, SMTP greeting delayed {GREETING_DELAY * 1000:.0f} ms: "
+              f"p50 {statistics.median(latencies) * 1000:.1f} ms, p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms")
+        print(f"{smtp.messages} welcome emails delivered over {smtp.connections} SMTP connections")
+
+        started = time.perf_counter()
+        await asyncio.to_thread(email_service.send_email, "donor@example.com", "Welcome", "<p>Hi</p>")
+        print(f"one inline send_email(): {(time.perf_counter() - started) * 1000:.0f} ms")
+    finally:
+        server.terminate()
+        server.wait()
+        smtp_server.close()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--serve"]:
+        import uvicorn
+        uvicorn.run("main:app", port=PORT, log_level="warning", access_log=False)
+        sys.exit()
+    seed()
+    asyncio.run(run())
@@ -0,0 +1,109 @@
+"""
+Connection-pool checkout wait under 200 concurrent requests, per pool
+configuration.
+
+Each configuration runs in a fresh process, since pool settings are read at
+import. CONCURRENCY concurrent GET /api/donations/history requests (async
+engine, 3 statements each) go through the ASGI app twice: the first burst
+fills the pool, the second is measured, with the async pool's checkout
+statistics from database.pool_status(). Drops and rebuilds the schema of
+BENCH_DATABASE_URL; run from the backend directory:
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/dhyan_bench python benchmarks/pool_wait.py
+"""
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+os.environ["RATE_LIMIT_STORAGE_URI"] = "memory://"
+os.environ["PRELOAD_ON_START"] = "false"
+sys.path.insert(0, os.getcwd())
+
+CONCURRENCY = 200
+
+CONFIGS = [
+    ("derived (20 connections, 1 worker)", {}),
+    ("pool 5 + overflow 10 (old fixed)", {"DB_POOL_SIZE": "5", "DB_MAX_OVERFLOW": "10"}),
+    ("pool 20 + overflow 0", {"DB_POOL_SIZE": "20", "DB_MAX_OVERFLOW": "0"}),
+    ("pool 40 + overflow 0", {"DB_POOL_SIZE": "40", "DB_MAX_OVERFLOW": "0"}),
+    ("NullPool, no PgBouncer", {"DB_PGBOUNCER": "true"}),
+]
+
+
+def seed() -> None:
+    from sqlalchemy import text
+    from database import engine
+    import migrations
+    with engine.connect() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public"))
+        conn.commit()
+    migrations.migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (email, is_active, is_admin) VALUES ('donor@example.com', true, false)"))
+        conn.execute(text("""
+            INSERT INTO donations (user_id, donor_name, donor_email, donor_phone, amount_paise, cause, gateway, status)
+            SELECT 1, 'Donor', 'donor@example.com', '9876543210', 50000, 'GENERAL', 'RAZORPAY', 'SUCCESS'
+            FROM generate_series(1, 200)
+        """))
+        conn.execute(text("ANALYZE"))
+
+
+async def burst() -> dict:
+    import httpx
+    import main
+    from database import PoolWaitStats, async_engine, pool_status
+    from services.auth_service import create_access_token
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': '1'})}"}
+    transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        async def one():
+            started = time.perf_counter()
+            response = await client.get("/api/donations/history", headers=headers)
+            return response.status_code, time.perf_counter() - started
+
+        await asyncio.gather(*(one() for _ in range(CONCURRENCY)))
+        pool = async_engine.sync_engine.pool
+        if hasattr(pool, "wait_stats"):
+            pool.wait_stats = PoolWaitStats()
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(CONCURRENCY)))
+        elapsed = time.perf_counter() - started
+    status = pool_status()["async"]
+    await async_engine.dispose()
+    latencies = sorted(latency for _, latency in results)
+    return {
+        "ok": sum(code == 200 for code, _ in results),
+        "elapsed": elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "pool": status,
+    }
+
+
+def report(name: str, result: dict) -> None:
+    pool = result["pool"]
+    line = (f"{name:38} {result['ok']:3}/{CONCURRENCY} ok in {result['elapsed']:5.2f}s  "
+            f"latency p50 {result['p50'] * 1000:6.0f} ms p95 {result['p95'] * 1000:6.0f} ms")
+    if "checkouts" in pool:
+        mean_wait = pool["wait_seconds_total"] / pool["checkouts"] if pool["checkouts"] else 0
+        line += (f"  checkout wait mean {mean_wait * 1000:6.1f} ms max {pool['wait_seconds_max'] * 1000:6.0f} ms"
+                 f"  timeouts {pool['timeouts']}")
+    print(line)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--burst"]:
+        print(json.dumps(asyncio.run(burst())))
+        sys.exit()
+    seed()
+    for name, env in CONFIGS:
+        out = subprocess.run(
+            [sys.executable, __file__, "--burst"], env={**os.environ, **env},
+            capture_output=True, text=True, check=True,
+        ).stdout
+        report(name, json.loads(out.strip().splitlines()[-1]))
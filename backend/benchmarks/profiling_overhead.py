@@ -0,0 +1,50 @@
+"""
+What request profiling costs: profiling.start() for a request that is not
+sampled, with no profiling token configured and with one configured, and a
+GET /health/live served unprofiled and profiled. The database is not
+touched; run from the backend directory:
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/dhyan_bench python benchmarks/profiling_overhead.py
+"""
+import os
+import statistics
+import sys
+import time
+
+os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+os.environ["RATE_LIMIT_STORAGE_URI"] = "memory://"
+os.environ["PRELOAD_ON_START"] = "false"
+sys.path.insert(0, os.getcwd())
+
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+import main
+import profiling
+
+RUNS = 2000
+TOKEN = "bench-token"
+
+
+def per_call(fn, runs=RUNS) -> float:
+    """Median microseconds per call over batches of 100."""
+    batches = []
+    for _ in range(runs // 100):
+        started = time.perf_counter()
+        for _ in range(100):
+            fn()
+        batches.append((time.perf_counter() - started) / 100)
+    return statistics.median(batches) * 1e6
+
+
+if __name__ == "__main__":
+    request = Request({"type": "http", "method": "GET", "path": "/health/live", "headers": [(b"host", b"test")]})
+    profiling.set_sample_rate(0.0)
+    print(f"profiling.start, no token configured: {per_call(lambda: profiling.start(request), 200_000):.2f} us")
+    profiling.settings.profiling_token = TOKEN
+    print(f"profiling.start, token configured, not sent: {per_call(lambda: profiling.start(request), 200_000):.2f} us")
+
+    client = TestClient(main.app)
+    unprofiled = per_call(lambda: client.get("/health/live"))
+    profiled = per_call(lambda: client.get("/health/live", headers={"X-Profile": TOKEN}), 500)
+    kind = profiling.list_profiles()[0]["profiler"]
+    print(f"GET /health/live unprofiled: {unprofiled:.0f} us, profiled ({kind}): {profiled:.0f} us")
@@ -0,0 +1,114 @@
+"""
+GET /api/admin/export/receipts over RECEIPTS (default 50,000) successful
+donations: the streamed ZIP with no certificate stored yet and again with
+all of them stored, and one day as a multi-page PDF.
+
+The app runs under uvicorn in a child process with local certificate storage
+in a temporary directory. Donations are spread evenly over about 38 days,
+so one day is roughly 1,300 receipts. Reports wall time, throughput, size,
+time to the first byte and the server's RSS (VmRSS before, VmHWM peak
+after); the ZIP is checked with zipfile.testzip(). Drops and rebuilds the
+schema of BENCH_DATABASE_URL; run from the backend directory:
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/dhyan_bench python benchmarks/receipt_export.py
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+os.environ["RATE_LIMIT_STORAGE_URI"] = "memory://"
+os.environ["PRELOAD_ON_START"] = "false"
+sys.path.insert(0, os.getcwd())
+
+PORT = 8768
+RECEIPTS = int(os.environ.get("RECEIPTS", 50_000))
+RANGE = {"start": "2025-04-01", "end": "2025-06-30"}
+PDF_DAY = {"start": "2025-04-01", "end": "2025-04-01"}
+
+
+def seed() -> int:
+    from sqlalchemy import text
+    from database import engine
+    import migrations
+    with engine.connect() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public"))
+        conn.commit()
+    migrations.migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (email, is_active, is_admin) VALUES ('admin@example.com', true, true)"))
+        conn.execute(text("""
+            INSERT INTO donations (donor_name, donor_email, donor_phone, donor_pan, amount_paise, cause, gateway,
+                                   gateway_payment_id, status, created_at)
+            SELECT 'Donor ' || i, 'donor' || i || '@example.com', '9876543210', 'ABCDE1234F', 50000 + i % 997,
+                   'GAUSEWA', 'RAZORPAY', 'pay_' || i, 'SUCCESS',
+                   timestamptz '2025-04-01 00:00+00' + i * interval '66 seconds'
+            FROM generate_series(1, :n) i
+        """), {"n": RECEIPTS})
+        conn.execute(text("ANALYZE"))
+    return 1
+
+
+def memory(pid: int) -> dict[str, int]:
+    """VmRSS and VmHWM of a process, in MiB."""
+    with open(f"/proc/{pid}/status") as f:
+        fields = dict(line.split(":", 1) for line in f)
+    return {k: int(fields[k].split()[0]) // 1024 for k in ("VmRSS", "VmHWM")}
+
+
+def download(http, params: dict, path: str) -> tuple[float, float, int]:
+    """(seconds to the first byte, total seconds, bytes)"""
+    started = time.perf_counter()
+    first = None
+    with open(path, "wb") as f, http.stream("GET", "/api/admin/export/receipts", params=params) as response:
+        response.raise_for_status()
+        for chunk in response.iter_bytes():
+            first = first or time.perf_counter() - started
+            f.write(chunk)
+    return first, time.perf_counter() - started, os.path.getsize(path)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--serve"]:
+        import uvicorn
+        uvicorn.run("main:app", port=PORT, log_level="warning", access_log=False)
+        sys.exit()
+    import httpx
+    from services.auth_service import create_access_token
+    admin_id = seed()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(admin_id)})}"}
+    with tempfile.TemporaryDirectory() as tmp:
+        server = subprocess.Popen([sys.executable, __file__, "--serve"], env={**os.environ, "CERTIFICATE_DIR": tmp})
+        try:
+            with httpx.Client(base_url=f"http://127.0.0.1:{PORT}", headers=headers, timeout=600) as http:
+                for _ in range(100):
+                    try:
+                        http.get("/health")
+                        break
+                    except httpx.TransportError:
+                        time.sleep(0.1)
+                else:
+                    raise RuntimeError("server did not start")
+
+                archive = os.path.join(tmp, "receipts.zip")
+                for label in ("ZIP, nothing stored yet", "ZIP, all stored"):
+                    rss = memory(server.pid)["VmRSS"]
+                    first, total, size = download(http, RANGE, archive)
+                    with zipfile.ZipFile(archive) as zf:
+                        entries, bad = len(zf.namelist()), zf.testzip()
+                    print(f"{label}: {total:.0f} s ({entries / total:.0f} receipts/s), {size / 1024 ** 2:.0f} MiB, "
+                          f"first byte after {first * 1000:.0f} ms, RSS {rss} -> {memory(server.pid)['VmHWM']} MiB peak; "
+                          f"{entries} entries, testzip {'ok' if bad is None else 'failed at ' + bad}")
+
+                pdf = os.path.join(tmp, "receipts.pdf")
+                _, total, size = download(http, {**PDF_DAY, "format": "pdf"}, pdf)
+                with open(pdf, "rb") as f:
+                    pages = f.read().count(b"/Type /Page\n")
+                print(f"PDF, one day: {pages} pages in {total:.1f} s ({pages / total:.0f} pages/s), "
+                      f"{size / max(pages, 1) / 1024:.1f} KiB/page")
+        finally:
+            server.terminate()
+            server.wait()
@@ -0,0 +1,126 @@
+"""
+Startup latency: how long after launch uvicorn accepts connections and
+/health/ready reports ready, with the database blackholed, healthy, and
+empty.
+
+Each scenario starts the app under uvicorn in a child process. "Blackholed"
+points DATABASE_URL at a local socket that accepts connections and never
+answers, as a firewalled database does; /health/ready is polled for
+BLACKHOLE_WAIT seconds and the init retries logged meanwhile are counted.
+"Healthy" starts on a schema that is already current, "empty" on a dropped
+schema. Also times database.init_db() on a current schema against a full
+migrations.migrate(). Drops and rebuilds the schema of BENCH_DATABASE_URL;
+run from the backend directory:
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/dhyan_bench python benchmarks/startup.py
+"""
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+os.environ["RATE_LIMIT_STORAGE_URI"] = "memory://"
+os.environ["PRELOAD_ON_START"] = "false"
+sys.path.insert(0, os.getcwd())
+
+PORT = 8769
+BLACKHOLE_WAIT = 30
+RUNS = 20
+
+
+def blackhole() -> str:
+    """URL of a local socket that accepts connections and never answers."""
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(64)
+    held = []
+    threading.Thread(target=lambda: held.extend(iter(listener.accept, None)), daemon=True).start()
+    return f"postgresql://postgres@127.0.0.1:{listener.getsockname()[1]}/dhyan_bench"
+
+
+def drop_schema() -> None:
+    from sqlalchemy import text
+    from database import engine
+    with engine.connect() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public"))
+        conn.commit()
+
+
+def start(database_url: str, wait: float) -> None:
+    import httpx
+    with tempfile.TemporaryFile("w+") as log:
+        launched = time.perf_counter()
+        server = subprocess.Popen([sys.executable, __file__, "--serve"], stderr=log,
+                                  env={**os.environ, "BENCH_DATABASE_URL": database_url})
+        try:
+            while True:
+                try:
+                    socket.create_connection(("127.0.0.1", PORT), timeout=1).close()
+                    break
+                except OSError:
+                    time.sleep(0.01)
+            port_open = time.perf_counter() - launched
+            first = ready = None
+            with httpx.Client(base_url=f"http://127.0.0.1:{PORT}", timeout=30) as http:
+                while time.perf_counter() - launched < wait:
+                    response = http.get("/health/ready")
+                    elapsed = time.perf_counter() - launched
+                    schema = response.json()["schema"]
+                    first = first or (elapsed, response.status_code, schema["state"])
+                    if response.status_code == 200:
+                        ready = (elapsed, schema["version"])
+                        break
+                    time.sleep(0.05)
+                live = statistics.median(timed(http, "/health/live") for _ in range(RUNS)) if ready else None
+                ready_ms = statistics.median(timed(http, "/health/ready") for _ in range(RUNS)) if ready else None
+        finally:
+            server.terminate()
+            server.wait()
+        log.seek(0)
+        retries = log.read().count("Database init failed")
+    print(f"  port open after {port_open * 1000:.0f} ms; first /health/ready answer after {first[0]:.1f} s "
+          f"({first[1]}, schema {first[2]})")
+    if ready:
+        print(f"  ready with schema v{ready[1]} after {ready[0] * 1000:.0f} ms; "
+              f"/health/live {live:.1f} ms, /health/ready {ready_ms:.1f} ms (medians)")
+    else:
+        print(f"  not ready after {wait} s; {retries} init retries logged")
+
+
+def timed(http, path: str) -> float:
+    started = time.perf_counter()
+    http.get(path)
+    return (time.perf_counter() - started) * 1000
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--serve"]:
+        import uvicorn
+        uvicorn.run("main:app", port=PORT, log_level="info", access_log=False)
+        sys.exit()
+    from database import engine, init_db
+    import migrations
+
+    print("database blackholed:")
+    start(blackhole(), BLACKHOLE_WAIT)
+    drop_schema()
+    print("empty database:")
+    start(os.environ["DATABASE_URL"], 60)
+    print("healthy database, current schema:")
+    start(os.environ["DATABASE_URL"], 60)
+
+    def median_ms(fn) -> float:
+        times = []
+        for _ in range(RUNS):
+            started = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - started)
+        return statistics.median(times) * 1000
+
+    print(f"init_db on a current schema: {median_ms(init_db):.2f} ms; "
+          f"migrations.migrate(): {median_ms(lambda: migrations.migrate(engine)):.2f} ms")
@@ -1,22 +1,204 @@
-from sqlalchemy import create_engine, text
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool, NullPool
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import get_settings
+import metrics
 import logging
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
-# connect_args: 10-second connect timeout so DB issues don't block startup
+# Connections the Postgres rate-limit storage (rate_limit.py) holds per worker
+RATE_LIMIT_CONNECTIONS = 1
+
+
+class PoolWaitStats:
+    """Time spent waiting for a pooled connection, accumulated per pool."""
+    __slots__ = ("waits", "total_wait", "max_wait", "timeouts")
+
+    def __init__(self):
+        self.waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+
+
+class _TimedCheckoutMixin:
+    """
+    Wraps QueuePool._do_get, where a checkout blocks when the pool is exhausted.
+    The measured time includes opening a new connection when the pool grows.
+    Keeps the configured max_overflow for reporting; QueuePool has no public accessor.
+    """
+
+    def __init__(self, *args, max_overflow: int = 10, **kwargs):
+        super().__init__(*args, max_overflow=max_overflow, **kwargs)
+        self.max_overflow = max_overflow
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.wait_stats.timeouts += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            stats = self.wait_stats
+            stats.waits += 1
+            stats.total_wait += elapsed
+            if elapsed > stats.max_wait:
+                stats.max_wait = elapsed
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _pool_kwargs(pool_class) -> dict:
+    """
+    Pool arguments from Settings. Each worker process holds two engines (sync and
+    async) plus the rate-limit storage's RATE_LIMIT_CONNECTIONS, so what is left
+    of the worker's share of db_max_connections is split between the engines,
+    overflow included: pool_size + max_overflow per engine stays within it
+    (max_overflow is capped accordingly). An explicit db_pool_size is taken
+    as is, with db_max_overflow. Connections are recycled after
+    db_pool_recycle seconds instead of being pinged with SELECT 1 on every checkout.
+    """
+    if settings.db_pgbouncer:
+        # PgBouncer (transaction pooling) owns the pooling; hold nothing between requests
+        return {"poolclass": NullPool}
+    if settings.db_pool_size:
+        pool_size, max_overflow = settings.db_pool_size, settings.db_max_overflow
+    else:
+        limiter = RATE_LIMIT_CONNECTIONS if settings.rate_limit_storage_uri.startswith("postgres") else 0
+        per_worker = settings.db_max_connections // max(settings.web_concurrency, 1)
+        per_engine = max(1, (per_worker - limiter) // 2)
+        max_overflow = min(settings.db_max_overflow, per_engine - 1)
+        pool_size = per_engine - max_overflow
+    return {
+        "poolclass": pool_class,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+
+
+# connect_args: 10-second connect timeout so an unreachable DB fails requests (and init_db attempts) promptly
 engine = create_engine(
     settings.database_url,
-    pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=10,
     connect_args={"connect_timeout": 10},
+    **_pool_kwargs(TimedQueuePool),
 )
 
+
+def _async_url(url: str):
+    """Same database through asyncpg (which spells sslmode as ssl)."""
+    u = make_url(url).set(drivername="postgresql+asyncpg")
+    if "sslmode" in u.query:
+        query = dict(u.query)
+        query["ssl"] = query.pop("sslmode")
+        u = u.set(query=query)
+    if settings.db_pgbouncer:
+        # Transaction pooling can't keep per-connection prepared statements
+        u = u.update_query_dict({"prepared_statement_cache_size": "0"})
+    return u
+
+
+# Async engine for async def endpoints, so queries there don't block the event loop.
+# Sync endpoints and background tasks keep using `engine` / SessionLocal.
+async_engine = create_async_engine(
+    _async_url(settings.database_url),
+    connect_args={"timeout": 10, **({"statement_cache_size": 0} if settings.db_pgbouncer else {})},
+    **_pool_kwargs(TimedAsyncQueuePool),
+)
+
+
+def pool_status() -> dict:
+    """Checked-out/overflow counts and checkout wait times for both engines."""
+    status = {}
+    for name, pool in (("sync", engine.pool), ("async", async_engine.sync_engine.pool)):
+        if not isinstance(pool, QueuePool):
+            status[name] = {"pool": type(pool).__name__}
+            continue
+        stats = pool.wait_stats
+        status[name] = {
+            "pool": type(pool).__name__,
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),  # SQLAlchemy counts up from -pool_size
+            "max_overflow": pool.max_overflow,
+            "checkouts": stats.waits,
+            "wait_seconds_total": round(stats.total_wait, 6),
+            "wait_seconds_max": round(stats.max_wait, 6),
+            "timeouts": stats.timeouts,
+        }
+    return status
+
+
+metrics.register_pool_collector(pool_status)
+
+# Per-request SQL statement counter, set up by the query-budget middleware in main.py.
+# The counter object is shared (not the int), so sync endpoints running in the
+# threadpool with a copied context still add to the request's count.
+class QueryCounter:
+    __slots__ = ("count", "statements")
+
+    def __init__(self, record: bool = False):
+        self.count = 0
+        # (statement, seconds) pairs, only kept for profiled requests
+        self.statements: list[tuple[str, float]] | None = [] if record else None
+
+
+_query_counter: ContextVar[QueryCounter | None] = ContextVar("query_counter", default=None)
+
+
+def _before_query(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+    counter = _query_counter.get()
+    if counter is not None:
+        counter.count += 1
+
+
+def _after_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_start
+    metrics.DB_QUERY_DURATION.observe(elapsed)
+    counter = _query_counter.get()
+    if counter is not None and counter.statements is not None:
+        counter.statements.append((statement, elapsed))
+
+
+for _engine in (engine, async_engine.sync_engine):
+    event.listen(_engine, "before_cursor_execute", _before_query)
+    event.listen(_engine, "after_cursor_execute", _after_query)
+
+
+@contextmanager
+def count_queries(record: bool = False):
+    """Count SQL statements executed in the current context; record=True also keeps their text."""
+    counter = QueryCounter(record)
+    token = _query_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_counter.reset(token)
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: async sessions can't lazy-load expired attributes
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
@@ -28,13 +210,27 @@ def get_db():
         db.close()
 
 
-def init_db():
-    """Enable pgcrypto extension and create tables. Fails gracefully."""
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def init_db() -> int:
+    """
+    Bring the schema to the latest version and return it. A database already
+    at that version is recognised from schema_version alone, without DDL or
+    the migration lock. Raises if the database can't be reached.
+    """
+    from migrations import LATEST_VERSION, migrate, schema_version
+    version = schema_version(engine)
+    if version is not None and version >= LATEST_VERSION:
+        return version
     try:
         with engine.connect() as conn:
             conn.execute(text("CREATE EXTENSION IF NOT EXISTS pgcrypto"))
             conn.commit()
-        Base.metadata.create_all(bind=engine)
-        logger.info("Database initialised successfully.")
-    except Exception as e:
-        logger.warning(f"Database init failed (will retry on first request): {e}")
+    except exc.DBAPIError as e:
+        # Not used by any query yet; a server without the contrib package must not block migrations
+        logger.warning(f"pgcrypto extension not created: {e.orig}")
+    return migrate(engine)
+
@@ -0,0 +1,102 @@
+"""
+Production server: gunicorn managing uvicorn workers (`gunicorn main:app`).
+
+A single uvicorn process runs certificate rendering, PyJHora and every
+sync endpoint's threadpool on one interpreter, so one busy request slows
+all the others. Here each worker is a separate process with its own event
+loop (uvloop, httptools) and pools; gunicorn restarts any that die.
+
+- Workers: WEB_CONCURRENCY, or the CPUs available to the container (at
+  least 2). The count is exported as WEB_CONCURRENCY before the app is
+  imported, so database.py splits db_max_connections between the workers.
+- The app, ReportLab and the certificate fonts are loaded once in the
+  master and shared copy-on-write with the forked workers (gc.freeze()
+  keeps the collector from un-sharing those pages). Connection pools are
+  never shared: each worker discards whatever it inherited.
+- On SIGTERM a worker stops accepting, gives in-flight requests and their
+  background tasks graceful_timeout - SHUTDOWN_RESERVE_SECONDS to finish,
+  then runs the lifespan shutdown (which sends queued emails) before
+  gunicorn's graceful_timeout ends it.
+- Prometheus runs in multiprocess mode (see metrics.py).
+- X-Forwarded-For/-Proto are trusted only from FORWARDED_ALLOW_IPS, which a
+  deployment sets to its proxy's addresses (default: localhost). Rate
+  limits key clients separately (TRUSTED_PROXY_HOPS, see rate_limit.py).
+
+`uvicorn main:app` still works for development.
+"""
+import gc
+import math
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from uvicorn_worker import UvicornWorker
+
+# Lifespan shutdown time kept out of the request drain: notification_service.stop() waits up to 10 s
+SHUTDOWN_RESERVE_SECONDS = 12
+
+
+def _available_cpus() -> int:
+    """CPUs this process may use: its affinity mask, capped by a cgroup v2 CPU quota."""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(cpus, 1)
+
+
+class Worker(UvicornWorker):
+    """UvicornWorker that bounds the request drain, leaving time for the lifespan shutdown."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.config.timeout_graceful_shutdown = max(self.cfg.graceful_timeout - SHUTDOWN_RESERVE_SECONDS, 1)
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8001')}"
+workers = int(os.environ.get("WEB_CONCURRENCY") or max(_available_cpus(), 2))
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = Worker
+preload_app = True
+graceful_timeout = 30
+keepalive = 5  # uvicorn's default
+# Proxy addresses (or networks) whose X-Forwarded-For/-Proto uvicorn applies.
+# Never "*": uvicorn then takes the leftmost X-Forwarded-For entry, which the
+# client controls. Set per deployment; the default trusts only a local proxy.
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1,::1")
+accesslog = "-"
+
+# Set before prometheus_client is imported, i.e. before the app is loaded. A
+# given directory is emptied: samples from a previous run would add to this one's.
+if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    Path(os.environ["PROMETHEUS_MULTIPROC_DIR"]).mkdir(parents=True)
+else:
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+
+
+def when_ready(server):
+    from config import get_settings
+    if get_settings().preload_on_start:
+        import health
+        health.preload()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Connections opened before the fork belong to the master; workers open their own
+    from database import engine, async_engine
+    from rate_limit import limiter
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+    storage_engine = getattr(limiter._storage, "_engine", None)  # PostgresStorage
+    if storage_engine is not None:
+        storage_engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,180 @@
+"""
+Liveness/readiness probes and startup warm-up.
+
+/health/live only says the process is serving. /health/ready checks the DB,
+that certificate storage is writable (local) or reachable (S3), and that
+warm-up has finished; results are memoized for health_cache_seconds so probe
+traffic stays cheap.
+Warm-up starts with schema initialisation (database.init_db), retried with
+exponential backoff until the database is reachable, so the port opens
+immediately whatever the state of the database; readiness reports its
+progress under "schema". Loading the template cache and the storage client
+is retried the same way.
+Libraries deferred to first use (ReportLab and the certificate fonts, the
+razorpay SDK) are preloaded in the background once the instance is ready,
+so they add to neither the cold start nor the first request that needs them.
+Upstream reachability (gateways, Prokerala) is reported but never gates
+readiness — an outside outage shouldn't pull every instance out of rotation —
+and is refreshed in the background so a probe never waits on the internet.
+"""
+import asyncio
+import logging
+import random
+import time
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from config import get_settings
+from database import async_engine, init_db, SessionLocal
+from services import certificate_service
+from services.certificate_service import get_active_template
+from services.storage import get_certificate_storage
+from services.http_client import get_http_client
+from services.razorpay_service import get_razorpay_client
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+UPSTREAMS = {
+    "razorpay": "https://api.razorpay.com",
+    "cashfree": "https://api.cashfree.com",
+    "prokerala": "https://api.prokerala.com",
+}
+UPSTREAM_REFRESH_SECONDS = 60
+STORAGE_CHECK_TIMEOUT = 5
+
+_warm = False
+_schema: dict = {"state": "pending", "version": None, "attempts": 0, "error": None}
+_ready_cache: tuple[float, dict] | None = None
+_upstream_status: dict = {name: "unknown" for name in UPSTREAMS}
+_upstream_checked_at = 0.0
+_upstream_refresh: asyncio.Task | None = None
+
+
+def _retry_delays():
+    """db_init_retry_initial seconds, doubling up to db_init_retry_max, each with jitter."""
+    delay = settings.db_init_retry_initial
+    while True:
+        yield delay * random.uniform(0.5, 1)
+        delay = min(delay * 2, settings.db_init_retry_max)
+
+
+async def init_schema() -> None:
+    """Run init_db until it succeeds, with _retry_delays() between attempts."""
+    delays = _retry_delays()
+    while True:
+        _schema["attempts"] += 1
+        try:
+            version = await run_in_threadpool(init_db)
+        except Exception as e:
+            _schema.update(state="retrying", error=f"{type(e).__name__}: {str(e).splitlines()[0][:200]}")
+            delay = next(delays)
+            logger.warning(f"Database init failed (attempt {_schema['attempts']}), retrying in {delay:.0f}s: {e}")
+            await asyncio.sleep(delay)
+            continue
+        _schema.update(state="ready", version=version, error=None)
+        logger.info(f"Database initialised successfully (schema version {version}).")
+        return
+
+
+async def warm_up() -> None:
+    """
+    Initialise the schema, load the template cache and open HTTP and storage
+    clients, then mark the instance warm.
+    """
+    global _warm
+    await init_schema()
+
+    def load_template_and_storage():
+        with SessionLocal() as db:
+            get_active_template(db)
+        get_certificate_storage()
+
+    delays = _retry_delays()
+    while True:
+        try:
+            await run_in_threadpool(load_template_and_storage)
+            break
+        except Exception:
+            delay = next(delays)
+            logger.exception(f"Warm-up: template cache or certificate storage not loaded, retrying in {delay:.0f}s")
+            await asyncio.sleep(delay)
+    get_http_client()
+    _warm = True
+    logger.info("Warm-up complete.")
+    if settings.preload_on_start:
+        await run_in_threadpool(preload)
+
+
+def preload() -> None:
+    """Import what is otherwise loaded on first use; the instance is already serving."""
+    started = time.perf_counter()
+    try:
+        certificate_service.preload()
+        get_razorpay_client()
+    except Exception:
+        logger.exception("Preload failed; libraries will load on first use")
+        return
+    logger.info(f"Preloaded renderer and payment SDK in {time.perf_counter() - started:.2f}s")
+
+
+async def _check_database() -> str:
+    async def select_one():
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    try:
+        # Bounds the connect too, which otherwise waits out the engine's 10 s connect timeout
+        await asyncio.wait_for(select_one(), timeout=2)
+        return "ok"
+    except Exception as e:
+        return f"error: {type(e).__name__}"
+
+
+async def _check_storage() -> str:
+    try:
+        # S3Storage.check bounds its own request; this also covers creating the client
+        return await asyncio.wait_for(
+            run_in_threadpool(lambda: get_certificate_storage().check()), timeout=STORAGE_CHECK_TIMEOUT
+        )
+    except Exception as e:
+        return f"error: {type(e).__name__}"
+
+
+async def _refresh_upstreams() -> None:
+    global _upstream_checked_at
+    client = get_http_client()
+
+    async def probe(url: str) -> str:
+        try:
+            await client.head(url, timeout=3)
+            return "reachable"  # any HTTP response means the host is up
+        except Exception as e:
+            return f"unreachable: {type(e).__name__}"
+
+    results = await asyncio.gather(*(probe(url) for url in UPSTREAMS.values()))
+    _upstream_status.update(zip(UPSTREAMS, results))
+    _upstream_checked_at = time.monotonic()
+
+
+def _upstreams() -> dict:
+    """Last known upstream status; kicks off a background refresh when stale."""
+    global _upstream_refresh
+    stale = time.monotonic() - _upstream_checked_at > UPSTREAM_REFRESH_SECONDS
+    if stale and (_upstream_refresh is None or _upstream_refresh.done()):
+        _upstream_refresh = asyncio.create_task(_refresh_upstreams())
+    return dict(_upstream_status)
+
+
+async def readiness() -> tuple[bool, dict]:
+    global _ready_cache
+    now = time.monotonic()
+    if _ready_cache and now - _ready_cache[0] < settings.health_cache_seconds:
+        checks = _ready_cache[1]
+    else:
+        checks = {
+            "database": await _check_database(),
+            "certificate_storage": await _check_storage(),
+        }
+        _ready_cache = (now, checks)
+    ready = _warm and all(result == "ok" for result in checks.values())
+    return ready, {"warm": _warm, "schema": dict(_schema), **checks, "upstreams": _upstreams()}
@@ -1,30 +1,77 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+import time
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
+from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from contextlib import asynccontextmanager
 from pathlib import Path
+from prometheus_client import CONTENT_TYPE_LATEST
 
-from database import init_db
+from database import count_queries, pool_status
 from config import get_settings
-from routers import auth, donations, astrology, admin
+import metrics
+import health
+import profiling
+from rate_limit import limiter
+from routers import auth, donations, astrology, admin, certificates
+from services.http_client import close_http_client
+from services import password_hasher, notification_service
 
 settings = get_settings()
-
-# Ensure upload/cert dirs exist at module load time (before StaticFiles mount)
-Path("certificates").mkdir(exist_ok=True)
+logger = logging.getLogger(__name__)
+
+# Maximum SQL statements per request, keyed by (method, route path); pinned by tests/test_query_budgets.py.
+# Background tasks run after the response and are not counted. Statements run
+# while a streamed body is generated (CSV/ZIP exports) come after the headers:
+# they are not in X-DB-Queries but are added to the request's total once the
+# body is sent, and a total over budget is logged then.
+QUERY_BUDGETS: dict[tuple[str, str], int] = {
+    ("POST", "/api/auth/signup"): 2,
+    ("POST", "/api/auth/login"): 2,
+    ("GET", "/api/auth/me"): 2,
+    ("POST", "/api/donations/create-order"): 3,
+    ("POST", "/api/donations/verify"): 5,
+    ("POST", "/api/donations/webhook/razorpay"): 6,
+    ("POST", "/api/donations/webhook/cashfree"): 3,
+    ("GET", "/api/donations/history"): 4,
+    ("GET", "/api/donations/{donation_id}/certificate"): 3,
+    ("GET", "/api/admin/template"): 6,
+    ("PUT", "/api/admin/template"): 5,
+    ("GET", "/api/admin/template/versions"): 3,
+    ("POST", "/api/admin/template/logo"): 5,
+    ("POST", "/api/admin/template/signature"): 5,
+    ("GET", "/api/admin/donations"): 3,
+    ("GET", "/api/admin/donations/summary"): 2,
+    ("POST", "/api/admin/donations/{donation_id}/resend-certificate"): 4,
+    ("GET", "/api/admin/export/csv"): 2,
+    ("GET", "/api/admin/export/receipts"): 3,  # ZIP: one more per receipt_export.BATCH_SIZE receipts
+    ("POST", "/api/admin/reconcile/settlements"): 8,
+    ("GET", "/api/admin/reconcile/ledger"): 2,
+    ("GET", "/api/admin/profiles"): 1,
+    ("GET", "/api/admin/profiles/{profile_id}"): 1,
+    ("PUT", "/api/admin/profiling"): 1,
+    ("GET", "/api/certificates/{donation_id}"): 2,
+}
+
+# Ensure the upload dir exists at module load time (before StaticFiles mount)
 Path("uploads").mkdir(exist_ok=True)
 
-# Rate limiter
-limiter = Limiter(key_func=get_remote_address)
-
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    init_db()
+    password_hasher.start()
+    notification_service.start()
+    # Initialise the schema and warm caches after the port opens; /health/ready reports 503 until this finishes
+    warm_up = asyncio.create_task(health.warm_up())
     yield
+    warm_up.cancel()
+    await close_http_client()
+    password_hasher.shutdown()
+    notification_service.stop()
 
 
 app = FastAPI(
@@ -54,15 +101,84 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def instrument_request(request: Request, call_next):
+    """
+    Record latency per route template and SQL statements per request, report the
+    statement count in X-DB-Queries and check it against QUERY_BUDGETS
+    (statements run while a body is streamed are checked once it has been sent).
+    Sampled requests are also profiled (see profiling.py).
+    """
+    start = time.perf_counter()
+    profile = profiling.start(request)
+    with count_queries(record=profile is not None) as counter:
+        try:
+            response = await call_next(request)
+        except BaseException:
+            if profile:
+                profile.abort()
+            raise
+    route = request.scope.get("route")
+    route_path = getattr(route, "path", "unmatched")
+    metrics.REQUEST_LATENCY.labels(request.method, route_path, response.status_code).observe(
+        time.perf_counter() - start
+    )
+    budget = QUERY_BUDGETS.get((request.method, route_path))
+    handler_queries = counter.count
+    response.headers["X-DB-Queries"] = str(handler_queries)
+    if budget is not None and handler_queries > budget:
+        logger.warning(f"{request.method} {route_path} ran {handler_queries} queries (budget {budget})")
+        if settings.enforce_query_budgets:
+            if profile:
+                profile.abort()
+            return JSONResponse(
+                {"detail": f"Query budget exceeded: {handler_queries} > {budget}"},
+                status_code=500,
+                headers={"X-DB-Queries": str(handler_queries)},
+            )
+
+    def body_sent():
+        metrics.DB_QUERIES_PER_REQUEST.observe(counter.count)
+        streamed = counter.count - handler_queries
+        if streamed and budget is not None and counter.count > budget:
+            logger.warning(
+                f"{request.method} {route_path} ran {counter.count} queries, {streamed} while streaming (budget {budget})"
+            )
+
+    if profile:
+        profile.attach(request, response, counter)
+    _after_body(response, body_sent)
+    return response
+
+
+def _after_body(response, callback) -> None:
+    """Call callback once the response body has been sent (or abandoned)."""
+    body = response.body_iterator
+
+    async def wrapped():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            callback()
+
+    response.body_iterator = wrapped()
+
+
+# Added last so it wraps instrument_request: ends profiles whose response was never sent
+app.add_middleware(profiling.ProfilingMiddleware)
+
+
 # Static files (uploaded logos, signatures)
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
-app.mount("/certificates", StaticFiles(directory="certificates"), name="certificates")
 
 # Routers
 app.include_router(auth.router, prefix="/api")
 app.include_router(donations.router, prefix="/api")
 app.include_router(astrology.router, prefix="/api")
 app.include_router(admin.router, prefix="/api")
+app.include_router(certificates.router, prefix="/api")
 
 
 @app.get("/")
@@ -71,5 +187,29 @@ def root():
 
 
 @app.get("/health")
-def health():
+@app.get("/health/live")
+def liveness():
     return {"status": "healthy"}
+
+
+@app.get("/health/ready")
+async def readiness():
+    ready, report = await health.readiness()
+    return JSONResponse({"status": "ready" if ready else "not_ready", **report}, status_code=200 if ready else 503)
+
+
+def _check_metrics_token(request: Request) -> None:
+    if settings.metrics_token and request.headers.get("Authorization") != f"Bearer {settings.metrics_token}":
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics(request: Request):
+    _check_metrics_token(request)
+    return Response(metrics.latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/metrics/db-pool")
+def db_pool_metrics(request: Request):
+    _check_metrics_token(request)
+    return pool_status()
@@ -0,0 +1,129 @@
+"""
+Prometheus metrics, exposed on /metrics.
+
+Recording is a dict lookup plus a lock-protected add per observation, so the
+hot paths (every request, every SQL statement) stay cheap. Cache hit ratios
+are derived in PromQL from cache_requests_total{result="hit"|"miss"}.
+
+Under gunicorn (gunicorn.conf.py) PROMETHEUS_MULTIPROC_DIR is set and every
+worker writes its samples to files there, which /metrics aggregates, so a
+scrape covers all workers whichever one answers it. The connection pool
+gauges are per worker and are left out of that aggregate; /metrics/db-pool
+reports the answering worker's pools.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+from prometheus_client.core import GaugeMetricFamily
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route template",
+    ["method", "route", "status"],
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL statements executed per request",
+    buckets=(0, 1, 2, 3, 4, 5, 8, 13, 21, 34),
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "SQL statement execution time",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds", "Latency of calls to payment gateways, Prokerala and SMTP",
+    ["service", "operation", "outcome"],
+)
+CERTIFICATE_RENDER = Histogram(
+    "certificate_render_seconds", "80G certificate PDF render time",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+BACKGROUND_TASKS = Gauge(
+    "background_tasks_in_flight", "Background tasks queued or running", ["task"],
+    multiprocess_mode="livesum",
+)
+BACKGROUND_FAILURES = Counter(
+    "background_task_failures_total", "Background task failures", ["task"],
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by outcome", ["cache", "result"],
+)
+
+
+# Set by profiling for sampled requests; collects (service, operation, outcome, seconds)
+upstream_calls: ContextVar[list | None] = ContextVar("upstream_calls", default=None)
+
+
+@contextmanager
+def observe_upstream(service: str, operation: str):
+    """Time an outbound call; outcome is "error" if the block raises."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        UPSTREAM_LATENCY.labels(service, operation, outcome).observe(elapsed)
+        calls = upstream_calls.get()
+        if calls is not None:
+            calls.append((service, operation, outcome, elapsed))
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def enqueue_background(background_tasks, task: str, fn, *args) -> None:
+    """BackgroundTasks.add_task that keeps background_tasks_in_flight up to date."""
+    gauge = BACKGROUND_TASKS.labels(task)
+    gauge.inc()
+
+    def run():
+        try:
+            fn(*args)
+        finally:
+            gauge.dec()
+
+    background_tasks.add_task(run)
+
+
+class PoolCollector:
+    """Connection pool gauges, read from database.pool_status() at scrape time."""
+
+    def __init__(self, status_fn):
+        self._status_fn = status_fn
+
+    def collect(self):
+        fields = {
+            "checked_out": "db_pool_checked_out",
+            "checked_in": "db_pool_checked_in",
+            "overflow": "db_pool_overflow",
+            "size": "db_pool_size",
+            "wait_seconds_total": "db_pool_wait_seconds_total",
+            "wait_seconds_max": "db_pool_wait_seconds_max",
+            "timeouts": "db_pool_timeouts",
+        }
+        families = {
+            key: GaugeMetricFamily(name, f"Connection pool {key.replace('_', ' ')}", labels=["engine"])
+            for key, name in fields.items()
+        }
+        for engine_name, status in self._status_fn().items():
+            for key, family in families.items():
+                if key in status:
+                    family.add_metric([engine_name], status[key])
+        yield from families.values()
+
+
+def register_pool_collector(status_fn) -> None:
+    REGISTRY.register(PoolCollector(status_fn))
+
+
+def latest() -> bytes:
+    """The /metrics exposition: this process's registry, or every worker's samples in multiprocess mode."""
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return generate_latest()
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry)
+    return generate_latest(registry)
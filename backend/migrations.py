@@ -0,0 +1,174 @@
+"""
+Schema versioning for the backend database.
+
+A fresh database is built from the models with Base.metadata.create_all and
+stamped with LATEST_VERSION. Databases created before versioning (or at an
+older version) get any missing tables from create_all and then have the
+ordered SQL steps below applied, one transaction per version. The applied
+version is kept in the single-row schema_version table.
+"""
+import logging
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary constant for pg_advisory_lock so concurrent workers migrate one at a time
+_MIGRATION_LOCK_ID = 726_001
+
+MIGRATIONS: list[tuple[int, str, list[str]]] = [
+    (1, "payment_transactions settlement columns", [
+        "ALTER TABLE payment_transactions ADD COLUMN IF NOT EXISTS settlement_id VARCHAR(255)",
+        "ALTER TABLE payment_transactions ADD COLUMN IF NOT EXISTS settlement_utr VARCHAR(255)",
+        "ALTER TABLE payment_transactions ADD COLUMN IF NOT EXISTS settled_at TIMESTAMPTZ",
+        "ALTER TABLE payment_transactions ADD COLUMN IF NOT EXISTS reconciled_at TIMESTAMPTZ",
+        "CREATE INDEX IF NOT EXISTS ix_payment_transactions_settlement_id "
+        "ON payment_transactions (settlement_id)",
+    ]),
+    (2, "integer paise amounts", [
+        "ALTER TABLE donations ADD COLUMN amount_paise BIGINT",
+        "UPDATE donations SET amount_paise = ROUND(amount::numeric * 100)",
+        "ALTER TABLE donations ALTER COLUMN amount_paise SET NOT NULL",
+        "ALTER TABLE donations DROP COLUMN amount",
+        "ALTER TABLE payment_transactions "
+        "ADD COLUMN gross_amount_paise BIGINT, "
+        "ADD COLUMN gateway_fee_paise BIGINT, "
+        "ADD COLUMN gateway_tax_paise BIGINT, "
+        "ADD COLUMN gateway_total_deduction_paise BIGINT, "
+        "ADD COLUMN net_receivable_paise BIGINT",
+        "UPDATE payment_transactions SET "
+        "gross_amount_paise = ROUND(gross_amount::numeric * 100), "
+        "gateway_fee_paise = ROUND(gateway_fee::numeric * 100), "
+        "gateway_tax_paise = ROUND(gateway_tax::numeric * 100), "
+        "gateway_total_deduction_paise = ROUND(gateway_total_deduction::numeric * 100), "
+        "net_receivable_paise = ROUND(net_receivable::numeric * 100)",
+        "ALTER TABLE payment_transactions ALTER COLUMN gross_amount_paise SET NOT NULL",
+        "ALTER TABLE payment_transactions "
+        "DROP COLUMN gross_amount, DROP COLUMN gateway_fee, DROP COLUMN gateway_tax, "
+        "DROP COLUMN gateway_total_deduction, DROP COLUMN net_receivable",
+    ]),
+    (3, "raw gateway payloads to JSONB side table", [
+        "ALTER TABLE payment_transactions "
+        "ADD COLUMN IF NOT EXISTS payer_email VARCHAR(255), "
+        "ADD COLUMN IF NOT EXISTS payer_contact VARCHAR(20), "
+        "ADD COLUMN IF NOT EXISTS acquirer_rrn VARCHAR(50)",
+        "CREATE INDEX IF NOT EXISTS ix_payment_transactions_acquirer_rrn "
+        "ON payment_transactions (acquirer_rrn)",
+        # raw_response was cut at 5000 chars, so some rows are not valid JSON;
+        # those are kept verbatim as a JSON string rather than dropped
+        """DO $$
+        DECLARE r RECORD;
+        BEGIN
+          FOR r IN SELECT id, raw_response FROM payment_transactions
+                   WHERE raw_response IS NOT NULL AND raw_response <> '' LOOP
+            BEGIN
+              INSERT INTO payment_transaction_payloads (transaction_id, payload)
+              VALUES (r.id, r.raw_response::jsonb) ON CONFLICT DO NOTHING;
+            EXCEPTION WHEN invalid_text_representation THEN
+              INSERT INTO payment_transaction_payloads (transaction_id, payload)
+              VALUES (r.id, to_jsonb(r.raw_response)) ON CONFLICT DO NOTHING;
+            END;
+          END LOOP;
+        END $$""",
+        "UPDATE payment_transactions t SET "
+        "payer_email = p.payload->>'email', "
+        "payer_contact = p.payload->>'contact', "
+        "acquirer_rrn = p.payload->'acquirer_data'->>'rrn' "
+        "FROM payment_transaction_payloads p "
+        "WHERE p.transaction_id = t.id AND jsonb_typeof(p.payload) = 'object'",
+        "ALTER TABLE payment_transactions DROP COLUMN raw_response",
+    ]),
+    (4, "immutable certificate template versions", [
+        "ALTER TABLE donations ADD COLUMN IF NOT EXISTS certificate_template_version_id INTEGER "
+        "REFERENCES certificate_template_versions (id)",
+        # Version 1 records what certificates were actually rendered with so
+        # far: the renderer ignored header_text, font_family and layout_config
+        """INSERT INTO certificate_template_versions (template_id, version, content, created_at)
+        SELECT t.id, 1, json_build_object(
+            'name', t.name, 'logo_path', t.logo_path, 'signature_path', t.signature_path,
+            'primary_color', t.primary_color, 'secondary_color', t.secondary_color, 'font_family', NULL,
+            'ngo_name', t.ngo_name, 'ngo_pan', t.ngo_pan, 'ngo_80g_reg', t.ngo_80g_reg,
+            'ngo_12a_reg', t.ngo_12a_reg, 'ngo_address', t.ngo_address, 'ngo_phone', t.ngo_phone,
+            'ngo_email', t.ngo_email, 'header_text', NULL, 'footer_text', t.footer_text,
+            'thank_you_message', t.thank_you_message, 'layout_config', NULL
+        ), now()
+        FROM certificate_templates t
+        WHERE NOT EXISTS (SELECT 1 FROM certificate_template_versions v WHERE v.template_id = t.id)""",
+        "UPDATE donations SET certificate_template_version_id = v.id "
+        "FROM certificate_template_versions v "
+        "WHERE v.version = 1 AND v.template_id = "
+        "(SELECT min(id) FROM certificate_templates WHERE is_active) "
+        "AND donations.certificate_path IS NOT NULL",
+    ]),
+    (5, "donation history index and donor summaries", [
+        "CREATE INDEX IF NOT EXISTS ix_donations_user_id_id ON donations (user_id, id)",
+        "CREATE INDEX IF NOT EXISTS ix_donations_user_id_updated_at ON donations (user_id, updated_at)",
+        # Financial years run April-March in IST; see donor_history.financial_year
+        """INSERT INTO donor_summaries (user_id, financial_year, cause, donation_count, amount_paise)
+        SELECT user_id,
+               EXTRACT(YEAR FROM (created_at AT TIME ZONE 'Asia/Kolkata') - INTERVAL '3 months')::int,
+               COALESCE(cause, 'GENERAL'), count(*), sum(amount_paise)
+        FROM donations
+        WHERE status = 'SUCCESS' AND user_id IS NOT NULL
+        GROUP BY 1, 2, 3
+        ON CONFLICT DO NOTHING""",
+    ]),
+    (6, "guest donation lookup indexes", [
+        "CREATE INDEX IF NOT EXISTS ix_donations_guest_email ON donations (lower(donor_email)) "
+        "WHERE user_id IS NULL",
+        "CREATE INDEX IF NOT EXISTS ix_donations_guest_phone "
+        "ON donations (right(regexp_replace(donor_phone, '[^0-9]', '', 'g'), 10)) WHERE user_id IS NULL",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(engine: Engine) -> int | None:
+    """Applied schema version, or None if the database is unversioned. Read-only: no DDL, no lock."""
+    with engine.connect() as conn:
+        if conn.execute(text("SELECT to_regclass('schema_version')")).scalar() is None:
+            return None
+        return conn.execute(text("SELECT version FROM schema_version")).scalar()
+
+
+def _current_version(conn) -> int | None:
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    return conn.execute(text("SELECT version FROM schema_version")).scalar()
+
+
+def migrate(engine: Engine) -> int:
+    """Bring the database up to LATEST_VERSION. Returns the resulting version."""
+    from database import Base
+    import models  # noqa: F401 — registers every table on Base.metadata
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": _MIGRATION_LOCK_ID})
+        try:
+            version = _current_version(conn)
+            legacy = conn.execute(text("SELECT to_regclass('donations') IS NOT NULL")).scalar()
+            conn.commit()
+
+            Base.metadata.create_all(bind=conn)
+            conn.commit()
+
+            if version is None:
+                # Unversioned: a pre-existing schema starts at 0, a fresh one is already current
+                version = 0 if legacy else LATEST_VERSION
+                conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {"v": version})
+                conn.commit()
+
+            for target, description, statements in MIGRATIONS:
+                if target <= version:
+                    continue
+                logger.info(f"Applying migration {target}: {description}")
+                for statement in statements:
+                    conn.execute(text(statement))
+                conn.execute(text("UPDATE schema_version SET version = :v"), {"v": target})
+                conn.commit()
+                version = target
+            return version
+        finally:
+            conn.rollback()
+            conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _MIGRATION_LOCK_ID})
+            conn.commit()
@@ -1,4 +1,7 @@
 from .user import User
 from .donation import Donation, DonationType, PaymentGateway, DonationStatus, DonationCause
-from .certificate_template import CertificateTemplate
+from .certificate_template import CertificateTemplate, CertificateTemplateVersion
 from .payment_transaction import PaymentTransaction, TransactionStatus, PaymentMethod
+from .payment_payload import PaymentTransactionPayload
+from .rate_limit import RateLimitWindow
+from .donor_summary import DonorSummary
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON, ForeignKey, UniqueConstraint
 from sqlalchemy.sql import func
 from database import Base
 
@@ -42,3 +42,28 @@ class CertificateTemplate(Base):
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+# Template columns that affect a rendered certificate, snapshotted per version
+VERSIONED_FIELDS = (
+    "name", "logo_path", "signature_path", "primary_color", "secondary_color", "font_family",
+    "ngo_name", "ngo_pan", "ngo_80g_reg", "ngo_12a_reg", "ngo_address", "ngo_phone", "ngo_email",
+    "header_text", "footer_text", "thank_you_message", "layout_config",
+)
+
+
+class CertificateTemplateVersion(Base):
+    """
+    Immutable snapshot of a CertificateTemplate, published on every change.
+    Donations reference the version their certificate was issued with, so a
+    later template edit never alters a historic receipt. Rows are never updated.
+    """
+    __tablename__ = "certificate_template_versions"
+
+    id = Column(Integer, primary_key=True)
+    template_id = Column(Integer, ForeignKey("certificate_templates.id"), nullable=False)
+    version = Column(Integer, nullable=False)
+    content = Column(JSON, nullable=False)  # VERSIONED_FIELDS -> value
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (UniqueConstraint("template_id", "version"),)
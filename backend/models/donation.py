@@ -1,8 +1,10 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, ForeignKey, Enum
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, Text, ForeignKey, Enum, Index
+from sqlalchemy.sql import func, literal
 from sqlalchemy.orm import relationship
 import enum
+from decimal import Decimal
 from database import Base
+from money import to_rupees
 
 
 class DonationType(str, enum.Enum):
@@ -50,7 +52,7 @@ class Donation(Base):
     on_behalf_of = Column(Boolean, default=False)
 
     # Donation details
-    amount = Column(Float, nullable=False)
+    amount_paise = Column(BigInteger, nullable=False)
     currency = Column(String(10), default="INR")
     cause = Column(Enum(DonationCause), default=DonationCause.GENERAL)
     donation_type = Column(Enum(DonationType), default=DonationType.ONE_TIME)
@@ -67,8 +69,46 @@ class Donation(Base):
     certificate_sent = Column(Boolean, default=False)
     certificate_path = Column(String(500), nullable=True)
     certificate_sent_at = Column(DateTime(timezone=True), nullable=True)
+    certificate_template_version_id = Column(
+        Integer, ForeignKey("certificate_template_versions.id"), nullable=True
+    )  # template version the certificate was issued with
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     user = relationship("User", backref="donations")
+
+    __table_args__ = (
+        Index("ix_donations_user_id_id", "user_id", "id"),  # donation history, newest first
+        Index("ix_donations_user_id_updated_at", "user_id", "updated_at"),  # history ETag
+    )
+
+    @property
+    def amount(self) -> Decimal:
+        """Donation amount in rupees."""
+        return to_rupees(self.amount_paise)
+
+
+# Unclaimed guest donations by normalised email and phone (last ten digits),
+# for donor_history.link_guest_donations
+def guest_email_key(email):
+    return func.lower(email)
+
+
+def guest_phone_key(phone):
+    return func.right(func.regexp_replace(phone, _inline("[^0-9]"), _inline(""), _inline("g")), _inline(10))
+
+
+def _inline(value):
+    """A constant rendered into the SQL rather than bound, so queries match the index expression."""
+    return literal(value, literal_execute=True)
+
+
+Index(
+    "ix_donations_guest_email", guest_email_key(Donation.donor_email),
+    postgresql_where=Donation.user_id.is_(None),
+)
+Index(
+    "ix_donations_guest_phone", guest_phone_key(Donation.donor_phone),
+    postgresql_where=Donation.user_id.is_(None),
+)
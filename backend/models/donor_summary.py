@@ -0,0 +1,21 @@
+"""
+Per-donor totals of successful donations, for the donation history summary.
+
+One row per user, financial year and cause, kept up to date by
+services.donor_history whenever a donation enters or leaves SUCCESS, so the
+history page reads at most a few dozen rows instead of summing every
+donation the user has made.
+"""
+from sqlalchemy import Column, Integer, BigInteger, ForeignKey, Enum
+from database import Base
+from models.donation import DonationCause
+
+
+class DonorSummary(Base):
+    __tablename__ = "donor_summaries"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    financial_year = Column(Integer, primary_key=True)  # April-March, by starting year: 2026 = FY 2026-27
+    cause = Column(Enum(DonationCause), primary_key=True)
+    donation_count = Column(Integer, nullable=False)
+    amount_paise = Column(BigInteger, nullable=False)
@@ -0,0 +1,30 @@
+"""
+Complete raw gateway payloads, one row per PaymentTransaction.
+
+Kept out of payment_transactions so admin and reconciliation scans read narrow
+rows; JSONB values over ~2KB are compressed out of line by Postgres TOAST.
+Fields that are queried routinely are copied into typed columns on
+PaymentTransaction; the GIN index covers ad-hoc containment lookups such as
+payload @> '{"acquirer_data": {"rrn": "..."}}'.
+"""
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+from database import Base
+
+
+class PaymentTransactionPayload(Base):
+    __tablename__ = "payment_transaction_payloads"
+
+    transaction_id = Column(
+        Integer, ForeignKey("payment_transactions.id", ondelete="CASCADE"), primary_key=True
+    )
+    payload = Column(JSONB, nullable=False)
+    received_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index(
+            "ix_payment_transaction_payloads_payload", "payload",
+            postgresql_using="gin", postgresql_ops={"payload": "jsonb_path_ops"},
+        ),
+    )
@@ -2,6 +2,8 @@
 Separate table for every payment transaction — including gateway charges,
 tax on charges, and net receivable. Linked to donations table.
 
+All amounts are stored as integer paise (see money.py).
+
 Razorpay fee breakdown:
   - platform_fee (paise): Razorpay's fee
   - tax (paise): GST on platform fee (18%)
@@ -10,8 +12,14 @@ Razorpay fee breakdown:
 
 Cashfree fee breakdown:
   - Available via GET /orders/{order_id}/payments
+
+Settlement columns are filled in bulk by services/settlement_service.py from
+Razorpay's daily settlement recon report.
+
+The full gateway response lives in payment_transaction_payloads
+(models/payment_payload.py); frequently queried fields are extracted here.
 """
-from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, ForeignKey, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, Text, ForeignKey, Enum
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -56,12 +64,12 @@ class PaymentTransaction(Base):
     gateway_signature = Column(String(500), nullable=True)    # signature for verification
     subscription_id = Column(String(255), nullable=True)      # for recurring payments
 
-    # Amounts (all in INR)
-    gross_amount = Column(Float, nullable=False)              # amount donor intended to pay
-    gateway_fee = Column(Float, nullable=True)                # fee charged by gateway
-    gateway_tax = Column(Float, nullable=True)                # GST on gateway fee (18%)
-    gateway_total_deduction = Column(Float, nullable=True)    # fee + tax
-    net_receivable = Column(Float, nullable=True)             # gross - total_deduction
+    # Amounts (all in paise)
+    gross_amount_paise = Column(BigInteger, nullable=False)           # amount donor intended to pay
+    gateway_fee_paise = Column(BigInteger, nullable=True)             # fee charged by gateway
+    gateway_tax_paise = Column(BigInteger, nullable=True)             # GST on gateway fee (18%)
+    gateway_total_deduction_paise = Column(BigInteger, nullable=True) # fee + tax
+    net_receivable_paise = Column(BigInteger, nullable=True)          # gross - total_deduction
     currency = Column(String(5), default="INR")
 
     # Payment details
@@ -73,12 +81,21 @@ class PaymentTransaction(Base):
     upi_vpa = Column(String(100), nullable=True)              # UPI VPA/ID
     wallet = Column(String(50), nullable=True)                # Paytm / PhonePe etc.
     international = Column(Boolean, default=False)
+    payer_email = Column(String(255), nullable=True)          # email entered at checkout
+    payer_contact = Column(String(20), nullable=True)         # phone entered at checkout
+    acquirer_rrn = Column(String(50), nullable=True, index=True)  # bank RRN, used for disputes
 
     # Timestamps
     initiated_at = Column(DateTime(timezone=True), server_default=func.now())
     captured_at = Column(DateTime(timezone=True), nullable=True)
     failed_at = Column(DateTime(timezone=True), nullable=True)
 
+    # Settlement (filled by daily reconciliation)
+    settlement_id = Column(String(255), nullable=True, index=True)
+    settlement_utr = Column(String(255), nullable=True)
+    settled_at = Column(DateTime(timezone=True), nullable=True)
+    reconciled_at = Column(DateTime(timezone=True), nullable=True)
+
     # Error details (for failed payments)
     error_code = Column(String(100), nullable=True)
     error_description = Column(Text, nullable=True)
@@ -86,8 +103,8 @@ class PaymentTransaction(Base):
     error_step = Column(String(100), nullable=True)           # payment_authorization etc.
     error_reason = Column(String(100), nullable=True)
 
-    # Raw gateway response (JSON stored as text)
-    raw_response = Column(Text, nullable=True)
-
     donation = relationship("Donation", backref="transactions")
     user = relationship("User", backref="transactions")
+    payload = relationship(
+        "PaymentTransactionPayload", uselist=False, cascade="all, delete-orphan", passive_deletes=True,
+    )
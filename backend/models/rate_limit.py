@@ -0,0 +1,18 @@
+"""
+Shared rate-limit counters (see rate_limit.py).
+
+One row per key and window. UNLOGGED: counters are cheap to lose in a crash
+and skipping the WAL keeps the per-request upsert fast.
+"""
+from sqlalchemy import Column, String, BigInteger, Integer, Float
+from database import Base
+
+
+class RateLimitWindow(Base):
+    __tablename__ = "rate_limit_windows"
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+    key = Column(String(255), primary_key=True)
+    window_index = Column(BigInteger, primary_key=True)  # floor(epoch / expiry); -1 for fixed-window counters
+    hits = Column(Integer, nullable=False)
+    expires_at = Column(Float, nullable=False, index=True)  # epoch seconds
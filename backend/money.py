@@ -0,0 +1,25 @@
+"""
+Money helpers. Amounts are stored as integer paise (BIGINT) and only become
+rupees at the edges: request validation, API responses, PDFs and emails.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Annotated
+from pydantic import Field
+
+PAISE_PER_RUPEE = 100
+_PAISA = Decimal("0.01")
+
+# Request-side rupee amount: exact decimal, at most 2 places, must be positive
+RupeeAmount = Annotated[Decimal, Field(gt=0, max_digits=12, decimal_places=2)]
+
+
+def to_paise(rupees: Decimal | int | float | str) -> int:
+    """Convert rupees to integer paise, rounding half-up (never truncating)."""
+    return int((Decimal(str(rupees)) * PAISE_PER_RUPEE).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_rupees(paise: int | Decimal | None) -> Decimal | None:
+    """Convert paise (or a SQL SUM of paise) to a 2-place rupee Decimal."""
+    if paise is None:
+        return None
+    return (Decimal(paise) / PAISE_PER_RUPEE).quantize(_PAISA)
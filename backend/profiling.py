@@ -0,0 +1,275 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled when it carries "X-Profile: <profiling_token>" or is
+picked by the admin-set sample rate. The profile covers the whole response,
+including streamed bodies such as the CSV export, and records a call tree
+(pyinstrument when installed, cProfile otherwise), every SQL statement with
+its duration and every upstream call made through metrics.observe_upstream.
+The last profiling_buffer_size profiles are kept in memory for
+/api/admin/profiles; the response carries X-Profile-Id to look it up.
+
+Both profilers hook a single thread. Sync endpoints and dependencies, and
+sync iterators streamed by StreamingResponse, run in the threadpool, so
+while a request is being profiled anyio's run_sync is wrapped: a threadpool
+job started for that request runs under a profiler of its own in its worker
+thread, and its results are merged into the request's report. (On Python
+3.12+ cProfile already sees every thread, so only pyinstrument needs this.)
+The wrapper is removed when the profile ends.
+
+ProfilingMiddleware, the outermost middleware, ends the profile once the
+response has been sent, or when it never is (the client disconnected before
+the body started, or the app raised), so the profiler is always stopped and
+the next request can be profiled.
+
+Unsampled requests pay one header lookup and one comparison. Only one
+request is profiled at a time per process: overlapping sessions would
+corrupt each other, and a request arriving while another is being profiled
+is simply served unprofiled.
+
+The sample rate and the profile buffer are per worker process: with several
+gunicorn workers an admin's rate change and the profile list only cover the
+worker that served the admin request (the responses include its pid).
+"""
+import cProfile
+import functools
+import io
+import itertools
+import logging
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import anyio.to_thread
+from config import get_settings
+import metrics
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+MAX_STATEMENT_CHARS = 2000
+
+_sample_rate = settings.profiling_sample_rate
+_profiles: deque[dict] = deque(maxlen=settings.profiling_buffer_size)
+_ids = itertools.count(1)
+_active: "ProfileSession | None" = None
+_session: ContextVar["ProfileSession | None"] = ContextVar("profile_session", default=None)
+_run_sync = anyio.to_thread.run_sync
+
+# cProfile uses sys.monitoring from 3.12, which covers all threads and allows one profiler at a time
+_CPROFILE_COVERS_THREADS = sys.version_info >= (3, 12)
+
+
+def get_sample_rate() -> float:
+    return _sample_rate
+
+
+def set_sample_rate(rate: float) -> None:
+    global _sample_rate
+    _sample_rate = rate
+
+
+def should_profile(request) -> bool:
+    if _sample_rate and random.random() < _sample_rate:
+        return True
+    return bool(settings.profiling_token) and request.headers.get("X-Profile") == settings.profiling_token
+
+
+def _start_profiler(async_mode: str = "enabled"):
+    try:
+        from pyinstrument import Profiler
+        profiler = Profiler(async_mode=async_mode)
+        profiler.start()
+        return "pyinstrument", profiler
+    except ImportError:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return "cProfile", profiler
+
+
+def _disable(kind: str, profiler) -> None:
+    if kind == "pyinstrument":
+        profiler.stop()
+    else:
+        profiler.disable()
+
+
+def _stop_profiler(kind: str, profiler, threads: list = ()) -> str:
+    """Stop profiler and render its report merged with the finished thread profilers."""
+    _disable(kind, profiler)
+    if kind == "pyinstrument":
+        from pyinstrument.renderers import ConsoleRenderer
+        from pyinstrument.session import Session
+        session = profiler.last_session
+        for thread_profiler in threads:
+            session = Session.combine(session, thread_profiler.last_session)
+        return ConsoleRenderer(unicode=True, color=False).render(session)
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    for thread_profiler in threads:
+        stats.add(thread_profiler)
+    stats.sort_stats("cumulative").print_stats(40)
+    return out.getvalue()
+
+
+class ProfileSession:
+    """State for one profiled request, from middleware entry to the last body chunk."""
+
+    def __init__(self, request):
+        self.id = next(_ids)
+        self.method = request.method
+        self.path = request.url.path
+        self.started_at = datetime.now(timezone.utc)
+        self._kind, self._profiler = _start_profiler()
+        self._threads: list = []
+        self._threads_lock = threading.Lock()
+        self._response = None
+        self._ended = False
+        self.upstream: list = []
+        self._upstream_token = metrics.upstream_calls.set(self.upstream)
+        self._session_token = _session.set(self)
+        self._start = time.perf_counter()
+
+    def _leave_context(self) -> None:
+        if self._session_token is not None:
+            metrics.upstream_calls.reset(self._upstream_token)
+            _session.reset(self._session_token)
+            self._session_token = None
+
+    def _release(self) -> None:
+        global _active
+        if _active is self:
+            _active = None
+            anyio.to_thread.run_sync = _run_sync
+
+    def attach(self, request, response, counter) -> None:
+        """
+        Record the response; the profile is finished by ProfilingMiddleware once
+        the body has been sent. call_next hands back the response before a
+        streamed body is generated.
+        """
+        self._leave_context()
+        self._route = request.scope.get("route")
+        self._response, self._counter = response, counter
+        response.headers["X-Profile-Id"] = str(self.id)
+
+    def abort(self) -> None:
+        """No response will be sent (the request raised or was replaced); drop the profile."""
+        if self._ended:
+            return
+        self._ended = True
+        self._leave_context()
+        try:
+            _stop_profiler(self._kind, self._profiler)
+        finally:
+            self._release()
+
+    def end(self) -> None:
+        """Finish the profile of the attached response, or drop it if none was attached."""
+        if self._ended:
+            return
+        if self._response is None:
+            self.abort()
+            return
+        self._ended = True
+        try:
+            duration = time.perf_counter() - self._start
+            with self._threads_lock:
+                threads = list(self._threads)
+            report = _stop_profiler(self._kind, self._profiler, threads)
+            route = getattr(self._route, "path", None)
+            _profiles.append({
+                "id": self.id,
+                "method": self.method,
+                "path": self.path,
+                "route": route,
+                "status": self._response.status_code,
+                "started_at": self.started_at.isoformat(),
+                "duration_ms": round(duration * 1000, 2),
+                "profiler": self._kind,
+                "sql": [
+                    {"statement": stmt[:MAX_STATEMENT_CHARS], "duration_ms": round(elapsed * 1000, 3)}
+                    for stmt, elapsed in self._counter.statements or []
+                ],
+                "upstream": [
+                    {"service": s, "operation": op, "outcome": outcome, "duration_ms": round(elapsed * 1000, 2)}
+                    for s, op, outcome, elapsed in self.upstream
+                ],
+                "report": report,
+            })
+        except Exception:
+            logger.exception(f"Could not record profile for {self.method} {self.path}")
+        finally:
+            self._release()
+
+    def run_threaded(self, func, *args):
+        """Run func, a threadpool job of this request, under a profiler for its worker thread."""
+        if self._kind == "cProfile" and _CPROFILE_COVERS_THREADS:
+            return func(*args)
+        kind, profiler = _start_profiler(async_mode="disabled")
+        try:
+            return func(*args)
+        finally:
+            _disable(kind, profiler)
+            with self._threads_lock:
+                self._threads.append(profiler)
+
+
+async def _run_sync_profiled(func, *args, **kwargs):
+    session = _session.get()
+    if session is not None:
+        func = functools.partial(session.run_threaded, func)
+    return await _run_sync(func, *args, **kwargs)
+
+
+_SCOPE_KEY = "profiling.session"
+
+
+def start(request) -> ProfileSession | None:
+    """Begin profiling this request if it is sampled and no other profile is running."""
+    global _active
+    if not should_profile(request) or _active is not None:
+        return None
+    try:
+        session = ProfileSession(request)
+    except Exception:
+        logger.exception("Could not start profiler")
+        return None
+    _active = session
+    # Threadpool jobs of the profiled request get a profiler of their own
+    anyio.to_thread.run_sync = _run_sync_profiled
+    request.scope[_SCOPE_KEY] = session
+    return session
+
+
+class ProfilingMiddleware:
+    """
+    Outermost ASGI middleware: ends the request's profile after the response
+    has been sent, or after the app gave up on sending it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            session = scope.get(_SCOPE_KEY)
+            if session is not None:
+                session.end()
+
+
+def list_profiles() -> list[dict]:
+    """Newest first, without the call tree."""
+    return [{k: v for k, v in p.items() if k not in ("report", "sql", "upstream")}
+            | {"sql_count": len(p["sql"]), "upstream_count": len(p["upstream"])}
+            for p in reversed(_profiles)]
+
+
+def get_profile(profile_id: int) -> dict | None:
+    return next((p for p in _profiles if p["id"] == profile_id), None)
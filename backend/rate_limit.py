@@ -0,0 +1,199 @@
+"""
+Rate limiting shared by all worker processes.
+
+slowapi keeps counters in a `limits` storage; the default in-memory one is
+per process, so with several uvicorn workers every limit was effectively
+multiplied by the worker count. PostgresStorage keeps them in the
+rate_limit_windows table instead (rate_limit_storage_uri = "postgres://"),
+and "redis://..." works as well if redis is installed.
+
+The limiter uses the sliding window counter strategy: the previous window's
+count, weighted by how much of it still overlaps the last `expiry` seconds,
+plus the current window's count. A hit increments the current window with an
+upsert and rolls back if that takes the weighted count over the limit. The
+upsert's row lock serialises concurrent hits on the same key across
+processes, so a limit is never overshot.
+
+slowapi checks limits synchronously in the endpoint wrapper, which for an
+async endpoint means a blocking database round trip on the event loop: a
+slow database would stall every request on the worker. Rate-limited routes
+therefore also declare the check_limits dependency, which runs the same
+check in the threadpool and marks it done, so the wrapper skips it. The
+storage has its own one-connection engine with a short pool timeout,
+separate from the request pools and the per-request query budgets. If the database is
+unreachable slowapi falls back to in-memory limits.
+
+Clients are keyed by client_address, not by the address uvicorn's proxy
+headers produce: with every proxy trusted, uvicorn takes the leftmost
+X-Forwarded-For entry, which the client writes, so rotating the header would
+open a fresh bucket on every request.
+"""
+import random
+import time
+from math import floor
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+from limits.storage import Storage, SlidingWindowCounterSupport
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+from config import get_settings
+from database import RATE_LIMIT_CONNECTIONS
+
+settings = get_settings()
+
+# Fraction of hits that also delete expired windows
+_CLEANUP_PROBABILITY = 0.001
+
+_ACQUIRE = text("""
+    WITH cur AS (
+        INSERT INTO rate_limit_windows (key, window_index, hits, expires_at)
+        VALUES (:key, :window, :amount, :expires_at)
+        ON CONFLICT (key, window_index) DO UPDATE SET hits = rate_limit_windows.hits + :amount
+        RETURNING hits
+    )
+    SELECT cur.hits,
+           COALESCE((SELECT hits FROM rate_limit_windows WHERE key = :key AND window_index = :window - 1), 0)
+    FROM cur
+""")
+_WINDOWS = text("""
+    SELECT window_index, hits FROM rate_limit_windows
+    WHERE key = :key AND window_index IN (:window, :window - 1)
+""")
+_INCR = text("""
+    INSERT INTO rate_limit_windows (key, window_index, hits, expires_at)
+    VALUES (:key, -1, :amount, :expires_at)
+    ON CONFLICT (key, window_index) DO UPDATE SET
+        hits = CASE WHEN rate_limit_windows.expires_at <= :now THEN :amount
+                    ELSE rate_limit_windows.hits + :amount END,
+        expires_at = CASE WHEN rate_limit_windows.expires_at <= :now THEN :expires_at
+                          ELSE rate_limit_windows.expires_at END
+    RETURNING hits
+""")
+
+
+class PostgresStorage(Storage, SlidingWindowCounterSupport):
+    """`limits` storage backed by the rate_limit_windows table."""
+
+    STORAGE_SCHEME = ["postgres"]
+
+    def __init__(self, uri: str | None = None, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        # Counted in the worker's connection budget by database._pool_kwargs
+        pool = {"poolclass": NullPool} if settings.db_pgbouncer else {
+            "pool_size": RATE_LIMIT_CONNECTIONS, "max_overflow": 0, "pool_timeout": 1,
+            "pool_recycle": settings.db_pool_recycle,
+        }
+        self._engine = create_engine(settings.database_url, connect_args={"connect_timeout": 2}, **pool)
+
+    @property
+    def base_exceptions(self):
+        from sqlalchemy.exc import SQLAlchemyError
+        return SQLAlchemyError
+
+    # ── Sliding window counter ────────────────────────────────────────────────
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+        now = time.time()
+        window = int(now // expiry)
+        previous_weight = (expiry - now % expiry) / expiry
+        with self._engine.connect() as conn:
+            current, previous = conn.execute(_ACQUIRE, {
+                "key": key, "window": window, "amount": amount, "expires_at": (window + 2) * expiry,
+            }).one()
+            if floor(previous * previous_weight + current) > limit:
+                conn.rollback()
+                return False
+            if random.random() < _CLEANUP_PROBABILITY:
+                conn.execute(text("DELETE FROM rate_limit_windows WHERE expires_at < :now"), {"now": now})
+            conn.commit()
+        return True
+
+    def get_sliding_window(self, key: str, expiry: int) -> tuple[int, float, int, float]:
+        now = time.time()
+        window = int(now // expiry)
+        current_ttl = expiry - now % expiry
+        with self._engine.connect() as conn:
+            hits = dict(conn.execute(_WINDOWS, {"key": key, "window": window}).all())
+        return hits.get(window - 1, 0), current_ttl, hits.get(window, 0), current_ttl + expiry
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        self.clear(key)
+
+    # ── Fixed window (Storage interface) ──────────────────────────────────────
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        now = time.time()
+        with self._engine.begin() as conn:
+            return conn.execute(_INCR, {
+                "key": key, "amount": amount, "now": now, "expires_at": now + expiry,
+            }).scalar_one()
+
+    def get(self, key: str) -> int:
+        with self._engine.connect() as conn:
+            return conn.execute(text(
+                "SELECT hits FROM rate_limit_windows WHERE key = :key AND window_index = -1 AND expires_at > :now"
+            ), {"key": key, "now": time.time()}).scalar() or 0
+
+    def get_expiry(self, key: str) -> float:
+        with self._engine.connect() as conn:
+            expires_at = conn.execute(text(
+                "SELECT expires_at FROM rate_limit_windows WHERE key = :key AND window_index = -1"
+            ), {"key": key}).scalar()
+        return expires_at or time.time()
+
+    def check(self) -> bool:
+        try:
+            with self._engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return True
+        except Exception:
+            return False
+
+    def reset(self) -> int | None:
+        with self._engine.begin() as conn:
+            return conn.execute(text("DELETE FROM rate_limit_windows")).rowcount
+
+    def clear(self, key: str) -> None:
+        with self._engine.begin() as conn:
+            conn.execute(text("DELETE FROM rate_limit_windows WHERE key = :key"), {"key": key})
+
+
+def client_address(request: Request) -> str:
+    """
+    The address the outermost trusted proxy saw: with trusted_proxy_hops
+    proxies in front, the X-Forwarded-For entry that many from the right
+    (each proxy appends its peer; anything further left came from the
+    client). Without proxies, or with fewer entries than hops, the peer.
+    """
+    hops = settings.trusted_proxy_hops
+    if hops:
+        forwarded = [
+            entry.strip()
+            for header in request.headers.getlist("x-forwarded-for")
+            for entry in header.split(",")
+            if entry.strip()
+        ]
+        if len(forwarded) >= hops:
+            return forwarded[-hops]
+    return get_remote_address(request)
+
+
+limiter = Limiter(
+    key_func=client_address,
+    storage_uri=settings.rate_limit_storage_uri,
+    strategy="sliding-window-counter",
+    in_memory_fallback_enabled=True,
+)
+
+
+async def check_limits(request: Request) -> None:
+    """
+    Dependency for routes decorated with limiter.limit / shared_limit: apply
+    their limits off the event loop. Raises RateLimitExceeded (429).
+    """
+    await run_in_threadpool(limiter._check_request_limit, request, request.scope["endpoint"], False)
+    request.state._rate_limiting_complete = True
@@ -1,27 +1,34 @@
 """
-Admin panel router: certificate template management, donation overview, CSV export.
+Admin panel router: certificate template management, donation overview, CSV export,
+settlement reconciliation, request profiles.
 """
 import csv
 import io
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from fastapi.responses import StreamingResponse
+import os
+from datetime import date, datetime, timedelta
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from database import get_db
 from models.donation import Donation, DonationStatus
-from models.certificate_template import CertificateTemplate
+from models.certificate_template import CertificateTemplate, CertificateTemplateVersion
 from routers.auth import get_admin_user
-from services.certificate_service import generate_80g_certificate
+from services.auth_service import CurrentUser
+from services.certificate_service import (
+    certificate_for_donation, invalidate_template_cache, publish_template_version, template_for_donation,
+)
 from services.email_service import send_donation_confirmation
-from models.user import User
-import aiofiles
-from pathlib import Path
+from services.image_service import InvalidImage, UploadTooLarge, save_certificate_image
+from services.receipt_export import TooManyReceipts, iter_receipts_zip, receipts_pdf
+from services import razorpay_service, settlement_service
+from money import to_rupees
+import profiling
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
-
 
 # ── Schemas ───────────────────────────────────────────────────────────────────
 
@@ -40,19 +47,26 @@ class TemplateUpdate(BaseModel):
     header_text: str | None = None
     footer_text: str | None = None
     thank_you_message: str | None = None
+    layout_config: dict | None = None   # see services/certificate_layout.py
+
+
+class ProfilingUpdate(BaseModel):
+    sample_rate: float = Field(ge=0, le=1)
 
 
 # ── Certificate Template ──────────────────────────────────────────────────────
 
 @router.get("/template")
-def get_template(db: Session = Depends(get_db), _: User = Depends(get_admin_user)):
+def get_template(db: Session = Depends(get_db), _: CurrentUser = Depends(get_admin_user)):
     t = db.query(CertificateTemplate).filter(CertificateTemplate.is_active == True).first()
     if not t:
         # Create default
         t = CertificateTemplate()
         db.add(t)
+        publish_template_version(db, t)
         db.commit()
         db.refresh(t)
+        invalidate_template_cache()
     return t
 
 
@@ -60,55 +74,86 @@ def get_template(db: Session = Depends(get_db), _: User = Depends(get_admin_user
 def update_template(
     req: TemplateUpdate,
     db: Session = Depends(get_db),
-    _: User = Depends(get_admin_user),
+    _: CurrentUser = Depends(get_admin_user),
 ):
+    if req.layout_config is not None:
+        from services.certificate_layout import LayoutError, parse_layout  # imports ReportLab
+        try:
+            parse_layout(req.layout_config)
+        except LayoutError as e:
+            raise HTTPException(400, f"Invalid layout_config: {e}")
     t = db.query(CertificateTemplate).filter(CertificateTemplate.is_active == True).first()
     if not t:
         t = CertificateTemplate()
         db.add(t)
     for field, value in req.model_dump(exclude_none=True).items():
         setattr(t, field, value)
+    version = publish_template_version(db, t)
+    result = {"message": "Template updated", "template_id": t.id, "version": version.version}
     db.commit()
-    db.refresh(t)
-    return {"message": "Template updated", "template_id": t.id}
+    invalidate_template_cache()
+    return result
+
+
+@router.get("/template/versions")
+def list_template_versions(db: Session = Depends(get_db), _: CurrentUser = Depends(get_admin_user)):
+    """Published versions of the active template, newest first."""
+    t = db.query(CertificateTemplate).filter(CertificateTemplate.is_active == True).first()
+    if not t:
+        return []
+    versions = (
+        db.query(CertificateTemplateVersion)
+        .filter(CertificateTemplateVersion.template_id == t.id)
+        .order_by(CertificateTemplateVersion.version.desc())
+        .all()
+    )
+    return [
+        {"id": v.id, "version": v.version, "created_at": v.created_at, "content": v.content}
+        for v in versions
+    ]
 
 
 @router.post("/template/logo")
 async def upload_logo(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    _: User = Depends(get_admin_user),
+    _: CurrentUser = Depends(get_admin_user),
 ):
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(400, "File must be an image")
-    path = UPLOAD_DIR / f"logo_{file.filename}"
-    async with aiofiles.open(path, "wb") as f:
-        content = await file.read()
-        await f.write(content)
+    key = await _save_image(file, "logo")
     t = db.query(CertificateTemplate).filter(CertificateTemplate.is_active == True).first()
     if t:
-        t.logo_path = str(path)
+        t.logo_path = key
+        publish_template_version(db, t)
         db.commit()
-    return {"logo_path": str(path)}
+        invalidate_template_cache()
+    return {"logo_path": key}
 
 
 @router.post("/template/signature")
 async def upload_signature(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    _: User = Depends(get_admin_user),
+    _: CurrentUser = Depends(get_admin_user),
 ):
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(400, "File must be an image")
-    path = UPLOAD_DIR / f"signature_{file.filename}"
-    async with aiofiles.open(path, "wb") as f:
-        content = await file.read()
-        await f.write(content)
+    key = await _save_image(file, "signature")
     t = db.query(CertificateTemplate).filter(CertificateTemplate.is_active == True).first()
     if t:
-        t.signature_path = str(path)
+        t.signature_path = key
+        publish_template_version(db, t)
         db.commit()
-    return {"signature_path": str(path)}
+        invalidate_template_cache()
+    return {"signature_path": key}
+
+
+async def _save_image(file: UploadFile, kind: str) -> str:
+    if not (file.content_type or "").startswith("image/"):
+        raise HTTPException(400, "File must be an image")
+    try:
+        return await save_certificate_image(file, kind)
+    except UploadTooLarge as e:
+        raise HTTPException(413, str(e))
+    except InvalidImage as e:
+        raise HTTPException(400, str(e))
 
 
 # ── Donations Dashboard ───────────────────────────────────────────────────────
@@ -119,7 +164,7 @@ def list_donations(
     limit: int = 50,
     status: str | None = None,
     db: Session = Depends(get_db),
-    _: User = Depends(get_admin_user),
+    _: CurrentUser = Depends(get_admin_user),
 ):
     q = db.query(Donation)
     if status:
@@ -149,11 +194,31 @@ def list_donations(
     }
 
 
+@router.get("/donations/summary")
+def donation_summary(
+    db: Session = Depends(get_db),
+    _: CurrentUser = Depends(get_admin_user),
+):
+    """Successful donation totals per cause, summed as integer paise in SQL."""
+    rows = (
+        db.query(Donation.cause, func.count(Donation.id), func.sum(Donation.amount_paise))
+        .filter(Donation.status == DonationStatus.SUCCESS)
+        .group_by(Donation.cause)
+        .all()
+    )
+    by_cause = {cause.value: {"count": count, "amount": to_rupees(total)} for cause, count, total in rows}
+    return {
+        "count": sum(c["count"] for c in by_cause.values()),
+        "amount": to_rupees(sum(total for _, _, total in rows)),
+        "by_cause": by_cause,
+    }
+
+
 @router.post("/donations/{donation_id}/resend-certificate")
 def resend_certificate(
     donation_id: int,
     db: Session = Depends(get_db),
-    _: User = Depends(get_admin_user),
+    _: CurrentUser = Depends(get_admin_user),
 ):
     donation = db.query(Donation).filter(Donation.id == donation_id).first()
     if not donation:
@@ -161,32 +226,14 @@ def resend_certificate(
     if donation.status != DonationStatus.SUCCESS:
         raise HTTPException(400, "Donation not successful")
 
-    from datetime import datetime
-    t = db.query(CertificateTemplate).filter(CertificateTemplate.is_active == True).first()
-    cert_path = generate_80g_certificate(
-        donation_id=donation.id,
-        donor_name=donation.donor_name,
-        donor_pan=donation.donor_pan or "Not Provided",
-        donor_father_name=donation.donor_father_name or "",
-        donor_address=donation.donor_address or "",
-        donor_city=donation.donor_city or "",
-        donor_state=donation.donor_state or "",
-        donor_pincode=donation.donor_pincode or "",
-        donor_email=donation.donor_email,
-        donor_phone=donation.donor_phone,
-        amount=donation.amount,
-        transaction_id=donation.gateway_payment_id or donation.gateway_order_id,
-        gateway=donation.gateway.value,
-        donation_date=donation.created_at or datetime.utcnow(),
-        cause=donation.cause.value,
-        template=t,
-    )
+    cert_key, cert_pdf = certificate_for_donation(donation, template_for_donation(db, donation, pin=True))
+    donation.certificate_path = cert_key
     sent = send_donation_confirmation(
         donor_email=donation.donor_email,
         donor_name=donation.donor_name,
         amount=donation.amount,
         transaction_id=donation.gateway_payment_id or donation.gateway_order_id,
-        certificate_path=cert_path,
+        certificate_pdf=cert_pdf,
     )
     if sent:
         from datetime import datetime
@@ -199,7 +246,7 @@ def resend_certificate(
 @router.get("/export/csv")
 def export_donations_csv(
     db: Session = Depends(get_db),
-    _: User = Depends(get_admin_user),
+    _: CurrentUser = Depends(get_admin_user),
 ):
     """Export all successful donations as CSV for Form 10BD filing."""
     donations = db.query(Donation).filter(Donation.status == DonationStatus.SUCCESS).all()
@@ -228,3 +275,91 @@ def export_donations_csv(
         media_type="text/csv",
         headers={"Content-Disposition": "attachment; filename=donations_80G.csv"},
     )
+
+
+@router.get("/export/receipts")
+def export_receipts(
+    start: date,
+    end: date,
+    fmt: Literal["zip", "pdf"] = Query("zip", alias="format"),
+    db: Session = Depends(get_db),
+    _: CurrentUser = Depends(get_admin_user),
+):
+    """
+    80G receipts for successful donations created between start and end
+    (inclusive): a streamed ZIP with one PDF per donation, or a single
+    multi-page PDF for ranges up to receipt_export_pdf_max_pages.
+    """
+    if end < start:
+        raise HTTPException(400, "end must not be before start")
+    filename = f"80G_receipts_{start}_{end}"
+    if fmt == "pdf":
+        try:
+            pdf = receipts_pdf(db, start, end)
+        except TooManyReceipts as e:
+            raise HTTPException(400, str(e))
+        return Response(pdf, media_type="application/pdf",
+                        headers={"Content-Disposition": f"attachment; filename={filename}.pdf"})
+    return StreamingResponse(
+        iter_receipts_zip(start, end),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}.zip"},
+    )
+
+
+# ── Settlement Reconciliation ─────────────────────────────────────────────────
+
+@router.post("/reconcile/settlements")
+def reconcile_settlements(
+    day: date | None = None,
+    db: Session = Depends(get_db),
+    _: CurrentUser = Depends(get_admin_user),
+):
+    """Reconcile Razorpay settlements for `day` (defaults to yesterday, in India)."""
+    day = day or datetime.now(settlement_service.IST).date() - timedelta(days=1)
+    try:
+        items = razorpay_service.fetch_settlement_report(day.year, day.month, day.day)
+    except Exception as e:
+        raise HTTPException(502, f"Settlement report unavailable: {e}")
+    return {"date": day.isoformat(), **settlement_service.reconcile_report(db, items)}
+
+
+@router.get("/reconcile/ledger")
+def reconciled_ledger(
+    day: date,
+    db: Session = Depends(get_db),
+    _: CurrentUser = Depends(get_admin_user),
+):
+    """Daily reconciled ledger: totals per settlement for payments settled on `day` (IST)."""
+    return {"date": day.isoformat(), "settlements": settlement_service.settlement_ledger(db, day)}
+
+
+# ── Request Profiles ──────────────────────────────────────────────────────────
+
+@router.get("/profiles")
+def list_profiles(_: CurrentUser = Depends(get_admin_user)):
+    """Recently captured request profiles of the worker process serving this request, newest first."""
+    return {
+        "sample_rate": profiling.get_sample_rate(),
+        "worker_pid": os.getpid(),
+        "profiles": profiling.list_profiles(),
+    }
+
+
+@router.get("/profiles/{profile_id}")
+def get_profile(profile_id: int, _: CurrentUser = Depends(get_admin_user)):
+    profile = profiling.get_profile(profile_id)
+    if not profile:
+        raise HTTPException(404, "Profile not found (it may have been evicted)")
+    return profile
+
+
+@router.put("/profiling")
+def update_profiling(data: ProfilingUpdate, _: CurrentUser = Depends(get_admin_user)):
+    """
+    Set the fraction of requests profiled; 0 disables sampling. The rate is
+    per worker process: only the worker serving this request changes, and
+    the others keep profiling_sample_rate until they restart.
+    """
+    profiling.set_sample_rate(data.sample_rate)
+    return {"sample_rate": data.sample_rate, "scope": "worker", "worker_pid": os.getpid()}
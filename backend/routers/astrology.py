@@ -1,11 +1,14 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
+from config import get_settings
+from rate_limit import check_limits, limiter
 from services.astrology_service import (
     get_kundali, get_kundali_matching, get_kaal_sarp_dosh,
     get_sade_sati, get_mangal_dosh,
     _prokerala_get,
 )
 
+settings = get_settings()
 router = APIRouter(prefix="/astrology", tags=["astrology"])
 
 
@@ -22,14 +25,16 @@ class MatchingRequest(BaseModel):
     person2: BirthDetails
 
 
-@router.post("/kundali")
-async def kundali(req: BirthDetails):
+@router.post("/kundali", dependencies=[Depends(check_limits)])
+@limiter.shared_limit(settings.rate_limit_astrology, scope="astrology")
+async def kundali(request: Request, req: BirthDetails):
     result = await get_kundali(req.dob, req.tob, req.lat, req.lon, req.tz)
     return result
 
 
-@router.post("/matching")
-async def kundali_matching(req: MatchingRequest):
+@router.post("/matching", dependencies=[Depends(check_limits)])
+@limiter.shared_limit(settings.rate_limit_astrology, scope="astrology")
+async def kundali_matching(request: Request, req: MatchingRequest):
     result = await get_kundali_matching(
         req.person1.model_dump(), req.person2.model_dump(),
         req.person1.lat, req.person1.lon, req.person1.tz,
@@ -38,26 +43,30 @@ async def kundali_matching(req: MatchingRequest):
     return result
 
 
-@router.post("/kaal-sarp-dosh")
-async def kaal_sarp_dosh(req: BirthDetails):
+@router.post("/kaal-sarp-dosh", dependencies=[Depends(check_limits)])
+@limiter.shared_limit(settings.rate_limit_astrology, scope="astrology")
+async def kaal_sarp_dosh(request: Request, req: BirthDetails):
     result = await get_kaal_sarp_dosh(req.dob, req.tob, req.lat, req.lon, req.tz)
     return result
 
 
-@router.post("/sade-sati")
-async def sade_sati(req: BirthDetails):
+@router.post("/sade-sati", dependencies=[Depends(check_limits)])
+@limiter.shared_limit(settings.rate_limit_astrology, scope="astrology")
+async def sade_sati(request: Request, req: BirthDetails):
     result = await get_sade_sati(req.dob, req.tob, req.lat, req.lon, req.tz)
     return result
 
 
-@router.post("/mangal-dosh")
-async def mangal_dosh(req: BirthDetails):
+@router.post("/mangal-dosh", dependencies=[Depends(check_limits)])
+@limiter.shared_limit(settings.rate_limit_astrology, scope="astrology")
+async def mangal_dosh(request: Request, req: BirthDetails):
     result = await get_mangal_dosh(req.dob, req.tob, req.lat, req.lon, req.tz)
     return result
 
 
-@router.post("/panchang")
-async def panchang(req: BirthDetails):
+@router.post("/panchang", dependencies=[Depends(check_limits)])
+@limiter.shared_limit(settings.rate_limit_astrology, scope="astrology")
+async def panchang(request: Request, req: BirthDetails):
     params = {
         "datetime": f"{req.dob}T{req.tob}:00+05:30",
         "coordinates": f"{req.lat},{req.lon}",
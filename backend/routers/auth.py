@@ -10,17 +10,26 @@ OAuth Setup Notes (for the admin):
   Redirect URI: https://dhyanfoundationguwahati.org/api/auth/callback/apple
 All client IDs/secrets go into .env
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, EmailStr
-from database import get_db
+from database import get_db, get_async_db
+from rate_limit import check_limits, limiter
+from config import get_settings
 from models.user import User
+from services import password_hasher
 from services.auth_service import (
-    hash_password, verify_password, create_access_token,
-    decode_token, get_or_create_oauth_user, send_welcome_email,
+    create_access_token,
+    verify_token, cached_user, load_current_user, CurrentUser,
+    get_or_create_oauth_user, verify_oauth_assertion,
 )
+from services.notification_service import queue_welcome_email
 
+settings = get_settings()
 router = APIRouter(prefix="/auth", tags=["auth"])
 bearer = HTTPBearer(auto_error=False)
 
@@ -39,7 +48,7 @@ class LoginRequest(BaseModel):
 
 
 class OAuthRequest(BaseModel):
-    """Called by Next.js frontend after successful OAuth callback."""
+    """Sent by the Next.js server after a successful OAuth callback, with an X-OAuth-Assertion header."""
     provider: str       # google / microsoft / apple
     oauth_sub: str      # provider's user ID
     email: EmailStr
@@ -82,63 +91,119 @@ class ProfileUpdateRequest(BaseModel):
 
 # ── Helpers ───────────────────────────────────────────────────────────────────
 
-def get_current_user(
+# Both dependencies are async so a cache hit is served on the event loop
+# without a threadpool hop or a DB session.
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(bearer),
-    db: Session = Depends(get_db),
-) -> User:
+) -> CurrentUser:
     if not credentials:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    payload = decode_token(credentials.credentials)
+    payload = verify_token(credentials.credentials)
     if not payload:
         raise HTTPException(status_code=401, detail="Invalid token")
-    user = db.query(User).filter(User.id == payload.get("sub")).first()
+    try:
+        user_id = int(payload["sub"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    user = cached_user(user_id) or await run_in_threadpool(load_current_user, user_id)
     if not user or not user.is_active:
         raise HTTPException(status_code=401, detail="User not found")
     return user
 
 
-def get_admin_user(user: User = Depends(get_current_user)) -> User:
+async def get_optional_user(
+    credentials: HTTPAuthorizationCredentials = Depends(bearer),
+) -> CurrentUser | None:
+    """get_current_user for routes open to guests: None instead of a 401."""
+    if not credentials:
+        return None
+    try:
+        return await get_current_user(credentials)
+    except HTTPException:
+        return None
+
+
+async def get_admin_user(user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
     if not user.is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
     return user
 
 
+async def _hasher(call):
+    """Await a password_hasher call, shedding load with 429 when its queue is full."""
+    try:
+        return await call
+    except password_hasher.HasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many sign-in attempts right now, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+
 # ── Endpoints ─────────────────────────────────────────────────────────────────
 
-@router.post("/signup")
-def signup(req: SignupRequest, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.email == req.email).first():
+@router.post("/signup", dependencies=[Depends(check_limits)])
+@limiter.limit(settings.rate_limit_signup)
+async def signup(request: Request, req: SignupRequest, db: AsyncSession = Depends(get_async_db)):
+    # Hash before touching the DB so no pooled connection is held while queued for the hasher
+    hashed_password = await _hasher(password_hasher.hash_password(req.password))
+    if (await db.execute(select(User.id).where(User.email == req.email))).first():
         raise HTTPException(status_code=400, detail="Email already registered")
-    user = User(
-        email=req.email,
-        name=req.name,
-        hashed_password=hash_password(req.password),
-    )
+    user = User(email=req.email, name=req.name, hashed_password=hashed_password)
     db.add(user)
-    db.commit()
-    db.refresh(user)
-    token = create_access_token({"sub": user.id, "email": user.email})
-    send_welcome_email(user)
+    await db.commit()
+    token = create_access_token({"sub": str(user.id), "email": user.email})
+    queue_welcome_email(user.email, user.name, user.oauth_provider)
     return {"access_token": token, "token_type": "bearer", "user_id": user.id}
 
 
-@router.post("/login")
-def login(req: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == req.email).first()
+@router.post("/login", dependencies=[Depends(check_limits)])
+@limiter.limit(settings.rate_limit_login)
+async def login(request: Request, req: LoginRequest, db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(
+        select(User.id, User.email, User.hashed_password).where(User.email == req.email)
+    )).first()
+    # End the read transaction so the connection goes back to the pool during hashing
+    await db.commit()
     if not user or not user.hashed_password:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    if not verify_password(req.password, user.hashed_password):
+    ok, new_hash = await _hasher(password_hasher.verify_and_update(req.password, user.hashed_password))
+    if not ok:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    token = create_access_token({"sub": user.id, "email": user.email})
+    if new_hash:
+        # Stored hash predates the current bcrypt_rounds; upgrade it now that we have the password
+        await db.execute(update(User).where(User.id == user.id).values(hashed_password=new_hash))
+        await db.commit()
+    token = create_access_token({"sub": str(user.id), "email": user.email})
     return {"access_token": token, "token_type": "bearer", "user_id": user.id}
 
 
 @router.post("/oauth")
-def oauth_signin(req: OAuthRequest, db: Session = Depends(get_db)):
+def oauth_signin(
+    req: OAuthRequest,
+    assertion: str | None = Header(None, alias="X-OAuth-Assertion"),
+    db: Session = Depends(get_db),
+):
     """
-    Called by frontend after Google/Microsoft/Apple OAuth succeeds.
+    Called by the Next.js server after Google/Microsoft/Apple OAuth succeeds.
     Creates or links user account and returns JWT.
+
+    The body alone proves nothing: anyone could post someone else's email and
+    take over their account and guest donations. The provider, subject and
+    email must match the X-OAuth-Assertion JWT, which only the NextAuth server
+    can sign (with the shared nextauth_secret).
     """
+    if not settings.nextauth_secret:
+        raise HTTPException(status_code=503, detail="OAuth sign-in is not configured")
+    claims = verify_oauth_assertion(assertion)
+    if (
+        claims is None
+        or claims["provider"] != req.provider
+        or claims["sub"] != req.oauth_sub
+        or claims["email"].lower() != req.email.lower()
+    ):
+        raise HTTPException(status_code=401, detail="Invalid OAuth assertion")
     user, is_new = get_or_create_oauth_user(
         db=db,
         email=req.email,
@@ -148,8 +213,8 @@ def oauth_signin(req: OAuthRequest, db: Session = Depends(get_db)):
         avatar_url=req.avatar_url,
     )
     if is_new:
-        send_welcome_email(user)
-    token = create_access_token({"sub": user.id, "email": user.email})
+        queue_welcome_email(user.email, user.name, user.oauth_provider)
+    token = create_access_token({"sub": str(user.id), "email": user.email})
     return {
         "access_token": token,
         "token_type": "bearer",
@@ -160,14 +225,15 @@ def oauth_signin(req: OAuthRequest, db: Session = Depends(get_db)):
 
 
 @router.get("/me", response_model=UserProfile)
-def get_me(user: User = Depends(get_current_user)):
-    return user
+async def get_me(current: CurrentUser = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    # The cached snapshot has no profile fields, and another worker may have just updated them
+    return await db.get(User, current.id)
 
 
 @router.put("/profile")
-def update_profile(req: ProfileUpdateRequest, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_profile(req: ProfileUpdateRequest, current: CurrentUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    user = db.get(User, current.id)
     for field, value in req.model_dump(exclude_none=True).items():
         setattr(user, field, value)
     db.commit()
-    db.refresh(user)
     return {"message": "Profile updated", "profile_complete": bool(user.pan_number and user.phone)}
@@ -0,0 +1,110 @@
+"""
+Certificate downloads via signed, expiring links.
+
+Links come from certificate_service.signed_certificate_url (donation history,
+emails) and need no login, so they work from a mail client; the HMAC covers
+the donation id and expiry. The PDF is rendered on first download if it is
+not in storage yet.
+
+certificate_response is shared with the authenticated
+/donations/{id}/certificate route: the ETag is the certificate's content
+address, so revalidation (If-None-Match / If-Modified-Since) is answered
+with a 304 without touching storage, and byte ranges are served as 206s.
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from pathlib import Path
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+from database import get_db
+from models.donation import Donation, DonationStatus
+from services.certificate_service import (
+    certificate_for_donation, certificate_key_for_donation, certificate_last_modified,
+    template_for_donation, verify_certificate_signature,
+)
+
+router = APIRouter(prefix="/certificates", tags=["certificates"])
+
+
+@router.get("/{donation_id}")
+def download_certificate(
+    donation_id: int, expires: int, signature: str, request: Request, db: Session = Depends(get_db)
+):
+    if not verify_certificate_signature(donation_id, expires, signature):
+        raise HTTPException(403, "Link is invalid or has expired")
+    donation = db.get(Donation, donation_id)
+    if not donation or donation.status != DonationStatus.SUCCESS:
+        raise HTTPException(404, "Certificate not found")
+    return certificate_response(request, donation, template_for_donation(db, donation), "private, max-age=3600")
+
+
+# ── Conditional and range responses ───────────────────────────────────────────
+
+def certificate_response(request: Request, donation, template, cache_control: str) -> Response:
+    key = certificate_key_for_donation(donation, template)
+    etag = f'"{Path(key).stem}"'
+    last_modified = certificate_last_modified(donation, template).astimezone(timezone.utc)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified, usegmt=True),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    _, pdf = certificate_for_donation(donation, template)
+    headers["Content-Disposition"] = f'inline; filename="80G_Certificate_{donation.id}.pdf"'
+    size = len(pdf)
+    byte_range = _requested_range(request, etag, headers["Last-Modified"], size)
+    if byte_range is None:
+        return Response(pdf, media_type="application/pdf", headers=headers)
+    if byte_range == ():
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return Response(pdf[start:end + 1], status_code=206, media_type="application/pdf", headers=headers)
+
+
+def _not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, and If-Modified-Since is ignored when this is present
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return last_modified.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _requested_range(request: Request, etag: str, last_modified: str, size: int) -> tuple[int, int] | tuple | None:
+    """
+    (first, last) byte of a single satisfiable range, () if unsatisfiable,
+    or None to send the whole body (no Range, a stale If-Range, a malformed
+    header, or several ranges).
+    """
+    header = request.headers.get("range")
+    if not header or not header.startswith("bytes="):
+        return None
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range not in (etag, last_modified):
+        return None
+    spec = header.removeprefix("bytes=").strip()
+    if "," in spec:
+        return None
+    first, _, last = spec.partition("-")
+    try:
+        if not first:
+            suffix = int(last)
+            return (max(size - suffix, 0), size - 1) if suffix > 0 and size else ()
+        start, end = int(first), int(last) if last else None
+    except ValueError:
+        return None
+    if end is not None and end < start:
+        return None
+    return (start, size - 1 if end is None else min(end, size - 1)) if start < size else ()
@@ -1,18 +1,31 @@
 import uuid
 import json
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, Request, BackgroundTasks
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
 from pydantic import BaseModel, EmailStr
-from database import get_db
+from database import get_async_db, get_db, SessionLocal
 from models.donation import Donation, DonationType, PaymentGateway, DonationStatus, DonationCause
-from models.certificate_template import CertificateTemplate
 from models.payment_transaction import PaymentTransaction, TransactionStatus, PaymentMethod
+from models.payment_payload import PaymentTransactionPayload
 from services import razorpay_service, cashfree_service
-from services.certificate_service import generate_80g_certificate
+from services.certificate_service import certificate_for_donation, signed_certificate_url, template_for_donation
 from services.email_service import send_donation_confirmation
-from routers.auth import get_current_user
-from models.user import User
+from services.donor_history import history_etag, history_page, history_summary, set_status
+from routers.auth import get_current_user, get_optional_user
+from routers.certificates import certificate_response
+from services.auth_service import CurrentUser
+from money import RupeeAmount, to_paise, to_rupees
+from rate_limit import check_limits, limiter
+from config import get_settings
+import logging
+import metrics
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
 
 router = APIRouter(prefix="/donations", tags=["donations"])
 
@@ -34,7 +47,7 @@ class DonorDetails(BaseModel):
 
 
 class CreateOrderRequest(BaseModel):
-    amount: float
+    amount: RupeeAmount
     cause: str = "general"
     donation_type: str = "one_time"
     gateway: str = "razorpay"
@@ -51,37 +64,58 @@ class VerifyPaymentRequest(BaseModel):
 
 # ── Helpers ───────────────────────────────────────────────────────────────────
 
-def _get_active_template(db: Session) -> CertificateTemplate | None:
-    return db.query(CertificateTemplate).filter(CertificateTemplate.is_active == True).first()
+def _payment_details(raw: dict, gross_paise: int) -> dict:
+    """
+    PaymentTransaction columns read from a gateway payment object. Whatever
+    raw does not say (fees, method) is None rather than guessed.
+    """
+    # Razorpay: fee and tax are in paise, and fee already includes the GST in tax.
+    # These are provisional until the daily settlement reconciliation runs.
+    fee_paise = raw.get("fee")
+    tax_paise = (raw.get("tax") or 0) if fee_paise is not None else None
+
+    method_str = raw.get("method")
+    try:
+        method = PaymentMethod(method_str) if method_str else None
+    except Exception:
+        method = PaymentMethod.OTHER
+
+    card = raw.get("card") or {}
+    acquirer = raw.get("acquirer_data") or {}
+    return dict(
+        gateway_fee_paise=fee_paise - tax_paise if fee_paise is not None else None,
+        gateway_tax_paise=tax_paise,
+        gateway_total_deduction_paise=fee_paise,
+        net_receivable_paise=gross_paise - fee_paise if fee_paise is not None else None,
+        payment_method=method,
+        bank=raw.get("bank"),
+        card_network=card.get("network"),
+        card_last4=card.get("last4"),
+        upi_vpa=raw.get("vpa"),
+        wallet=raw.get("wallet"),
+        international=raw.get("international"),
+        payer_email=raw.get("email"),
+        payer_contact=raw.get("contact"),
+        acquirer_rrn=acquirer.get("rrn"),
+    )
+
+
+_FEE_COLUMNS = ("gateway_fee_paise", "gateway_tax_paise", "gateway_total_deduction_paise", "net_receivable_paise")
 
 
 def _record_transaction(
-    db: Session,
+    db: AsyncSession,
     donation: Donation,
     payment_id: str,
     gateway: str,
     raw: dict,
 ) -> PaymentTransaction:
     """
-    Create a PaymentTransaction record with full fee breakdown.
-    raw = full gateway payment object (from Razorpay payment.fetch or Cashfree).
+    Add a PaymentTransaction record to the session.
+    raw = gateway payment object, if one is at hand ({} otherwise); its fee
+    breakdown is provisional until settlement reconciliation.
+    The caller commits, so the transaction is written with the donation update.
     """
-    # Razorpay: fee and tax are in paise
-    fee_paise = raw.get("fee", 0) or 0
-    tax_paise = raw.get("tax", 0) or 0
-    gross = donation.amount
-    gateway_fee = round(fee_paise / 100, 2)
-    gateway_tax = round(tax_paise / 100, 2)
-    total_deduction = round(gateway_fee + gateway_tax, 2)
-    net_receivable = round(gross - total_deduction, 2)
-
-    method_str = raw.get("method", "other")
-    try:
-        method = PaymentMethod(method_str)
-    except Exception:
-        method = PaymentMethod.OTHER
-
-    card = raw.get("card") or {}
     txn = PaymentTransaction(
         donation_id=donation.id,
         user_id=donation.user_id,
@@ -89,73 +123,76 @@ def _record_transaction(
         gateway_order_id=donation.gateway_order_id,
         gateway_payment_id=payment_id,
         subscription_id=donation.subscription_id,
-        gross_amount=gross,
-        gateway_fee=gateway_fee,
-        gateway_tax=gateway_tax,
-        gateway_total_deduction=total_deduction,
-        net_receivable=net_receivable,
+        gross_amount_paise=donation.amount_paise,
         currency=raw.get("currency", "INR"),
         status=TransactionStatus.CAPTURED,
-        payment_method=method,
-        bank=raw.get("bank"),
-        card_network=card.get("network"),
-        card_last4=card.get("last4"),
-        upi_vpa=raw.get("vpa"),
-        wallet=raw.get("wallet"),
-        international=raw.get("international", False),
         captured_at=datetime.utcnow(),
-        raw_response=json.dumps(raw)[:5000],  # cap at 5KB
+        payload=PaymentTransactionPayload(payload=raw) if raw else None,
+        **_payment_details(raw, donation.amount_paise),
     )
     db.add(txn)
-    db.commit()
     return txn
 
 
-def _process_certificate(db: Session, donation: Donation):
-    """Generate 80G certificate PDF and email it to donor."""
+def _fill_transaction(txn: PaymentTransaction, raw: dict) -> None:
+    """
+    Complete a transaction recorded without the gateway's payment object
+    (/verify) from one that arrived later (the webhook): method, payer and
+    acquirer details, provisional fees and the raw payload. Fees already
+    set by settlement reconciliation are kept. The payload must be loaded.
+    """
+    details = _payment_details(raw, txn.gross_amount_paise)
+    if txn.reconciled_at is not None:
+        for column in _FEE_COLUMNS:
+            del details[column]
+    for column, value in details.items():
+        if value is not None:
+            setattr(txn, column, value)
+    if txn.payload is None:
+        txn.payload = PaymentTransactionPayload(payload=raw)
+    else:
+        txn.payload.payload = raw
+
+
+def _process_certificate(donation_id: int):
+    """
+    Generate 80G certificate PDF and email it to donor.
+    Runs as a (threadpool) background task with its own sync session, since the
+    request's session is closed by the time it starts.
+    """
+    db = SessionLocal()
     try:
-        template = _get_active_template(db)
-        cert_path = generate_80g_certificate(
-            donation_id=donation.id,
-            donor_name=donation.donor_name,
-            donor_pan=donation.donor_pan or "Not Provided",
-            donor_father_name=donation.donor_father_name or "",
-            donor_address=donation.donor_address or "",
-            donor_city=donation.donor_city or "",
-            donor_state=donation.donor_state or "",
-            donor_pincode=donation.donor_pincode or "",
-            donor_email=donation.donor_email,
-            donor_phone=donation.donor_phone,
-            amount=donation.amount,
-            transaction_id=donation.gateway_payment_id or donation.gateway_order_id,
-            gateway=donation.gateway.value,
-            donation_date=donation.created_at or datetime.utcnow(),
-            cause=donation.cause.value,
-            template=template,
-        )
-        donation.certificate_path = cert_path
+        donation = db.get(Donation, donation_id)
+        template = template_for_donation(db, donation, pin=True)
+        cert_key, cert_pdf = certificate_for_donation(donation, template)
+        donation.certificate_path = cert_key
         sent = send_donation_confirmation(
             donor_email=donation.donor_email,
             donor_name=donation.donor_name,
             amount=donation.amount,
             transaction_id=donation.gateway_payment_id or donation.gateway_order_id,
-            certificate_path=cert_path,
+            certificate_pdf=cert_pdf,
         )
         donation.certificate_sent = sent
         donation.certificate_sent_at = datetime.utcnow() if sent else None
         db.commit()
-    except Exception as e:
-        print(f"[Cert] Failed for donation {donation.id}: {e}")
+    except Exception:
+        metrics.BACKGROUND_FAILURES.labels("certificate").inc()
+        logger.exception(f"Certificate processing failed for donation {donation_id}")
+    finally:
+        db.close()
 
 
 # ── Endpoints ─────────────────────────────────────────────────────────────────
 
-@router.post("/create-order")
+@router.post("/create-order", dependencies=[Depends(check_limits)])
+@limiter.limit(settings.rate_limit_create_order)
 async def create_order(
+    request: Request,
     req: CreateOrderRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
-    current_user: User | None = Depends(lambda credentials=None, db=None: None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser | None = Depends(get_optional_user),
 ):
     # Validate cause/type
     try:
@@ -167,6 +204,7 @@ async def create_order(
 
     # Create DB record
     donation = Donation(
+        user_id=current_user.id if current_user else None,
         donor_name=req.donor.name,
         donor_email=req.donor.email,
         donor_phone=req.donor.phone,
@@ -178,48 +216,52 @@ async def create_order(
         donor_pincode=req.donor.pincode,
         donor_country=req.donor.country,
         on_behalf_of=req.donor.on_behalf_of,
-        amount=req.amount,
+        amount_paise=to_paise(req.amount),
         cause=cause,
         donation_type=dtype,
         gateway=gateway,
         status=DonationStatus.PENDING,
     )
     db.add(donation)
-    db.commit()
-    db.refresh(donation)
+    await db.flush()
+    donation_id = donation.id
+    await db.commit()
 
-    receipt = f"DFG_{donation.id}"
+    receipt = f"DFG_{donation_id}"
 
     if gateway == PaymentGateway.RAZORPAY:
         if dtype == DonationType.ONE_TIME:
-            order = razorpay_service.create_order(
-                amount_inr=req.amount,
+            order = await run_in_threadpool(
+                razorpay_service.create_order,
+                amount_paise=donation.amount_paise,
                 receipt=receipt,
                 notes={"cause": req.cause, "donor_name": req.donor.name},
             )
             donation.gateway_order_id = order["id"]
-            db.commit()
+            await db.commit()
             return {
-                "donation_id": donation.id,
+                "donation_id": donation_id,
                 "order_id": order["id"],
                 "amount": req.amount,
                 "currency": "INR",
                 "gateway": "razorpay",
             }
         else:
-            plan = razorpay_service.create_subscription_plan(
-                amount_inr=req.amount,
+            plan = await run_in_threadpool(
+                razorpay_service.create_subscription_plan,
+                amount_paise=donation.amount_paise,
                 plan_name=f"Monthly Donation - {req.cause.title()}",
             )
-            sub = razorpay_service.create_subscription(
+            sub = await run_in_threadpool(
+                razorpay_service.create_subscription,
                 plan_id=plan["id"],
                 notify_email=req.donor.email,
             )
             donation.subscription_id = sub["id"]
             donation.gateway_order_id = sub["id"]
-            db.commit()
+            await db.commit()
             return {
-                "donation_id": donation.id,
+                "donation_id": donation_id,
                 "subscription_id": sub["id"],
                 "short_url": sub.get("short_url"),
                 "gateway": "razorpay",
@@ -229,16 +271,16 @@ async def create_order(
         cf_order = await cashfree_service.create_order(
             order_id=receipt,
             amount_inr=req.amount,
-            customer_id=f"donor_{donation.id}",
+            customer_id=f"donor_{donation_id}",
             customer_email=req.donor.email,
             customer_phone=req.donor.phone,
             customer_name=req.donor.name,
             return_url=f"http://localhost:3000/donate/success",
         )
         donation.gateway_order_id = cf_order.get("order_id", receipt)
-        db.commit()
+        await db.commit()
         return {
-            "donation_id": donation.id,
+            "donation_id": donation_id,
             "order_id": cf_order.get("order_id"),
             "payment_session_id": cf_order.get("payment_session_id"),
             "gateway": "cashfree",
@@ -249,9 +291,9 @@ async def create_order(
 async def verify_payment(
     req: VerifyPaymentRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    donation = db.query(Donation).filter(Donation.id == req.donation_id).first()
+    donation = await db.get(Donation, req.donation_id)
     if not donation:
         raise HTTPException(404, "Donation not found")
     if donation.status == DonationStatus.SUCCESS:
@@ -272,44 +314,43 @@ async def verify_payment(
         if cf_status.get("order_status") != "PAID":
             raise HTTPException(400, "Payment not completed")
 
-    donation.gateway_payment_id = req.gateway_payment_id
-    donation.gateway_signature = req.gateway_signature
-    donation.status = DonationStatus.SUCCESS
-    db.commit()
-
-    # Fetch full payment details for fee breakdown
-    raw_payment = {}
-    if gateway == PaymentGateway.RAZORPAY and req.gateway_payment_id:
-        raw_payment = razorpay_service.fetch_payment_details(req.gateway_payment_id)
-    _record_transaction(db, donation, req.gateway_payment_id, req.gateway, raw_payment)
-
-    # Generate certificate in background
-    background_tasks.add_task(_process_certificate, db, donation)
-
-    txn = db.query(PaymentTransaction).filter(
-        PaymentTransaction.gateway_payment_id == req.gateway_payment_id
-    ).first()
+    if not await set_status(
+        db, donation, DonationStatus.SUCCESS,
+        gateway_payment_id=req.gateway_payment_id, gateway_signature=req.gateway_signature,
+    ):
+        # The webhook (or a concurrent retry) confirmed it since we read it
+        await db.rollback()
+        return {"message": "Already verified", "donation_id": donation.id}
+    # No payment.fetch on the donor's request path: fees, tax and settlement
+    # details are filled in by the daily settlement reconciliation
+    _record_transaction(db, donation, req.gateway_payment_id, req.gateway, {})
 
-    return {
+    response = {
         "message": "Payment verified",
         "donation_id": donation.id,
         "transaction_id": req.gateway_payment_id,
         "gross_amount": donation.amount,
-        "gateway_fee": txn.gateway_fee if txn else None,
-        "gateway_tax": txn.gateway_tax if txn else None,
-        "net_receivable": txn.net_receivable if txn else None,
+        "gateway_fee": None,  # known after settlement reconciliation
+        "gateway_tax": None,
+        "net_receivable": None,
         "certificate": "will be emailed shortly",
     }
+    await db.commit()
+
+    # Generate certificate in background
+    metrics.enqueue_background(background_tasks, "certificate", _process_certificate, donation.id)
+    return response
 
 
 @router.post("/webhook/razorpay")
-async def razorpay_webhook(request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def razorpay_webhook(
+    request: Request, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db),
+):
     body = await request.body()
     sig = request.headers.get("X-Razorpay-Signature", "")
     if not razorpay_service.verify_webhook_signature(body, sig):
         raise HTTPException(400, "Invalid webhook signature")
 
-    import json
     event = json.loads(body)
     event_type = event.get("event")
 
@@ -319,23 +360,41 @@ async def razorpay_webhook(request: Request, background_tasks: BackgroundTasks,
         order_id = payment.get("order_id") or payload.get("subscription", {}).get("entity", {}).get("id")
         payment_id = payment.get("id")
 
-        donation = db.query(Donation).filter(
-            Donation.gateway_order_id == order_id
-        ).first() or db.query(Donation).filter(
-            Donation.subscription_id == order_id
-        ).first()
+        donation = await db.scalar(
+            select(Donation).where(Donation.gateway_order_id == order_id).limit(1)
+        ) or await db.scalar(
+            select(Donation).where(Donation.subscription_id == order_id).limit(1)
+        )
 
-        if donation and donation.status != DonationStatus.SUCCESS:
-            donation.gateway_payment_id = payment_id
-            donation.status = DonationStatus.SUCCESS
-            db.commit()
-            background_tasks.add_task(_process_certificate, db, donation)
+        if donation:
+            confirmed = donation.status != DonationStatus.SUCCESS and await set_status(
+                db, donation, DonationStatus.SUCCESS, gateway_payment_id=payment_id,
+            )
+            # If /verify confirmed the donation, its transaction is committed by
+            # now (set_status waits on its row lock while it runs) and is
+            # completed from the entity. Otherwise it is recorded here, or
+            # settlement reconciliation never finds the payment.
+            txn = payment_id and await db.scalar(
+                select(PaymentTransaction)
+                .options(joinedload(PaymentTransaction.payload))
+                .where(PaymentTransaction.gateway_payment_id == payment_id)
+                .limit(1)
+            )
+            if txn:
+                _fill_transaction(txn, payment)
+            elif payment_id:
+                _record_transaction(db, donation, payment_id, "razorpay", payment)
+            await db.commit()
+            if confirmed:
+                metrics.enqueue_background(background_tasks, "certificate", _process_certificate, donation.id)
 
     return {"status": "ok"}
 
 
 @router.post("/webhook/cashfree")
-async def cashfree_webhook(request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def cashfree_webhook(
+    request: Request, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db),
+):
     body = await request.body()
     timestamp = request.headers.get("x-webhook-timestamp", "")
     signature = request.headers.get("x-webhook-signature", "")
@@ -343,34 +402,75 @@ async def cashfree_webhook(request: Request, background_tasks: BackgroundTasks,
     if not cashfree_service.verify_webhook_signature(body.decode(), timestamp, signature):
         raise HTTPException(400, "Invalid webhook signature")
 
-    import json
     event = json.loads(body)
     if event.get("type") == "PAYMENT_SUCCESS_WEBHOOK":
         data = event.get("data", {})
         order_id = data.get("order", {}).get("order_id")
         payment_id = data.get("payment", {}).get("cf_payment_id")
-        donation = db.query(Donation).filter(Donation.gateway_order_id == order_id).first()
-        if donation and donation.status != DonationStatus.SUCCESS:
-            donation.gateway_payment_id = str(payment_id)
-            donation.status = DonationStatus.SUCCESS
-            db.commit()
-            background_tasks.add_task(_process_certificate, db, donation)
+        donation = await db.scalar(select(Donation).where(Donation.gateway_order_id == order_id).limit(1))
+        if donation and donation.status != DonationStatus.SUCCESS and await set_status(
+            db, donation, DonationStatus.SUCCESS, gateway_payment_id=str(payment_id),
+        ):
+            await db.commit()
+            metrics.enqueue_background(background_tasks, "certificate", _process_certificate, donation.id)
 
     return {"status": "ok"}
 
 
 @router.get("/history")
-def donation_history(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    donations = db.query(Donation).filter(Donation.user_id == user.id).order_by(Donation.id.desc()).all()
-    return [
-        {
-            "id": d.id,
-            "amount": d.amount,
-            "cause": d.cause.value,
-            "status": d.status.value,
-            "transaction_id": d.gateway_payment_id,
-            "date": d.created_at,
-            "certificate_sent": d.certificate_sent,
-        }
-        for d in donations
-    ]
+async def donation_history(
+    request: Request,
+    response: Response,
+    before: int | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    user: CurrentUser = Depends(get_current_user),
+):
+    """
+    The user's donations, newest first, limit per page; pass next_before as
+    before for the next page. Revalidate with If-None-Match to get a 304
+    while nothing has changed.
+    """
+    etag = await history_etag(db, user.id, before, limit)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag.removeprefix("W/") in {t.strip().removeprefix("W/") for t in if_none_match.split(",")}:
+        return Response(status_code=304, headers=headers)
+
+    donations, next_before = await history_page(db, user.id, before, limit)
+    response.headers.update(headers)
+    return {
+        "donations": [
+            {
+                "id": d.id,
+                "amount": d.amount,
+                "cause": d.cause.value,
+                "status": d.status.value,
+                "transaction_id": d.gateway_payment_id,
+                "date": d.created_at,
+                "certificate_sent": d.certificate_sent,
+                "certificate_url": signed_certificate_url(d.id) if d.status == DonationStatus.SUCCESS else None,
+            }
+            for d in donations
+        ],
+        "next_before": next_before,
+        "summary": await history_summary(db, user.id),
+    }
+
+
+@router.get("/{donation_id}/certificate")
+def download_certificate(
+    donation_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user),
+):
+    """The donor's 80G certificate; supports ETag/Last-Modified revalidation and Range."""
+    donation = db.get(Donation, donation_id)
+    if (
+        not donation
+        or donation.status != DonationStatus.SUCCESS
+        or (donation.user_id != user.id and not user.is_admin)
+    ):
+        raise HTTPException(404, "Certificate not found")
+    return certificate_response(request, donation, template_for_donation(db, donation), "private, no-cache")
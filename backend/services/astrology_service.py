@@ -1,10 +1,11 @@
 """
 Astrology service: Prokerala API (primary) + PyJHora (fallback).
 """
-import httpx
 import asyncio
 from datetime import datetime
 from config import get_settings
+from metrics import observe_upstream, cache_lookup
+from services.http_client import get_http_client
 
 settings = get_settings()
 
@@ -22,9 +23,11 @@ async def _get_prokerala_token() -> str | None:
         return None
     import time
     if _prokerala_token and time.time() < _token_expires_at - 30:
+        cache_lookup("prokerala_token", hit=True)
         return _prokerala_token
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
+    cache_lookup("prokerala_token", hit=False)
+    with observe_upstream("prokerala", "token"):
+        resp = await get_http_client().post(
             PROKERALA_TOKEN_URL,
             data={
                 "grant_type": "client_credentials",
@@ -32,12 +35,11 @@ async def _get_prokerala_token() -> str | None:
                 "client_secret": settings.prokerala_client_secret,
             },
         )
-        if resp.status_code == 200:
-            data = resp.json()
-            _prokerala_token = data["access_token"]
-            import time
-            _token_expires_at = time.time() + data.get("expires_in", 3600)
-            return _prokerala_token
+    if resp.status_code == 200:
+        data = resp.json()
+        _prokerala_token = data["access_token"]
+        _token_expires_at = time.time() + data.get("expires_in", 3600)
+        return _prokerala_token
     return None
 
 
@@ -45,14 +47,14 @@ async def _prokerala_get(endpoint: str, params: dict) -> dict | None:
     token = await _get_prokerala_token()
     if not token:
         return None
-    async with httpx.AsyncClient(timeout=15) as client:
-        resp = await client.get(
+    with observe_upstream("prokerala", endpoint):
+        resp = await get_http_client().get(
             f"{PROKERALA_BASE}/{endpoint}",
             params=params,
             headers={"Authorization": f"Bearer {token}"},
         )
-        if resp.status_code == 200:
-            return resp.json()
+    if resp.status_code == 200:
+        return resp.json()
     return None
 
 
@@ -1,26 +1,30 @@
 """
-Auth service: JWT creation, password hashing, OAuth account linking.
+Auth service: JWT creation, OAuth account linking, and the caches behind
+get_current_user (verified tokens and user snapshots). Password hashing lives
+in services/password_hasher.py.
+
+Both caches are per worker process, so a snapshot holds just what
+authorisation needs (id, email, is_active, is_admin) and lives for
+auth_cache_seconds: deactivation or an admin flag change, which happen
+directly in the database, take effect within that TTL. Profile data is never
+cached; /auth/me reads it from the database.
 """
 import secrets
 import string
+import threading
+import time
+from dataclasses import dataclass, fields
 from datetime import datetime, timedelta
-from passlib.context import CryptContext
 from jose import JWTError, jwt
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from database import SessionLocal
 from models.user import User
-from services.email_service import send_email
 from config import get_settings
+from services.donor_history import link_guest_donations
+from metrics import cache_lookup
 
 settings = get_settings()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-
-def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
 
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
@@ -37,11 +41,125 @@ def decode_token(token: str) -> dict | None:
         return None
 
 
+# ── OAuth sign-in assertions ──────────────────────────────────────────────────
+
+OAUTH_ASSERTION_AUDIENCE = "dhyan-backend/oauth"
+OAUTH_ASSERTION_MAX_AGE = 300  # seconds
+
+
+def verify_oauth_assertion(token: str) -> dict | None:
+    """
+    Claims of the assertion NextAuth sends with /auth/oauth: an HS256 JWT
+    signed with nextauth_secret, carrying provider, sub and email, valid for at
+    most OAUTH_ASSERTION_MAX_AGE seconds. None if it is missing, forged,
+    expired or incomplete, or if nextauth_secret is not configured.
+    """
+    if not settings.nextauth_secret or not token:
+        return None
+    try:
+        claims = jwt.decode(
+            token, settings.nextauth_secret, algorithms=["HS256"], audience=OAUTH_ASSERTION_AUDIENCE,
+            options={"require_exp": True, "require_iat": True},
+        )
+    except JWTError:
+        return None
+    if claims["exp"] - claims["iat"] > OAUTH_ASSERTION_MAX_AGE:
+        return None
+    if not all(isinstance(claims.get(k), str) and claims[k] for k in ("provider", "sub", "email")):
+        return None
+    return claims
+
+
+# ── Authenticated-user caches ─────────────────────────────────────────────────
+
+@dataclass(frozen=True, slots=True)
+class CurrentUser:
+    """
+    Immutable snapshot of a user's identity and flags handed to request
+    handlers; not bound to any session. Load profile fields from the database.
+    """
+    id: int
+    email: str
+    is_active: bool
+    is_admin: bool
+
+    @classmethod
+    def from_user(cls, user) -> "CurrentUser":
+        return cls(**{f.name: getattr(user, f.name) for f in fields(cls)})
+
+
+_SNAPSHOT_COLUMNS = [getattr(User, f.name) for f in fields(CurrentUser)]
+
+
+# token -> decoded payload; a cached token is re-checked only for expiry
+_verified_tokens: dict[str, dict] = {}
+# user id -> (loaded_at, snapshot)
+_user_cache: dict[int, tuple[float, CurrentUser]] = {}
+_cache_lock = threading.Lock()
+
+
+def _bounded_put(cache: dict, key, value) -> None:
+    with _cache_lock:
+        if len(cache) >= settings.auth_cache_max_entries:
+            cache.pop(next(iter(cache)))  # oldest insertion
+        cache[key] = value
+
+
+def verify_token(token: str) -> dict | None:
+    """decode_token, skipping signature verification for tokens already verified."""
+    payload = _verified_tokens.get(token)
+    if payload is not None:
+        cache_lookup("jwt", hit=True)
+        if payload.get("exp", 0) > time.time():
+            return payload
+        _verified_tokens.pop(token, None)
+        return None
+    cache_lookup("jwt", hit=False)
+    payload = decode_token(token)
+    if payload is not None:
+        _bounded_put(_verified_tokens, token, payload)
+    return payload
+
+
+def cached_user(user_id: int) -> CurrentUser | None:
+    """
+    Cached snapshot of the user, or None on a miss (then use load_current_user).
+    Snapshots live for auth_cache_seconds, so deactivation or an admin flag
+    change takes effect within that TTL.
+    """
+    cached = _user_cache.get(user_id)
+    hit = cached is not None and time.monotonic() - cached[0] < settings.auth_cache_seconds
+    cache_lookup("auth_user", hit=hit)
+    return cached[1] if hit else None
+
+
+def load_current_user(user_id: int) -> CurrentUser | None:
+    """Load the user from the database and cache the snapshot."""
+    with SessionLocal() as db:
+        user = db.execute(select(*_SNAPSHOT_COLUMNS).where(User.id == user_id)).first()
+        snapshot = CurrentUser.from_user(user) if user else None
+    if snapshot:
+        _bounded_put(_user_cache, user_id, (time.monotonic(), snapshot))
+    return snapshot
+
+
 def generate_temp_password(length: int = 12) -> str:
     alphabet = string.ascii_letters + string.digits + "!@#$%"
     return "".join(secrets.choice(alphabet) for _ in range(length))
 
 
+def _take_over_unverified(user: User) -> bool:
+    """
+    Whether the account was already verified. If not, the OAuth sign-in has
+    just proved the email: drop the password whoever registered it set.
+    """
+    if user.is_verified:
+        return True
+    user.hashed_password = None
+    user.is_verified = True
+    return False
+
+
 def get_or_create_oauth_user(
     db: Session,
     email: str,
@@ -54,6 +172,13 @@ def get_or_create_oauth_user(
     Get existing user or create new one from OAuth.
     Returns (user, is_new_user).
     If user exists with same email but different/no OAuth, links the account.
+    OAuth emails are verified, so guest donations made with the email since
+    the last sign-in are claimed for the account as well.
+
+    Password signups never verify their email, so anyone could have
+    registered this address first. An unverified account is taken over
+    before anything is linked: its password is cleared and it is marked
+    verified, and its (unverified) phone is not used for claiming.
     """
     # Try find by oauth sub first
     user = db.query(User).filter(
@@ -62,11 +187,16 @@ def get_or_create_oauth_user(
     ).first()
 
     if user:
+        verified = _take_over_unverified(user)
+        linked = link_guest_donations(db, user.id, user.email, user.phone if verified else None)
+        if linked or not verified:
+            db.commit()
         return user, False
 
     # Try find by email (link accounts)
     user = db.query(User).filter(User.email == email).first()
     if user:
+        verified = _take_over_unverified(user)
         # Link OAuth to existing account
         user.oauth_provider = oauth_provider
         user.oauth_sub = oauth_sub
@@ -74,6 +204,7 @@ def get_or_create_oauth_user(
             user.avatar_url = avatar_url
         if name and not user.name:
             user.name = name
+        link_guest_donations(db, user.id, user.email, user.phone if verified else None)
         db.commit()
         db.refresh(user)
         return user, False
@@ -88,34 +219,8 @@ def get_or_create_oauth_user(
         is_verified=True,  # OAuth emails are verified
     )
     db.add(user)
+    db.flush()
+    link_guest_donations(db, user.id, user.email)
     db.commit()
     db.refresh(user)
     return user, True
-
-
-def send_welcome_email(user: User) -> None:
-    """Send welcome email after OAuth signup."""
-    html = f"""
-    <div style="font-family:Arial,sans-serif;max-width:600px;margin:0 auto;padding:20px">
-      <div style="background:linear-gradient(135deg,#FF6B00,#2D6A4F);padding:30px;border-radius:8px 8px 0 0;text-align:center">
-        <h1 style="color:white;margin:0">Welcome to Dhyan Foundation Guwahati!</h1>
-      </div>
-      <div style="background:#fff8f0;padding:30px;border:1px solid #ffe0b2;border-top:none">
-        <p>Dear <strong>{user.name or user.email}</strong>,</p>
-        <p>Your account has been created successfully using <strong>{user.oauth_provider}</strong> sign-in.</p>
-        <p>You can now:</p>
-        <ul>
-          <li>Make tax-deductible donations (Section 80G)</li>
-          <li>Auto-receive your 80G certificates by email</li>
-          <li>Explore our Astrology Corner</li>
-          <li>Track your donation history</li>
-        </ul>
-        <p style="color:#666;font-size:13px">
-          Please complete your profile (PAN, address, etc.) before making a donation
-          so your 80G certificate can be generated correctly.
-        </p>
-        <p>🙏 Thank you for supporting Gau Seva!</p>
-      </div>
-    </div>
-    """
-    send_email(user.email, "Welcome to Dhyan Foundation Guwahati", html)
@@ -5,8 +5,10 @@ Docs: https://docs.cashfree.com/reference/pg-new-apis-endpoint
 import hmac
 import hashlib
 import base64
-import httpx
+from decimal import Decimal
 from config import get_settings
+from metrics import observe_upstream
+from services.http_client import get_http_client
 
 settings = get_settings()
 
@@ -31,7 +33,7 @@ def _base_url() -> str:
 
 async def create_order(
     order_id: str,
-    amount_inr: float,
+    amount_inr: Decimal,
     customer_id: str,
     customer_email: str,
     customer_phone: str,
@@ -41,7 +43,7 @@ async def create_order(
     """Create a Cashfree payment order."""
     payload = {
         "order_id": order_id,
-        "order_amount": round(amount_inr, 2),
+        "order_amount": float(amount_inr),  # already exact to the paisa
         "order_currency": "INR",
         "customer_details": {
             "customer_id": customer_id,
@@ -53,25 +55,25 @@ async def create_order(
             "return_url": f"{return_url}?order_id={{order_id}}&order_token={{order_token}}",
         },
     }
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
+    with observe_upstream("cashfree", "orders.create"):
+        resp = await get_http_client().post(
             f"{_base_url()}/orders",
             json=payload,
             headers=_headers(),
         )
         resp.raise_for_status()
-        return resp.json()
+    return resp.json()
 
 
 async def get_order_status(order_id: str) -> dict:
     """Fetch payment status for a Cashfree order."""
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(
+    with observe_upstream("cashfree", "orders.get"):
+        resp = await get_http_client().get(
             f"{_base_url()}/orders/{order_id}",
             headers=_headers(),
         )
         resp.raise_for_status()
-        return resp.json()
+    return resp.json()
 
 
 def verify_webhook_signature(raw_body: str, timestamp: str, signature: str) -> bool:
@@ -0,0 +1,558 @@
+"""
+Certificate layout engine.
+
+A template's layout_config declares the certificate as an ordered list of
+sections. compile_layout turns it, together with the template's colours,
+font family and texts, into a RenderPlan once per template version; each
+certificate is then rendered by running the plan's steps over the donor
+details. Everything that does not depend on the donor (styles, table styles,
+the title, organisation and footer blocks) is resolved at compile time, and
+the static blocks are also recorded on first draw and replayed afterwards.
+Text that the template's font cannot draw (Devanagari or Bengali names, the
+₹ sign) is set in a fallback font from services/fonts.py.
+
+layout_config format; every key is optional and {} is the standard layout:
+
+    {"sections": [
+        "logo", "title", "receipt",
+        {"type": "donor", "title": "DONOR DETAILS", "fields": ["name", "pan", "address"]},
+        "amount",
+        {"type": "organisation", "fields": ["name", "pan", "80g", "12a"]},
+        {"type": "text", "text": "Registered under ...", "style": "footer"},
+        {"type": "spacer", "height_mm": 4},
+        "signature", "footer"
+    ]}
+"""
+import copy
+import hashlib
+import json
+import re
+from types import SimpleNamespace
+from pathlib import Path
+from reportlab.lib import colors
+from reportlab.lib.units import mm
+from reportlab.platypus import Spacer, Table, TableStyle, HRFlowable, Flowable
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.enums import TA_CENTER
+from reportlab.pdfbase.pdfdoc import PDFImageXObject, pdfdocEnc
+from reportlab.lib.utils import _digester
+from functools import lru_cache
+from config import get_settings
+from services.fonts import paragraph, registered_families
+from services.image_service import IMAGE_BOXES_MM, image_file
+
+settings = get_settings()
+
+LOGO_BOX_MM = IMAGE_BOXES_MM["logo"]
+SIGNATURE_BOX_MM = IMAGE_BOXES_MM["signature"]
+
+DEFAULT_SECTIONS = ["logo", "title", "receipt", "donor", "amount", "organisation", "signature", "footer"]
+DEFAULT_HEADER = "DONATION RECEIPT CUM 80G CERTIFICATE"
+
+DONOR_FIELDS = {
+    "name": ("Full Name:", lambda d: d["donor_name"]),
+    "father_name": ("Father's Name:", lambda d: d["donor_father_name"] or "N/A"),
+    "pan": ("PAN Number:", lambda d: d["donor_pan"] or "Not Provided"),
+    "address": ("Address:", lambda d: (
+        f"{d['donor_address']}, {d['donor_city']}, {d['donor_state']} - {d['donor_pincode']}"
+    )),
+    "phone": ("Phone:", lambda d: d["donor_phone"]),
+    "email": ("Email:", lambda d: d["donor_email"]),
+}
+
+ORGANISATION_FIELDS = {
+    "name": ("Organisation:", lambda n: n.name),
+    "pan": ("PAN:", lambda n: n.pan),
+    "80g": ("80G Registration:", lambda n: n.reg_80g or "Applied/Pending"),
+    "12a": ("12A Registration:", lambda n: n.reg_12a or "Applied/Pending"),
+    "address": ("Address:", lambda n: n.address),
+    "phone": ("Phone:", lambda n: n.phone),
+    "email": ("Email:", lambda n: n.email),
+}
+
+TEXT_STYLES = ("value", "label", "section", "footer")
+
+# Allowed options per section type: a type to check values against, or the
+# names a value (or list of values, for "fields") must come from
+_SECTION_OPTIONS = {
+    "logo": {},
+    "title": {},
+    "receipt": {},
+    "donor": {"title": str, "fields": DONOR_FIELDS},
+    "amount": {},
+    "organisation": {"title": str, "fields": ORGANISATION_FIELDS},
+    "signature": {},
+    "footer": {},
+    "text": {"text": str, "style": TEXT_STYLES},
+    "spacer": {"height_mm": (int, float)},
+}
+
+# Bold face used with each regular standard font
+_BOLD_FONTS = {"Helvetica": "Helvetica-Bold", "Times-Roman": "Times-Bold", "Courier": "Courier-Bold"}
+_FONT_ALIASES = {
+    "helvetica": "Helvetica", "arial": "Helvetica", "sans-serif": "Helvetica",
+    "times": "Times-Roman", "times-roman": "Times-Roman", "times new roman": "Times-Roman", "serif": "Times-Roman",
+    "courier": "Courier", "monospace": "Courier",
+}
+
+
+class LayoutError(ValueError):
+    pass
+
+
+def _hex_to_color(hex_str: str):
+    hex_str = hex_str.lstrip("#")
+    r, g, b = tuple(int(hex_str[i:i+2], 16) / 255 for i in (0, 2, 4))
+    return colors.Color(r, g, b)
+
+
+# Normalised uploads are named by their content hash (image_service.normalize_image)
+_CONTENT_NAMED = re.compile(r"(?:logo|signature)_([0-9a-f]{16})\.(?:jpg|png)")
+
+
+def image_fingerprint(ref: str | None) -> str | None:
+    """
+    Content hash of a template image, the same on every instance: taken from
+    the name of a normalised upload, computed for other (older) files.
+    """
+    if not ref:
+        return None
+    match = _CONTENT_NAMED.fullmatch(Path(ref).name)
+    if match:
+        return match.group(1)
+    path = image_file(ref)
+    if path is None:
+        return None
+    stat = path.stat()
+    return _file_digest(str(path), stat.st_size, stat.st_mtime_ns)
+
+
+@lru_cache(maxsize=64)
+def _file_digest(path: str, size: int, mtime_ns: int) -> str:
+    """sha256 of a file; size and mtime only decide when it is read again."""
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()[:16]
+
+
+def resolve_fonts(font_family: str | None) -> tuple[str, str]:
+    """
+    (regular, bold) font names for a template's font_family: a family from
+    font_dir or a standard font; unknown families fall back to Helvetica.
+    """
+    family = registered_families().get((font_family or "").strip())
+    if family is not None:
+        return family.regular, family.bold
+    regular = _FONT_ALIASES.get((font_family or "").strip().lower(), "Helvetica")
+    return regular, _BOLD_FONTS[regular]
+
+
+# ── Shared image XObjects ─────────────────────────────────────────────────────
+
+@lru_cache(maxsize=16)
+def _image_xobject(path: str, fingerprint: str | None) -> PDFImageXObject:
+    """Encoded image stream for a logo/signature file version; never registered in a document itself."""
+    image = PDFImageXObject(_digester(f"{path}auto"), path, mask="auto")
+    # ASCII85 streams are str and would be re-encoded on every PDF write
+    for xobject in (image, getattr(image, "_smask", None)):
+        if xobject is not None:
+            xobject.streamContent = pdfdocEnc(xobject.streamContent)
+    return image
+
+
+class _SharedImage(Flowable):
+    """
+    Image drawn from an XObject encoded once per process: each certificate
+    gets a copy of the cached object (the stream bytes are shared) instead of
+    ReportLab decoding, compressing and ASCII85-encoding the file again.
+    """
+
+    def __init__(self, path: str, width: float, height: float):
+        super().__init__()
+        self.path, self.width, self.height = path, width, height
+        self.hAlign = "CENTER"
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        doc = self.canv._doc
+        # drawImage registers a file image under a name derived from path and
+        # mask; when that name is already taken it only emits the "Do".
+        # Should the naming ever change, drawImage just encodes the file itself.
+        name = doc.getXObjectName(_digester(f"{self.path}auto"))
+        if name not in doc.idToObject:
+            image = copy.copy(_image_xobject(self.path, image_fingerprint(self.path)))
+            smask = image.__dict__.pop("_smask", None)
+            doc.Reference(image, name)
+            if smask is not None:
+                image.smask = doc.Reference(copy.copy(smask), doc.getXObjectName(smask.name))
+        self.canv.drawImage(self.path, 0, 0, self.width, self.height, mask="auto")
+
+
+# ── Static blocks ─────────────────────────────────────────────────────────────
+
+# Recorded _StaticBlock output by block key, bounded by _STATIC_BLOCKS_MAX
+_static_blocks: dict[tuple, SimpleNamespace] = {}
+_STATIC_BLOCKS_MAX = 64
+
+_FONT_OP = re.compile(r"(/F\d+(?:\+\d+)?) [\d.]+ Tf")
+
+
+class _StaticBlock(Flowable):
+    """
+    Run of flowables that is identical on every certificate for a template
+    (title, organisation details, footer). The first render lays it out and
+    records the content-stream operators it draws; later renders append
+    those operators as-is, skipping paragraph layout and drawing.
+
+    Operators name fonts by per-document internal names (/F1, ...), so a
+    recording is only replayed when the document maps the same fonts to the
+    same names, and never recorded when it uses subset (TrueType) fonts.
+    """
+
+    def __init__(self, key: tuple, build):
+        super().__init__()
+        self.key, self.build = key, build
+        self._content = None
+        self._sizes = None   # (width, height) per flowable once laid out
+
+    def _flowables(self) -> list:
+        if self._content is None:
+            self._content = self.build()
+        return self._content
+
+    def _layout(self, availWidth: float) -> float:
+        self._sizes = [f.wrapOn(self.canv, availWidth, 0x7fffffff) for f in self._flowables()]
+        height, previous_after = 0, None
+        for f, (_, h) in zip(self._content, self._sizes):
+            if previous_after is not None:
+                height += max(previous_after, f.getSpaceBefore())
+            height += h
+            previous_after = f.getSpaceAfter()
+        return height
+
+    def wrap(self, availWidth, availHeight):
+        recorded = _static_blocks.get(self.key)
+        self.width = availWidth
+        if recorded and recorded.width == availWidth:
+            self.height = recorded.height
+        else:
+            self.height = self._layout(availWidth)
+        return self.width, self.height
+
+    def getSpaceBefore(self):
+        recorded = _static_blocks.get(self.key)
+        return recorded.space_before if recorded else self._flowables()[0].getSpaceBefore()
+
+    def getSpaceAfter(self):
+        recorded = _static_blocks.get(self.key)
+        return recorded.space_after if recorded else self._flowables()[-1].getSpaceAfter()
+
+    def draw(self):
+        canv = self.canv
+        doc = canv._doc
+        recorded = _static_blocks.get(self.key)
+        if (
+            recorded is not None
+            and recorded.width == self.width
+            and all(doc.getInternalFontName(font) == name for font, name in recorded.fonts)
+        ):
+            canv._code.extend(recorded.code)
+            return
+        if self._sizes is None:
+            self._layout(self.width)
+
+        start = len(canv._code)
+        y, previous_after = self.height, None
+        for f, (w, h) in zip(self._content, self._sizes):
+            if previous_after is not None:
+                y -= max(previous_after, f.getSpaceBefore())
+            y -= h
+            f.drawOn(canv, 0, y, _sW=self.width - w)
+            previous_after = f.getSpaceAfter()
+        code = canv._code[start:]
+
+        used = set(_FONT_OP.findall(" ".join(code)))
+        if recorded is None and not any("+" in name for name in used):
+            if len(_static_blocks) >= _STATIC_BLOCKS_MAX:
+                _static_blocks.clear()
+            _static_blocks[self.key] = SimpleNamespace(
+                width=self.width,
+                height=self.height,
+                space_before=self._content[0].getSpaceBefore(),
+                space_after=self._content[-1].getSpaceAfter(),
+                fonts=tuple((font, name) for font, name in doc.fontMapping.items() if name in used),
+                code=tuple(code),
+            )
+
+
+# ── Layout config ─────────────────────────────────────────────────────────────
+
+def _check_option(kind: str, name: str, value, spec) -> None:
+    if isinstance(spec, dict) or (isinstance(spec, tuple) and isinstance(spec[0], str)):
+        if name == "fields":
+            if not isinstance(value, list) or not value or any(v not in spec for v in value):
+                raise LayoutError(f"{kind}.fields must be a non-empty list of: {', '.join(spec)}")
+        elif value not in spec:
+            raise LayoutError(f"{kind}.{name} must be one of: {', '.join(spec)}")
+    elif isinstance(value, bool) or not isinstance(value, spec):
+        raise LayoutError(f"{kind}.{name} has the wrong type")
+
+
+def parse_layout(config) -> list[tuple[str, dict]]:
+    """(type, options) for each section of a layout_config; raises LayoutError if it is invalid."""
+    if not config:
+        return [(kind, {}) for kind in DEFAULT_SECTIONS]
+    if not isinstance(config, dict):
+        raise LayoutError("layout_config must be an object")
+    unknown = set(config) - {"sections"}
+    if unknown:
+        raise LayoutError(f"Unknown layout_config keys: {', '.join(sorted(unknown))}")
+    items = config.get("sections", DEFAULT_SECTIONS)
+    if not isinstance(items, list):
+        raise LayoutError("sections must be a list")
+
+    sections = []
+    for item in items:
+        section = {"type": item} if isinstance(item, str) else item
+        kind = section.get("type") if isinstance(section, dict) else None
+        if kind not in _SECTION_OPTIONS:
+            raise LayoutError(f"Unknown section: {item!r}")
+        options = {k: v for k, v in section.items() if k != "type"}
+        allowed = _SECTION_OPTIONS[kind]
+        for name, value in options.items():
+            if name not in allowed:
+                raise LayoutError(f"Unknown option for {kind}: {name}")
+            _check_option(kind, name, value, allowed[name])
+        if kind == "text" and "text" not in options:
+            raise LayoutError("text sections need a text")
+        sections.append((kind, options))
+    return sections
+
+
+# ── Render plans ──────────────────────────────────────────────────────────────
+
+class RenderPlan:
+    """A compiled layout: steps that each turn the donor details into flowables."""
+
+    def __init__(self, key: str, steps: list):
+        self.key, self.steps = key, steps
+
+    def story(self, donor: dict) -> list[Flowable]:
+        story = []
+        for step in self.steps:
+            story.extend(step(donor))
+        return story
+
+
+# Compiled plans by template version (or content hash for unversioned templates)
+_plans: dict[str, RenderPlan] = {}
+_PLANS_MAX = 32
+
+
+def render_plan(template) -> RenderPlan:
+    """The compiled plan for a template snapshot (None = defaults)."""
+    version_id = getattr(template, "version_id", None)
+    if version_id is not None:
+        key = f"v{version_id}"
+    else:
+        content = vars(template) if template is not None else None
+        key = hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    plan = _plans.get(key)
+    if plan is None:
+        if len(_plans) >= _PLANS_MAX:
+            _plans.clear()
+        plan = _plans[key] = compile_layout(template, key)
+    return plan
+
+
+def compile_layout(template, key: str) -> RenderPlan:
+    # Use template values or fall back to settings
+    primary_color = _hex_to_color(getattr(template, "primary_color", None) or "#FF6B00")
+    secondary_color = _hex_to_color(getattr(template, "secondary_color", None) or "#2D6A4F")
+    ngo = SimpleNamespace(
+        name=getattr(template, "ngo_name", None) or settings.ngo_name,
+        pan=getattr(template, "ngo_pan", None) or settings.ngo_pan,
+        reg_80g=getattr(template, "ngo_80g_reg", None) or settings.ngo_80g_reg,
+        reg_12a=getattr(template, "ngo_12a_reg", None) or settings.ngo_12a_reg,
+        address=getattr(template, "ngo_address", None) or settings.ngo_address,
+        phone=getattr(template, "ngo_phone", None) or settings.ngo_phone,
+        email=getattr(template, "ngo_email", None) or settings.ngo_email,
+    )
+    header_text = getattr(template, "header_text", None) or DEFAULT_HEADER
+    footer_text = getattr(template, "footer_text", None) or (
+        "This donation is eligible for deduction under Section 80G of the Income Tax Act, 1961."
+    )
+    thank_you = getattr(template, "thank_you_message", None) or (
+        "Thank you for your generous contribution towards Gau Seva."
+    )
+    logo_file = image_file(getattr(template, "logo_path", None))
+    signature_file = image_file(getattr(template, "signature_path", None))
+    regular, bold = resolve_fonts(getattr(template, "font_family", None))
+
+    normal = getSampleStyleSheet()["Normal"]
+    title_style = ParagraphStyle(
+        "title", parent=normal, fontSize=18, fontName=bold,
+        textColor=primary_color, alignment=TA_CENTER, spaceAfter=4,
+    )
+    subtitle_style = ParagraphStyle(
+        "subtitle", parent=normal, fontSize=11, fontName=regular,
+        textColor=secondary_color, alignment=TA_CENTER, spaceAfter=2,
+    )
+    text_styles = {
+        "label": ParagraphStyle("label", parent=normal, fontSize=9, fontName=bold, textColor=colors.grey),
+        "value": ParagraphStyle("value", parent=normal, fontSize=10, fontName=regular),
+        "section": ParagraphStyle(
+            "section", parent=normal, fontSize=10, fontName=bold,
+            textColor=secondary_color, spaceBefore=4, spaceAfter=3,
+        ),
+        "footer": ParagraphStyle(
+            "footer", parent=normal, fontSize=8, fontName=regular, textColor=colors.grey,
+            alignment=TA_CENTER, spaceAfter=2,
+        ),
+    }
+    label_style, value_style = text_styles["label"], text_styles["value"]
+    section_style, footer_style = text_styles["section"], text_styles["footer"]
+    amount_style = ParagraphStyle(
+        "amount", parent=normal, fontSize=22, fontName=bold,
+        textColor=secondary_color, alignment=TA_CENTER,
+    )
+    cause_style = ParagraphStyle(
+        "cause", parent=normal, fontSize=10, fontName=regular,
+        alignment=TA_CENTER, textColor=colors.grey, spaceAfter=2,
+    )
+    meta_table_style = TableStyle([
+        ("BACKGROUND", (0, 0), (-1, -1), colors.HexColor("#FFF8F0")),
+        ("ROWBACKGROUNDS", (0, 0), (-1, -1), [colors.HexColor("#FFF8F0"), colors.white]),
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.HexColor("#FFE0B2")),
+        ("PADDING", (0, 0), (-1, -1), 6),
+    ])
+    details_table_style = TableStyle([
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.HexColor("#E0E0E0")),
+        ("PADDING", (0, 0), (-1, -1), 6),
+        ("ROWBACKGROUNDS", (0, 0), (-1, -1), [colors.white, colors.HexColor("#FAFAFA")]),
+    ])
+    centered = TableStyle([("ALIGN", (0, 0), (-1, -1), "CENTER")])
+
+    def logo(options, block_key):
+        def step(d):
+            if logo_file:
+                return [_SharedImage(str(logo_file), LOGO_BOX_MM[0]*mm, LOGO_BOX_MM[1]*mm), Spacer(1, 4*mm)]
+            return []
+        return step
+
+    def title(options, block_key):
+        return lambda d: [_StaticBlock(block_key, lambda: [
+            paragraph(ngo.name.upper(), title_style),
+            paragraph(header_text, subtitle_style),
+            HRFlowable(width="100%", thickness=2, color=primary_color, spaceAfter=6*mm),
+        ])]
+
+    def receipt(options, block_key):
+        def step(d):
+            donation_date, gateway = d["donation_date"], d["gateway"].upper()
+            receipt_no = f"DFG/{donation_date.year}/{d['donation_id']:05d}"
+            meta_table = Table([
+                [paragraph("Receipt No:", label_style), paragraph(receipt_no, value_style),
+                 paragraph("Date:", label_style), paragraph(donation_date.strftime("%d %B %Y"), value_style)],
+                [paragraph("Transaction ID:", label_style),
+                 paragraph(f"{gateway}: {d['transaction_id']}", value_style),
+                 paragraph("Payment Mode:", label_style), paragraph(gateway, value_style)],
+            ], colWidths=[35*mm, 70*mm, 30*mm, 55*mm])
+            meta_table.setStyle(meta_table_style)
+            return [meta_table, Spacer(1, 5*mm)]
+        return step
+
+    def donor(options, block_key):
+        heading = options.get("title", "DONOR DETAILS")
+        fields = [DONOR_FIELDS[name] for name in options.get("fields", DONOR_FIELDS)]
+
+        def step(d):
+            donor_table = Table(
+                [[paragraph(label, label_style), paragraph(value(d), value_style)] for label, value in fields],
+                colWidths=[40*mm, 140*mm],
+            )
+            donor_table.setStyle(details_table_style)
+            return [paragraph(heading, section_style), donor_table, Spacer(1, 5*mm)]
+        return step
+
+    def amount(options, block_key):
+        def step(d):
+            return [
+                HRFlowable(width="100%", thickness=1, color=primary_color, spaceAfter=4*mm),
+                paragraph(f"Donation Amount: ₹{d['amount']:,.2f}", amount_style),
+                paragraph(f"Purpose: {d.get('cause', 'General').title()}", cause_style),
+                HRFlowable(width="100%", thickness=1, color=primary_color, spaceAfter=5*mm),
+            ]
+        return step
+
+    def organisation(options, block_key):
+        heading = options.get("title", "ORGANISATION DETAILS")
+        fields = [ORGANISATION_FIELDS[name] for name in options.get("fields", ORGANISATION_FIELDS)]
+
+        def build():
+            ngo_table = Table(
+                [[paragraph(label, label_style), paragraph(value(ngo), value_style)] for label, value in fields],
+                colWidths=[40*mm, 140*mm],
+            )
+            ngo_table.setStyle(details_table_style)
+            return [paragraph(heading, section_style), ngo_table, Spacer(1, 8*mm)]
+        return lambda d: [_StaticBlock(block_key, build)]
+
+    def signature(options, block_key):
+        def step(d):
+            sig_data = [["", ""]]
+            if signature_file:
+                sig_data = [[_SharedImage(str(signature_file), SIGNATURE_BOX_MM[0]*mm, SIGNATURE_BOX_MM[1]*mm), ""]]
+            sig_table = Table(sig_data, colWidths=[95*mm, 95*mm])
+            sig_table.setStyle(centered)
+            return [sig_table]
+        return step
+
+    def footer(options, block_key):
+        def build():
+            sig_labels = Table(
+                [[paragraph("Authorised Signatory", label_style), paragraph("Donor's Signature", label_style)]],
+                colWidths=[95*mm, 95*mm]
+            )
+            sig_labels.setStyle(centered)
+            return [
+                sig_labels,
+                Spacer(1, 8*mm),
+                HRFlowable(width="100%", thickness=1, color=colors.lightgrey, spaceAfter=3*mm),
+                paragraph(thank_you, footer_style),
+                paragraph(footer_text, footer_style),
+                paragraph(
+                    f"This certificate is computer generated and valid without physical signature. "
+                    f"Verify at: {settings.ngo_website}",
+                    footer_style,
+                ),
+            ]
+        return lambda d: [_StaticBlock(block_key, build)]
+
+    def text(options, block_key):
+        style = text_styles[options.get("style", "value")]
+        return lambda d: [_StaticBlock(block_key, lambda: [paragraph(options["text"], style)])]
+
+    def spacer(options, block_key):
+        height = options.get("height_mm", 5) * mm
+        return lambda d: [Spacer(1, height)]
+
+    compilers = {
+        "logo": logo, "title": title, "receipt": receipt, "donor": donor, "amount": amount,
+        "organisation": organisation, "signature": signature, "footer": footer, "text": text, "spacer": spacer,
+    }
+    steps = [
+        compilers[kind](options, (key, index))
+        for index, (kind, options) in enumerate(parse_layout(getattr(template, "layout_config", None)))
+    ]
+    return RenderPlan(key, steps)
+
+
+def certificate_story(template=None, **donor) -> list[Flowable]:
+    """
+    Flowables for one certificate page. donor: donation_id, donor_name,
+    donor_pan, donor_father_name, donor_address, donor_city, donor_state,
+    donor_pincode, donor_email, donor_phone, amount, transaction_id, gateway,
+    donation_date and cause (default "General").
+    """
+    return render_plan(template).story(donor)
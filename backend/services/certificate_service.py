@@ -1,226 +1,280 @@
 """
 80G Donation Certificate Generator using ReportLab.
 Template settings are loaded from DB (CertificateTemplate) or env defaults.
+
+Certificates are rendered from published template versions
+(CertificateTemplateVersion): every template change publishes a new,
+immutable version, and a donation is pinned to the version its certificate
+was first issued with, so re-rendering a historic receipt reproduces it
+exactly. The layout itself is compiled from the version's layout_config
+(services/certificate_layout.py).
+
+Rendered PDFs are kept in certificate storage (services/storage.py) under a
+key derived from a hash of everything that goes into the render, so an
+unchanged certificate is never rendered twice and a changed donor detail or
+template produces a new object instead of overwriting the old one. Donors
+download them through short-lived signed URLs (/api/certificates/...).
+
+ReportLab and the layout engine are imported on first render (or by
+preload() during warm-up), not with this module, which most routes and the
+health checks import for template versions and download links only.
 """
-import os
+import hashlib
+import hmac
+import io
+import json
+import time
 from datetime import datetime
-from pathlib import Path
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.units import mm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, HRFlowable
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from reportlab.platypus import Image as RLImage
+from types import SimpleNamespace
+from sqlalchemy import select
 from config import get_settings
+from metrics import CERTIFICATE_RENDER, cache_lookup
+from services.storage import get_certificate_storage
 
 settings = get_settings()
 
-CERT_DIR = Path("certificates")
-CERT_DIR.mkdir(exist_ok=True)
-
-
-def _hex_to_color(hex_str: str):
-    hex_str = hex_str.lstrip("#")
-    r, g, b = tuple(int(hex_str[i:i+2], 16) / 255 for i in (0, 2, 4))
-    return colors.Color(r, g, b)
-
-
-def generate_80g_certificate(
-    donation_id: int,
-    donor_name: str,
-    donor_pan: str,
-    donor_father_name: str,
-    donor_address: str,
-    donor_city: str,
-    donor_state: str,
-    donor_pincode: str,
-    donor_email: str,
-    donor_phone: str,
-    amount: float,
-    transaction_id: str,
-    gateway: str,
-    donation_date: datetime,
-    cause: str = "General",
-    template=None,  # CertificateTemplate ORM object or None
-) -> str:
-    """Generate PDF and return file path."""
-
-    # Use template values or fall back to settings
-    primary_color = _hex_to_color(getattr(template, "primary_color", None) or "#FF6B00")
-    secondary_color = _hex_to_color(getattr(template, "secondary_color", None) or "#2D6A4F")
-    ngo_name = getattr(template, "ngo_name", None) or settings.ngo_name
-    ngo_pan = getattr(template, "ngo_pan", None) or settings.ngo_pan
-    ngo_80g_reg = getattr(template, "ngo_80g_reg", None) or settings.ngo_80g_reg
-    ngo_12a_reg = getattr(template, "ngo_12a_reg", None) or settings.ngo_12a_reg
-    ngo_address = getattr(template, "ngo_address", None) or settings.ngo_address
-    ngo_phone = getattr(template, "ngo_phone", None) or settings.ngo_phone
-    ngo_email = getattr(template, "ngo_email", None) or settings.ngo_email
-    footer_text = getattr(template, "footer_text", None) or (
-        "This donation is eligible for deduction under Section 80G of the Income Tax Act, 1961."
+# Bump when the layout code changes so stored certificates are re-rendered
+RENDERER_VERSION = 2
+
+
+# ── Template versions ─────────────────────────────────────────────────────────
+
+# Active template snapshot shared by certificate renders: (loaded_at, snapshot)
+_template_cache: tuple[float, SimpleNamespace | None] | None = None
+
+# Published versions never change, so their snapshots are kept for the process lifetime
+_versions: dict[int, SimpleNamespace] = {}
+
+
+def _version_snapshot(version) -> SimpleNamespace:
+    from models.certificate_template import VERSIONED_FIELDS
+    snapshot = SimpleNamespace(
+        **{field: version.content.get(field) for field in VERSIONED_FIELDS},
+        template_id=version.template_id,
+        version=version.version,
+        version_id=version.id,
+        created_at=version.created_at,
+        updated_at=None,
     )
-    thank_you = getattr(template, "thank_you_message", None) or (
-        "Thank you for your generous contribution towards Gau Seva."
+    _versions[version.id] = snapshot
+    return snapshot
+
+
+def get_active_template(db) -> SimpleNamespace | None:
+    """
+    Detached snapshot of the latest version of the active template, cached
+    for template_cache_seconds so each render doesn't re-query it.
+    """
+    global _template_cache
+    from models.certificate_template import CertificateTemplate, CertificateTemplateVersion
+    if _template_cache and time.monotonic() - _template_cache[0] < settings.template_cache_seconds:
+        cache_lookup("certificate_template", hit=True)
+        return _template_cache[1]
+    cache_lookup("certificate_template", hit=False)
+    version = db.scalars(
+        select(CertificateTemplateVersion)
+        .join(CertificateTemplate, CertificateTemplate.id == CertificateTemplateVersion.template_id)
+        .where(CertificateTemplate.is_active == True)
+        .order_by(CertificateTemplate.id, CertificateTemplateVersion.version.desc())
+        .limit(1)
+    ).first()
+    snapshot = _version_snapshot(version) if version else None
+    _template_cache = (time.monotonic(), snapshot)
+    return snapshot
+
+
+def invalidate_template_cache() -> None:
+    global _template_cache
+    _template_cache = None
+
+
+def load_template_versions(db, version_ids) -> None:
+    """Load snapshots for any of version_ids not yet cached, in one query."""
+    from models.certificate_template import CertificateTemplateVersion
+    missing = {v for v in version_ids if v is not None and v not in _versions}
+    if missing:
+        for version in db.scalars(
+            select(CertificateTemplateVersion).where(CertificateTemplateVersion.id.in_(missing))
+        ):
+            _version_snapshot(version)
+
+
+def template_for_donation(db, donation, pin: bool = False) -> SimpleNamespace | None:
+    """
+    Template snapshot a donation's certificate is rendered with: its pinned
+    version, or the active one if it has none yet. pin=True records the
+    active version on the donation (committed by the caller) when issuing.
+    """
+    version_id = donation.certificate_template_version_id
+    if version_id is not None:
+        cache_lookup("certificate_template_version", hit=version_id in _versions)
+        load_template_versions(db, [version_id])
+        if version_id in _versions:
+            return _versions[version_id]
+    template = get_active_template(db)
+    if pin and template is not None:
+        donation.certificate_template_version_id = template.version_id
+    return template
+
+
+def publish_template_version(db, template):
+    """
+    Add a new version snapshotting the template's current values, unless
+    they equal the latest version's. Flushes; the caller commits.
+    """
+    from models.certificate_template import CertificateTemplateVersion, VERSIONED_FIELDS
+    db.flush()
+    content = {field: getattr(template, field) for field in VERSIONED_FIELDS}
+    latest = db.scalars(
+        select(CertificateTemplateVersion)
+        .where(CertificateTemplateVersion.template_id == template.id)
+        .order_by(CertificateTemplateVersion.version.desc())
+        .limit(1)
+    ).first()
+    if latest is not None and latest.content == content:
+        return latest
+    version = CertificateTemplateVersion(
+        template_id=template.id,
+        version=(latest.version if latest else 0) + 1,
+        content=content,
     )
-    logo_path = getattr(template, "logo_path", None)
-    signature_path = getattr(template, "signature_path", None)
+    db.add(version)
+    db.flush()
+    return version
+
+
+# ── Rendering ─────────────────────────────────────────────────────────────────
 
-    filename = f"80G_{donation_id}_{transaction_id}.pdf"
-    filepath = CERT_DIR / filename
+def preload() -> None:
+    """Import the renderer and register fonts ahead of the first render."""
+    from services.certificate_layout import certificate_story  # noqa: F401
+    from services.fonts import registered_families
+    registered_families()
 
+
+def _build_pdf(story: list) -> bytes:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.platypus import SimpleDocTemplate
+    buffer = io.BytesIO()
     doc = SimpleDocTemplate(
-        str(filepath),
+        buffer,
         pagesize=A4,
         rightMargin=20*mm,
         leftMargin=20*mm,
         topMargin=15*mm,
         bottomMargin=15*mm,
+        invariant=True,  # fixed creation date and document ID: same inputs, same bytes
     )
+    doc.build(story)
+    return buffer.getvalue()
 
-    styles = getSampleStyleSheet()
+
+def render_80g_certificate(**render_args) -> bytes:
+    """Render the certificate PDF; arguments as for certificate_story."""
+    from services.certificate_layout import certificate_story
+    with CERTIFICATE_RENDER.time():
+        return _build_pdf(certificate_story(**render_args))
+
+
+def render_certificates_pdf(donations_with_templates) -> bytes:
+    """
+    One PDF with a page per (donation, template) pair. Fonts, images and
+    static blocks are added to the document once and shared by every page.
+    """
+    from reportlab.platypus import PageBreak
+    from services.certificate_layout import certificate_story
     story = []
+    for donation, template in donations_with_templates:
+        if story:
+            story.append(PageBreak())
+        story.extend(certificate_story(**_render_args(donation, template)))
+    return _build_pdf(story)
 
-    # ── Header styles
-    title_style = ParagraphStyle(
-        "title", parent=styles["Normal"],
-        fontSize=18, fontName="Helvetica-Bold",
-        textColor=primary_color, alignment=TA_CENTER, spaceAfter=4,
-    )
-    subtitle_style = ParagraphStyle(
-        "subtitle", parent=styles["Normal"],
-        fontSize=11, fontName="Helvetica",
-        textColor=secondary_color, alignment=TA_CENTER, spaceAfter=2,
-    )
-    label_style = ParagraphStyle(
-        "label", parent=styles["Normal"],
-        fontSize=9, fontName="Helvetica-Bold", textColor=colors.grey,
-    )
-    value_style = ParagraphStyle(
-        "value", parent=styles["Normal"],
-        fontSize=10, fontName="Helvetica",
-    )
-    footer_style = ParagraphStyle(
-        "footer", parent=styles["Normal"],
-        fontSize=8, fontName="Helvetica", textColor=colors.grey,
-        alignment=TA_CENTER, spaceAfter=2,
-    )
-    amount_style = ParagraphStyle(
-        "amount", parent=styles["Normal"],
-        fontSize=22, fontName="Helvetica-Bold",
-        textColor=secondary_color, alignment=TA_CENTER,
+
+# ── Storage and download links ────────────────────────────────────────────────
+
+def _render_args(donation, template) -> dict:
+    return dict(
+        donation_id=donation.id,
+        donor_name=donation.donor_name,
+        donor_pan=donation.donor_pan or "Not Provided",
+        donor_father_name=donation.donor_father_name or "",
+        donor_address=donation.donor_address or "",
+        donor_city=donation.donor_city or "",
+        donor_state=donation.donor_state or "",
+        donor_pincode=donation.donor_pincode or "",
+        donor_email=donation.donor_email,
+        donor_phone=donation.donor_phone,
+        amount=donation.amount,
+        transaction_id=donation.gateway_payment_id or donation.gateway_order_id,
+        gateway=donation.gateway.value,
+        donation_date=donation.created_at or datetime.utcnow(),
+        cause=donation.cause.value,
+        template=template,
     )
 
-    # ── Logo
-    if logo_path and Path(logo_path).exists():
-        story.append(RLImage(logo_path, width=60*mm, height=20*mm))
-        story.append(Spacer(1, 4*mm))
-
-    # ── Title block
-    story.append(Paragraph(ngo_name.upper(), title_style))
-    story.append(Paragraph("DONATION RECEIPT CUM 80G CERTIFICATE", subtitle_style))
-    story.append(HRFlowable(width="100%", thickness=2, color=primary_color, spaceAfter=6*mm))
-
-    # ── Receipt number & date
-    receipt_no = f"DFG/{donation_date.year}/{donation_id:05d}"
-    meta_data = [
-        [Paragraph("Receipt No:", label_style), Paragraph(receipt_no, value_style),
-         Paragraph("Date:", label_style), Paragraph(donation_date.strftime("%d %B %Y"), value_style)],
-        [Paragraph("Transaction ID:", label_style), Paragraph(f"{gateway.upper()}: {transaction_id}", value_style),
-         Paragraph("Payment Mode:", label_style), Paragraph(gateway.upper(), value_style)],
-    ]
-    meta_table = Table(meta_data, colWidths=[35*mm, 70*mm, 30*mm, 55*mm])
-    meta_table.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, -1), colors.HexColor("#FFF8F0")),
-        ("ROWBACKGROUNDS", (0, 0), (-1, -1), [colors.HexColor("#FFF8F0"), colors.white]),
-        ("GRID", (0, 0), (-1, -1), 0.5, colors.HexColor("#FFE0B2")),
-        ("PADDING", (0, 0), (-1, -1), 6),
-    ]))
-    story.append(meta_table)
-    story.append(Spacer(1, 5*mm))
-
-    # ── Donor details
-    story.append(Paragraph("DONOR DETAILS", ParagraphStyle(
-        "section", parent=styles["Normal"],
-        fontSize=10, fontName="Helvetica-Bold",
-        textColor=secondary_color, spaceBefore=4, spaceAfter=3,
-    )))
-    donor_data = [
-        [Paragraph("Full Name:", label_style), Paragraph(donor_name, value_style)],
-        [Paragraph("Father's Name:", label_style), Paragraph(donor_father_name or "N/A", value_style)],
-        [Paragraph("PAN Number:", label_style), Paragraph(donor_pan or "Not Provided", value_style)],
-        [Paragraph("Address:", label_style), Paragraph(
-            f"{donor_address}, {donor_city}, {donor_state} - {donor_pincode}", value_style)],
-        [Paragraph("Phone:", label_style), Paragraph(donor_phone, value_style)],
-        [Paragraph("Email:", label_style), Paragraph(donor_email, value_style)],
-    ]
-    donor_table = Table(donor_data, colWidths=[40*mm, 140*mm])
-    donor_table.setStyle(TableStyle([
-        ("GRID", (0, 0), (-1, -1), 0.5, colors.HexColor("#E0E0E0")),
-        ("PADDING", (0, 0), (-1, -1), 6),
-        ("ROWBACKGROUNDS", (0, 0), (-1, -1), [colors.white, colors.HexColor("#FAFAFA")]),
-    ]))
-    story.append(donor_table)
-    story.append(Spacer(1, 5*mm))
-
-    # ── Donation amount (prominent)
-    story.append(HRFlowable(width="100%", thickness=1, color=primary_color, spaceAfter=4*mm))
-    story.append(Paragraph(f"Donation Amount: ₹{amount:,.2f}", amount_style))
-    story.append(Paragraph(f"Purpose: {cause.title()}", ParagraphStyle(
-        "cause", parent=styles["Normal"], fontSize=10,
-        alignment=TA_CENTER, textColor=colors.grey, spaceAfter=2,
-    )))
-    story.append(HRFlowable(width="100%", thickness=1, color=primary_color, spaceAfter=5*mm))
-
-    # ── NGO details & 80G info
-    story.append(Paragraph("ORGANISATION DETAILS", ParagraphStyle(
-        "section2", parent=styles["Normal"],
-        fontSize=10, fontName="Helvetica-Bold",
-        textColor=secondary_color, spaceBefore=4, spaceAfter=3,
-    )))
-    ngo_data = [
-        [Paragraph("Organisation:", label_style), Paragraph(ngo_name, value_style)],
-        [Paragraph("PAN:", label_style), Paragraph(ngo_pan, value_style)],
-        [Paragraph("80G Registration:", label_style), Paragraph(ngo_80g_reg or "Applied/Pending", value_style)],
-        [Paragraph("12A Registration:", label_style), Paragraph(ngo_12a_reg or "Applied/Pending", value_style)],
-        [Paragraph("Address:", label_style), Paragraph(ngo_address, value_style)],
-        [Paragraph("Phone:", label_style), Paragraph(ngo_phone, value_style)],
-        [Paragraph("Email:", label_style), Paragraph(ngo_email, value_style)],
-    ]
-    ngo_table = Table(ngo_data, colWidths=[40*mm, 140*mm])
-    ngo_table.setStyle(TableStyle([
-        ("GRID", (0, 0), (-1, -1), 0.5, colors.HexColor("#E0E0E0")),
-        ("PADDING", (0, 0), (-1, -1), 6),
-        ("ROWBACKGROUNDS", (0, 0), (-1, -1), [colors.white, colors.HexColor("#FAFAFA")]),
-    ]))
-    story.append(ngo_table)
-    story.append(Spacer(1, 8*mm))
-
-    # ── Signature block
-    sig_data = [["", ""]]
-    if signature_path and Path(signature_path).exists():
-        sig_img = RLImage(signature_path, width=40*mm, height=15*mm)
-        sig_data = [[sig_img, ""]]
-    sig_table = Table(sig_data, colWidths=[95*mm, 95*mm])
-    sig_table.setStyle(TableStyle([("ALIGN", (0, 0), (-1, -1), "CENTER")]))
-    story.append(sig_table)
-
-    sig_labels = Table(
-        [[Paragraph("Authorised Signatory", label_style), Paragraph("Donor's Signature", label_style)]],
-        colWidths=[95*mm, 95*mm]
+
+def certificate_key(args: dict) -> str:
+    """Content address for a render: sha256 over all render inputs."""
+    from services.certificate_layout import image_fingerprint
+    from services.fonts import fonts_fingerprint
+    template = args["template"]
+    material = {
+        "renderer": RENDERER_VERSION,
+        **{k: v for k, v in args.items() if k != "template"},
+        "template": vars(template) if template is not None else None,
+        "logo": image_fingerprint(getattr(template, "logo_path", None)),
+        "signature": image_fingerprint(getattr(template, "signature_path", None)),
+    }
+    if fonts_fingerprint() is not None:  # keeps keys from before font_dir support unchanged
+        material["fonts"] = fonts_fingerprint()
+    digest = hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode()).hexdigest()
+    return f"80G/{digest[:2]}/{digest}.pdf"
+
+
+def certificate_key_for_donation(donation, template) -> str:
+    """Storage key the donation's certificate has (or would have), without rendering it."""
+    return certificate_key(_render_args(donation, template))
+
+
+def certificate_last_modified(donation, template) -> datetime:
+    """Latest change to anything the certificate is rendered from."""
+    stamps = [donation.created_at, donation.updated_at]
+    if template is not None:
+        stamps += [template.created_at, template.updated_at]
+    return max(s for s in stamps if s is not None)
+
+
+def certificate_for_donation(donation, template) -> tuple[str, bytes]:
+    """
+    (storage key, PDF bytes) for a donation, rendering and storing it only if
+    this exact certificate has not been produced before.
+    """
+    args = _render_args(donation, template)
+    key = certificate_key(args)
+    storage = get_certificate_storage()
+    pdf = storage.get(key)
+    cache_lookup("certificate_pdf", hit=pdf is not None)
+    if pdf is None:
+        pdf = render_80g_certificate(**args)
+        storage.put(key, pdf, content_type="application/pdf")
+    return key, pdf
+
+
+def _url_signature(donation_id: int, expires: int) -> str:
+    return hmac.new(
+        settings.secret_key.encode(), f"certificate:{donation_id}:{expires}".encode(), hashlib.sha256
+    ).hexdigest()
+
+
+def signed_certificate_url(donation_id: int) -> str:
+    expires = int(time.time()) + settings.certificate_url_ttl
+    return (
+        f"{settings.backend_url}/api/certificates/{donation_id}"
+        f"?expires={expires}&signature={_url_signature(donation_id, expires)}"
     )
-    sig_labels.setStyle(TableStyle([("ALIGN", (0, 0), (-1, -1), "CENTER")]))
-    story.append(sig_labels)
-    story.append(Spacer(1, 8*mm))
-
-    # ── Footer
-    story.append(HRFlowable(width="100%", thickness=1, color=colors.lightgrey, spaceAfter=3*mm))
-    story.append(Paragraph(thank_you, footer_style))
-    story.append(Paragraph(footer_text, footer_style))
-    story.append(Paragraph(
-        f"This certificate is computer generated and valid without physical signature. "
-        f"Verify at: {settings.ngo_website}",
-        footer_style,
-    ))
 
-    doc.build(story)
-    return str(filepath)
+
+def verify_certificate_signature(donation_id: int, expires: int, signature: str) -> bool:
+    return expires > time.time() and hmac.compare_digest(signature, _url_signature(donation_id, expires))
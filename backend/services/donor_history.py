@@ -0,0 +1,198 @@
+"""
+Donation history for signed-in donors.
+
+History is read in keyset pages (newest first, "before" the last id seen)
+over the (user_id, id) index, so a page costs the same however many
+donations the user has. The summary totals (lifetime, current financial
+year, per cause) come from DonorSummary, which set_status adjusts in the
+same transaction as every transition into or out of SUCCESS; the
+transition itself is a conditional UPDATE, so concurrent confirmations of
+one payment count it once.
+
+Donations made as a guest have no user_id. link_guest_donations claims them
+for an account whose email is verified (OAuth sign-in), matching on
+lower(donor_email) and, with link_guest_donations_by_phone, on the last ten
+digits of donor_phone. Both match expressions have partial indexes over
+unclaimed rows only, so linking is one UPDATE that touches just the
+matching rows, and its summary upsert rides in the same statement.
+
+The history ETag is derived from the user's newest donation id and latest
+updated_at, which every insert and update changes; both are read from the
+end of an index, so a dashboard poll is answered with a 304 after one cheap
+query whatever the history's length. It also changes every half
+certificate_url_ttl, so the signed certificate links on a page the client
+keeps are always valid for at least that long.
+"""
+import hashlib
+import re
+import time
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+from sqlalchemy import select, update, func, cast, literal, literal_column, or_, Integer
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from config import get_settings
+from models.donation import Donation, DonationStatus, DonationCause, guest_email_key, guest_phone_key
+from models.donor_summary import DonorSummary
+from money import to_rupees
+
+settings = get_settings()
+
+IST = ZoneInfo("Asia/Kolkata")
+
+
+def financial_year(when: datetime) -> int:
+    """Indian financial year (April-March) containing when, by its starting year."""
+    local = when.astimezone(IST)
+    return local.year if local.month >= 4 else local.year - 1
+
+
+def _financial_year_sql(created_at):
+    """financial_year as a SQL expression."""
+    local = func.timezone("Asia/Kolkata", created_at) - literal_column("INTERVAL '3 months'")
+    return cast(func.extract("year", local), Integer)
+
+
+# ── Summary maintenance ───────────────────────────────────────────────────────
+
+async def set_status(db: AsyncSession, donation: Donation, status: DonationStatus, **values) -> bool:
+    """
+    Change donation's status (and write values alongside it), adding it to (or
+    removing it from) its donor's summary when it enters (or leaves) SUCCESS.
+
+    The change is one conditional UPDATE ... RETURNING, so when two requests
+    race on the same donation (/verify and the payment.captured webhook) only
+    the one whose UPDATE matched changes the row and the summary. Returns
+    False, having written nothing, if the donation already had status. The
+    caller commits.
+    """
+    if status == DonationStatus.SUCCESS:
+        row, sign = await _transition(db, donation, status, values, Donation.status.is_distinct_from(status)), 1
+    else:
+        row, sign = await _transition(db, donation, status, values, Donation.status == DonationStatus.SUCCESS), -1
+        if row is None:
+            row, sign = await _transition(db, donation, status, values, Donation.status.is_distinct_from(status)), 0
+    if row is None:
+        return False
+    if sign and row.user_id is not None:
+        stmt = insert(DonorSummary).values(
+            user_id=row.user_id,
+            financial_year=financial_year(row.created_at or datetime.now(timezone.utc)),
+            cause=row.cause or DonationCause.GENERAL,
+            donation_count=sign,
+            amount_paise=sign * row.amount_paise,
+        )
+        await db.execute(_adding_to_summary(stmt))
+    return True
+
+
+async def _transition(db: AsyncSession, donation: Donation, status: DonationStatus, values: dict, condition):
+    """Set status and values if the row still meets condition; the row's summary fields, or None."""
+    return (await db.execute(
+        update(Donation)
+        .where(Donation.id == donation.id, condition)
+        .values(status=status, **values)
+        .returning(Donation.user_id, Donation.created_at, Donation.cause, Donation.amount_paise)
+        .execution_options(synchronize_session="fetch")
+    )).first()
+
+
+def _adding_to_summary(stmt):
+    """An INSERT into DonorSummary that adds to the existing totals on conflict."""
+    return stmt.on_conflict_do_update(
+        index_elements=[DonorSummary.user_id, DonorSummary.financial_year, DonorSummary.cause],
+        set_={
+            "donation_count": DonorSummary.donation_count + stmt.excluded.donation_count,
+            "amount_paise": DonorSummary.amount_paise + stmt.excluded.amount_paise,
+        },
+    )
+
+
+# ── Claiming guest donations ──────────────────────────────────────────────────
+
+def link_guest_donations(db: Session, user_id: int, email: str, phone: str | None = None) -> int:
+    """
+    Attach unclaimed guest donations made with email (or, with
+    link_guest_donations_by_phone, with phone) to the user, adding the
+    successful ones to the donor summary. Only call it for a verified email.
+    The caller commits. Returns the number of donations linked.
+    """
+    matches = [guest_email_key(Donation.donor_email) == email.lower()]
+    digits = re.sub(r"\D", "", phone or "")[-10:]
+    if settings.link_guest_donations_by_phone and len(digits) == 10:
+        matches.append(guest_phone_key(Donation.donor_phone) == digits)
+    linked = (
+        update(Donation)
+        .where(Donation.user_id.is_(None), or_(*matches))
+        .values(user_id=user_id)
+        .returning(Donation.created_at, Donation.cause, Donation.amount_paise, Donation.status)
+        .cte("linked")
+    )
+    year = _financial_year_sql(linked.c.created_at)
+    cause = func.coalesce(linked.c.cause, literal(DonationCause.GENERAL, Donation.cause.type))
+    totals = (
+        select(literal(user_id), year, cause, func.count(), func.sum(linked.c.amount_paise))
+        .where(linked.c.status == DonationStatus.SUCCESS)
+        .group_by(year, cause)
+    )
+    summed = _adding_to_summary(insert(DonorSummary).from_select(
+        ["user_id", "financial_year", "cause", "donation_count", "amount_paise"], totals
+    )).cte("summed")
+    return db.scalar(select(func.count()).select_from(linked).add_cte(summed))
+
+
+# ── Reads ─────────────────────────────────────────────────────────────────────
+
+async def history_etag(db: AsyncSession, user_id: int, before: int | None, limit: int) -> str:
+    last_id, last_update = (await db.execute(
+        select(func.max(Donation.id), func.max(Donation.updated_at)).where(Donation.user_id == user_id)
+    )).one()
+    link_window = int(time.time()) // max(settings.certificate_url_ttl // 2, 1)
+    material = f"{user_id}:{before}:{limit}:{last_id}:{last_update}:{link_window}"
+    return f'W/"{hashlib.sha256(material.encode()).hexdigest()[:16]}"'
+
+
+async def history_page(
+    db: AsyncSession, user_id: int, before: int | None, limit: int
+) -> tuple[list[Donation], int | None]:
+    """Up to limit donations older than id before, and the before id of the next page (None at the end)."""
+    query = select(Donation).where(Donation.user_id == user_id)
+    if before is not None:
+        query = query.where(Donation.id < before)
+    donations = (await db.scalars(query.order_by(Donation.id.desc()).limit(limit + 1))).all()
+    if len(donations) > limit:
+        return donations[:limit], donations[limit - 1].id
+    return donations, None
+
+
+async def history_summary(db: AsyncSession, user_id: int) -> dict:
+    rows = (await db.execute(
+        select(DonorSummary.financial_year, DonorSummary.cause, DonorSummary.donation_count, DonorSummary.amount_paise)
+        .where(DonorSummary.user_id == user_id)
+    )).all()
+    current_fy = financial_year(datetime.now(timezone.utc))
+    by_cause: dict[str, list[int]] = {}
+    fy_count = fy_paise = 0
+    for year, cause, count, paise in rows:
+        totals = by_cause.setdefault(cause.value, [0, 0])
+        totals[0] += count
+        totals[1] += paise
+        if year == current_fy:
+            fy_count += count
+            fy_paise += paise
+    return {
+        "lifetime": {
+            "count": sum(count for count, _ in by_cause.values()),
+            "amount": to_rupees(sum(paise for _, paise in by_cause.values())),
+        },
+        "current_fy": {
+            "year": f"{current_fy}-{(current_fy + 1) % 100:02d}",
+            "count": fy_count,
+            "amount": to_rupees(fy_paise),
+        },
+        "by_cause": {
+            cause: {"count": count, "amount": to_rupees(paise)}
+            for cause, (count, paise) in by_cause.items() if count
+        },
+    }
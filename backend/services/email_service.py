@@ -1,54 +1,89 @@
+import logging
 import smtplib
 import ssl
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
-from pathlib import Path
+from decimal import Decimal
 from config import get_settings
+from metrics import observe_upstream
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+def _build_message(
+    to_email: str,
+    subject: str,
+    html_body: str,
+    attachment: bytes | None = None,
+    attachment_name: str | None = None,
+) -> MIMEMultipart:
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+    msg["From"] = f"{settings.email_from_name} <{settings.support_email}>"
+    msg["To"] = to_email
+    msg["Bcc"] = settings.support_email  # always BCC support
+
+    msg.attach(MIMEText(html_body, "html"))
+
+    if attachment:
+        part = MIMEApplication(attachment, Name=attachment_name or "certificate.pdf")
+        part["Content-Disposition"] = f'attachment; filename="{attachment_name or "certificate.pdf"}"'
+        msg.attach(part)
+    return msg
+
+
+def _smtp_connection() -> smtplib.SMTP:
+    if settings.smtp_ssl:
+        server = smtplib.SMTP_SSL(settings.smtp_host, settings.smtp_port, context=ssl.create_default_context(), timeout=30)
+    else:
+        server = smtplib.SMTP(settings.smtp_host, settings.smtp_port, timeout=30)
+    if settings.gmail_app_password:
+        server.login(settings.support_email, settings.gmail_app_password)
+    return server
 
 
 def send_email(
     to_email: str,
     subject: str,
     html_body: str,
-    attachment_path: str | None = None,
+    attachment: bytes | None = None,
     attachment_name: str | None = None,
 ) -> bool:
     """Send email via Gmail SMTP. Returns True on success."""
-    try:
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = subject
-        msg["From"] = f"{settings.email_from_name} <{settings.support_email}>"
-        msg["To"] = to_email
-        msg["Bcc"] = settings.support_email  # always BCC support
-
-        msg.attach(MIMEText(html_body, "html"))
+    return send_batch([(to_email, subject, html_body, attachment, attachment_name)])[0]
 
-        if attachment_path and Path(attachment_path).exists():
-            with open(attachment_path, "rb") as f:
-                part = MIMEApplication(f.read(), Name=attachment_name or "certificate.pdf")
-                part["Content-Disposition"] = f'attachment; filename="{attachment_name or "certificate.pdf"}"'
-                msg.attach(part)
 
-        context = ssl.create_default_context()
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465, context=context) as server:
-            server.login(settings.support_email, settings.gmail_app_password)
-            server.sendmail(settings.support_email, [to_email, settings.support_email], msg.as_string())
-
-        return True
-    except Exception as e:
-        print(f"[Email] Failed to send to {to_email}: {e}")
-        return False
+def send_batch(messages: list[tuple]) -> list[bool]:
+    """
+    Send several emails over one SMTP connection; each item holds send_email's
+    arguments. Returns per-message success.
+    """
+    results = [False] * len(messages)
+    try:
+        with observe_upstream("smtp", "send"):
+            with _smtp_connection() as server:
+                for i, args in enumerate(messages):
+                    try:
+                        msg = _build_message(*args)
+                        server.sendmail(settings.support_email, [msg["To"], settings.support_email], msg.as_string())
+                        results[i] = True
+                    except smtplib.SMTPServerDisconnected:
+                        raise
+                    except Exception:
+                        logger.exception(f"Failed to send email to {args[0]}")
+    except Exception:
+        logger.exception(f"SMTP session failed; {results.count(False)} of {len(messages)} emails not sent")
+    return results
 
 
 def send_donation_confirmation(
     donor_email: str,
     donor_name: str,
-    amount: float,
+    amount: Decimal,
     transaction_id: str,
-    certificate_path: str | None = None,
+    certificate_pdf: bytes | None = None,
 ) -> bool:
     """Send 80G certificate email to donor."""
     subject = f"Donation Receipt — Dhyan Foundation Guwahati (₹{amount:,.0f})"
@@ -89,6 +124,6 @@ def send_donation_confirmation(
         to_email=donor_email,
         subject=subject,
         html_body=html_body,
-        attachment_path=certificate_path,
+        attachment=certificate_pdf,
         attachment_name=f"80G_Certificate_{transaction_id}.pdf",
     )
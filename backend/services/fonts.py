@@ -0,0 +1,209 @@
+"""
+Unicode fonts for certificates.
+
+The standard PDF fonts (Helvetica, Times, Courier) only cover Latin-1, so a
+donor name in Devanagari (Hindi) or Bengali-Assamese script, or the ₹ sign,
+cannot be drawn with them. The TrueType fonts in font_dir are registered
+once per process, on first use, and paragraph text is split into runs by
+script: a run the paragraph's font cannot draw is set in the first
+registered font that covers its script. With uharfbuzz installed those runs
+are shaped (conjuncts, vowel-sign reordering); without it glyphs are drawn
+in logical order.
+
+backend/fonts ships Shobhika (Devanagari, OFL) and DejaVu Sans (₹). Other
+scripts need a font added there, e.g. Noto Sans Bengali for Bengali-Assamese
+names; until then they are left to the paragraph's font.
+
+Files are paired by name: "<Family>-Regular.ttf" (or "<Family>.ttf") with
+"<Family>-Bold.ttf"; a family without a bold file uses the regular face for
+both. Registered families can also be used as a template's font_family.
+
+Each document embeds a subset of every TrueType font it uses. The subset
+font files are cached per font and character set, so re-rendering a
+certificate, or a batch with repeated names, does not rebuild them.
+"""
+import hashlib
+import logging
+import re
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+from types import SimpleNamespace
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Paragraph
+from reportlab.lib.styles import ParagraphStyle
+from config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Subset font files kept per font
+SUBSET_CACHE_SIZE = 256
+
+# Unicode blocks whose runs are set in one font as a whole, so shaping sees
+# complete clusters; the sample letter picks the font that covers the script
+SCRIPTS = {
+    "devanagari": ([(0x0900, 0x097F), (0xA8E0, 0xA8FF)], "क"),
+    "bengali": ([(0x0980, 0x09FF)], "ক"),  # Bengali-Assamese
+}
+
+# Characters that stay in the font of the run they appear in: ZWNJ, ZWJ, no-break space
+_JOINERS = {"\u200c", "\u200d", "\u00a0"}
+
+_MARKUP = re.compile(r"(<[^>]*>|&#?\w+;)")
+
+
+class _SubsetCachingFont(TTFont):
+    """TTFont that builds the subset font file for a given character set only once."""
+
+    def __init__(self, name: str, filename: str):
+        super().__init__(name, filename)
+        build = self.face.makeSubset
+        cached = lru_cache(maxsize=SUBSET_CACHE_SIZE)(lambda chars: build(list(chars)))
+        self.face.makeSubset = lambda subset: cached(tuple(subset))
+
+
+@lru_cache(maxsize=1)
+def registered_families() -> dict[str, SimpleNamespace]:
+    """
+    Register every TrueType font in font_dir, once per process. Returns
+    family name -> (regular, bold) font names and the characters covered, in
+    file name order.
+    """
+    font_dir = Path(settings.font_dir)
+    files = sorted(font_dir.glob("*.ttf")) if font_dir.is_dir() else []
+    faces: dict[str, dict[str, str]] = {}
+    for path in files:
+        family, _, style = path.stem.rpartition("-")
+        if style not in ("Regular", "Bold"):
+            family, style = path.stem, "Regular"
+        try:
+            pdfmetrics.registerFont(_SubsetCachingFont(path.stem, str(path)))
+        except Exception:
+            logger.exception(f"Font {path} could not be registered")
+            continue
+        faces.setdefault(family, {})[style] = path.stem
+
+    families = {}
+    for family, styles in faces.items():
+        regular = styles.get("Regular") or styles["Bold"]
+        bold = styles.get("Bold", regular)
+        pdfmetrics.registerFontFamily(regular, normal=regular, bold=bold, italic=regular, boldItalic=bold)
+        families[family] = SimpleNamespace(
+            regular=regular, bold=bold, chars=pdfmetrics.getFont(regular).face.charToGlyph.keys(),
+        )
+    if families:
+        logger.info(f"Registered certificate fonts: {', '.join(families)}")
+    return families
+
+
+@lru_cache(maxsize=1)
+def fonts_fingerprint() -> str | None:
+    """Identifies the registered font files by content, for certificate storage keys."""
+    if not registered_families():
+        return None
+    material = sorted(
+        f"{p.name}:{hashlib.sha256(p.read_bytes()).hexdigest()}" for p in Path(settings.font_dir).glob("*.ttf")
+    )
+    return hashlib.sha256("\n".join(material).encode()).hexdigest()[:16]
+
+
+@lru_cache(maxsize=4096)
+def _covers(font_name: str, char: str) -> bool:
+    face = getattr(pdfmetrics.getFont(font_name), "face", None)
+    if hasattr(face, "charToGlyph"):
+        return ord(char) in face.charToGlyph
+    try:
+        char.encode("cp1252")  # standard fonts use WinAnsiEncoding
+        return True
+    except UnicodeEncodeError:
+        return False
+
+
+def _wanted(char: str) -> str:
+    """The character a font must cover to draw char: its script's sample letter, or char itself."""
+    code = ord(char)
+    for blocks, sample in SCRIPTS.values():
+        if any(first <= code <= last for first, last in blocks):
+            return sample
+    return char
+
+
+@lru_cache(maxsize=4096)
+def _fallback(char: str, bold: bool) -> str | None:
+    """Registered font for a character the base font lacks, or None to leave it to the base font."""
+    wanted = _wanted(char)
+    for family in registered_families().values():
+        if ord(wanted) in family.chars:
+            return family.bold if bold else family.regular
+    return None
+
+
+def text_runs(text: str, base: str) -> list[tuple[str, str]]:
+    """
+    (font name, text) runs of plain text: base wherever it can draw the
+    text, fallbacks elsewhere. Spaces, digits and punctuation following a
+    fallback run stay in its font if it has them, so the run's words are in
+    a single font.
+    """
+    bold = base.endswith("-Bold")
+    runs: list[list] = []
+    for char in text:
+        wanted = _wanted(char)
+        previous = runs[-1][0] if runs else base
+        if wanted != char:  # script letter or sign
+            font = base if _covers(base, wanted) else _fallback(char, bold) or base
+        elif previous != base and (char in _JOINERS or (not char.isalpha() and _covers(previous, char))):
+            font = previous
+        elif _covers(base, char):
+            font = base
+        else:
+            font = _fallback(char, bold) or base
+        if runs and runs[-1][0] == font:
+            runs[-1][1] += char
+        else:
+            runs.append([font, char])
+    return [(font, run) for font, run in runs]
+
+
+def _mixed_words(runs: list[tuple[str, str]]) -> bool:
+    """Whether a font changes inside a word; ReportLab shapes each word with the font it starts in."""
+    return any(
+        font != next_font and not run[-1].isspace() and not next_run[0].isspace()
+        for (font, run), (next_font, next_run) in zip(runs, runs[1:])
+    )
+
+
+def paragraph(text: str, style: ParagraphStyle) -> Paragraph:
+    """
+    Paragraph of text (which may contain markup) with the runs style's font
+    cannot draw set in fallback fonts. Shaping works from the paragraph's
+    font, so when there are fallback runs the first one becomes the
+    paragraph font and the base-font runs are tagged instead. A paragraph
+    with a mixed-font word is not shaped.
+    """
+    if text.isascii() or not registered_families():
+        return Paragraph(text, style)
+    base = style.fontName
+    tokens = []  # (text or tag, its runs; None for tags)
+    for i, token in enumerate(_MARKUP.split(text)):
+        if not i % 2:
+            tokens.append((token, text_runs(token, base)))
+        elif token.startswith("&"):  # entity
+            tokens.append((token, [(base, token)]))
+        else:
+            tokens.append((token, None))
+    runs = [run for _, token_runs in tokens if token_runs for run in token_runs if run[1]]
+    fallbacks = [font for font, _ in runs if font != base]
+    if not fallbacks:
+        return Paragraph(text, style)
+    primary = fallbacks[0]
+    markup = "".join(
+        token if token_runs is None else "".join(
+            run if font == primary else f'<font name="{font}">{run}</font>' for font, run in token_runs
+        )
+        for token, token_runs in tokens
+    )
+    shaping = 0 if _mixed_words(runs) else 1
+    return Paragraph(markup, ParagraphStyle(style.name, parent=style, fontName=primary, shaping=shaping))
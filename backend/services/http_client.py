@@ -0,0 +1,24 @@
+"""
+Shared httpx client for outbound API calls (Cashfree, Prokerala, health probes).
+Reusing one client keeps TLS connections alive instead of a handshake per call.
+"""
+import httpx
+
+_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(15, connect=5),
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=10),
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,132 @@
+"""
+Logo and signature uploads for the certificate template.
+
+Uploads are copied to disk in chunks (never held in memory whole) and capped
+at upload_max_bytes in a temporary file outside the served uploads directory,
+then normalised once with Pillow: EXIF rotation applied, downscaled to fit
+their box on the certificate at certificate_image_dpi (aspect ratio kept),
+and re-encoded as JPEG (or PNG when the image has transparency, e.g. a
+signature). Renders then embed a small image instead of decoding a camera
+original.
+
+The result goes to certificate storage under images/, named by its content
+hash, so every instance can render with it, re-uploading the same image
+reuses the object and a new image gets a new name (and therefore a new
+certificate storage key). Renderers fetch it into a local cache once per
+instance (image_file). Templates from before keep their paths under
+uploads/, which are read from local disk as before.
+"""
+import hashlib
+import io
+import os
+import tempfile
+from pathlib import Path
+import aiofiles
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from config import get_settings
+from services.storage import get_certificate_storage
+
+settings = get_settings()
+
+UPLOAD_DIR = Path("uploads")  # images of templates from before certificate storage held them
+UPLOAD_DIR.mkdir(exist_ok=True)
+
+IMAGE_PREFIX = "images/"
+# Local copies of stored images; names are content hashes, so a copy never goes stale
+IMAGE_CACHE_DIR = Path(tempfile.gettempdir()) / "certificate-images"
+
+CHUNK_SIZE = 1024 * 1024
+
+# Width x height of each image's box on the certificate, mm
+IMAGE_BOXES_MM = {
+    "logo": (60, 20),
+    "signature": (40, 15),
+}
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class InvalidImage(Exception):
+    pass
+
+
+async def save_certificate_image(file: UploadFile, kind: str) -> str:
+    """Store an uploaded logo/signature, normalised; returns its certificate storage key."""
+    limit = settings.upload_max_bytes
+    if file.size is not None and file.size > limit:
+        raise UploadTooLarge(f"Image must be at most {limit // (1024 * 1024)} MB")
+    # Staged outside UPLOAD_DIR: nothing unvalidated is ever served from /uploads
+    fd, tmp = tempfile.mkstemp(prefix="upload_")
+    os.close(fd)
+    try:
+        size = 0
+        async with aiofiles.open(tmp, "wb") as f:
+            while chunk := await file.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > limit:
+                    raise UploadTooLarge(f"Image must be at most {limit // (1024 * 1024)} MB")
+                await f.write(chunk)
+        return await run_in_threadpool(normalize_image, tmp, kind)
+    finally:
+        Path(tmp).unlink(missing_ok=True)
+
+
+def _target_size(kind: str) -> tuple[int, int]:
+    width_mm, height_mm = IMAGE_BOXES_MM[kind]
+    dpi = settings.certificate_image_dpi
+    return round(width_mm / 25.4 * dpi), round(height_mm / 25.4 * dpi)
+
+
+def normalize_image(src: str | Path, kind: str) -> str:
+    from PIL import Image, ImageOps, UnidentifiedImageError
+    box_w, box_h = _target_size(kind)
+    try:
+        with Image.open(src) as img:
+            img.draft("RGB", (box_w, box_h))  # JPEG: decode at a reduced scale directly
+            img = ImageOps.exif_transpose(img)
+            has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+            img = img.convert("RGBA" if has_alpha else "RGB")
+            img.thumbnail((box_w, box_h), Image.LANCZOS)  # fits the box, keeps the aspect ratio
+            out = io.BytesIO()
+            if has_alpha:
+                img.save(out, "PNG", optimize=True)
+            else:
+                img.save(out, "JPEG", quality=90, optimize=True)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise InvalidImage("File is not a readable image") from e
+
+    data = out.getvalue()
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    key = f"{IMAGE_PREFIX}{kind}_{digest}.{'png' if has_alpha else 'jpg'}"
+    get_certificate_storage().put(key, data, content_type="image/png" if has_alpha else "image/jpeg")
+    return key
+
+
+def image_file(ref: str | None) -> Path | None:
+    """
+    Local file for a template's logo_path/signature_path, or None if there is
+    no such image: a storage key is fetched into IMAGE_CACHE_DIR on first use,
+    any other value is a path on this instance's disk.
+    """
+    if not ref:
+        return None
+    if not ref.startswith(IMAGE_PREFIX):
+        path = Path(ref)
+        return path if path.is_file() else None
+    name = ref.removeprefix(IMAGE_PREFIX)
+    if "/" in name:
+        return None
+    path = IMAGE_CACHE_DIR / name
+    if not path.is_file():
+        data = get_certificate_storage().get(ref)
+        if data is None:
+            return None
+        IMAGE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=IMAGE_CACHE_DIR, prefix=".tmp_")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return path
@@ -0,0 +1,149 @@
+"""
+Outbound notification queue.
+
+Request handlers enqueue emails and return at once; a single worker thread
+drains the queue and sends whatever has accumulated (up to
+notification_batch_size) over one SMTP connection, so a signup never waits on
+an SMTP handshake and a slow or down mail server only delays mail. Messages
+that fail are retried up to MAX_ATTEMPTS times with a growing pause; a full
+queue drops new messages with a logged warning rather than blocking requests.
+
+The queue is in memory: mail still queued when the process is killed is lost.
+stop() drains it on a normal shutdown.
+"""
+import logging
+import queue
+import threading
+from dataclasses import dataclass
+from html import escape
+from string import Template
+from config import get_settings
+from metrics import BACKGROUND_TASKS, BACKGROUND_FAILURES
+from services.email_service import send_batch
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+RETRY_DELAY_SECONDS = 5
+
+_queue: queue.Queue = queue.Queue(maxsize=settings.notification_queue_size)
+_worker: threading.Thread | None = None
+_worker_lock = threading.Lock()
+_stopping = threading.Event()
+
+
+@dataclass
+class Notification:
+    kind: str        # metrics label, e.g. "welcome_email"
+    to_email: str
+    subject: str
+    html_body: str
+    attempts: int = 0
+
+
+# ── Templates ─────────────────────────────────────────────────────────────────
+
+WELCOME_TEMPLATE = Template("""
+    <div style="font-family:Arial,sans-serif;max-width:600px;margin:0 auto;padding:20px">
+      <div style="background:linear-gradient(135deg,#FF6B00,#2D6A4F);padding:30px;border-radius:8px 8px 0 0;text-align:center">
+        <h1 style="color:white;margin:0">Welcome to Dhyan Foundation Guwahati!</h1>
+      </div>
+      <div style="background:#fff8f0;padding:30px;border:1px solid #ffe0b2;border-top:none">
+        <p>Dear <strong>$name</strong>,</p>
+        <p>Your account has been created successfully$via.</p>
+        <p>You can now:</p>
+        <ul>
+          <li>Make tax-deductible donations (Section 80G)</li>
+          <li>Auto-receive your 80G certificates by email</li>
+          <li>Explore our Astrology Corner</li>
+          <li>Track your donation history</li>
+        </ul>
+        <p style="color:#666;font-size:13px">
+          Please complete your profile (PAN, address, etc.) before making a donation
+          so your 80G certificate can be generated correctly.
+        </p>
+        <p>🙏 Thank you for supporting Gau Seva!</p>
+      </div>
+    </div>
+    """)
+
+
+def queue_welcome_email(email: str, name: str | None, oauth_provider: str | None) -> None:
+    via = f" using <strong>{escape(oauth_provider)}</strong> sign-in" if oauth_provider else ""
+    html = WELCOME_TEMPLATE.substitute(name=escape(name or email), via=via)
+    enqueue(Notification("welcome_email", email, "Welcome to Dhyan Foundation Guwahati", html))
+
+
+# ── Queue and worker ──────────────────────────────────────────────────────────
+
+def enqueue(notification: Notification) -> None:
+    _ensure_worker()
+    try:
+        _queue.put_nowait(notification)
+        BACKGROUND_TASKS.labels(notification.kind).inc()
+    except queue.Full:
+        BACKGROUND_FAILURES.labels(notification.kind).inc()
+        logger.warning(f"Notification queue full; dropped {notification.kind} to {notification.to_email}")
+
+
+def _next_batch() -> list[Notification]:
+    """Block for the first message, then take whatever else is already queued."""
+    while True:
+        try:
+            batch = [_queue.get(timeout=1)]
+            break
+        except queue.Empty:
+            if _stopping.is_set():
+                return []
+    while len(batch) < settings.notification_batch_size:
+        try:
+            batch.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _run() -> None:
+    while batch := _next_batch():
+        results = send_batch([(n.to_email, n.subject, n.html_body) for n in batch])
+        failed = [n for n, ok in zip(batch, results) if not ok]
+        for n, ok in zip(batch, results):
+            BACKGROUND_TASKS.labels(n.kind).dec()
+            if not ok:
+                n.attempts += 1
+                if n.attempts >= MAX_ATTEMPTS or _stopping.is_set():
+                    BACKGROUND_FAILURES.labels(n.kind).inc()
+                    logger.error(f"Giving up on {n.kind} to {n.to_email} after {n.attempts} attempts")
+                    failed.remove(n)
+        if failed:
+            _stopping.wait(RETRY_DELAY_SECONDS * max(n.attempts for n in failed))
+            for n in failed:
+                enqueue(n)
+
+
+def _ensure_worker() -> None:
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _stopping.clear()
+            _worker = threading.Thread(target=_run, name="notification-worker", daemon=True)
+            _worker.start()
+
+
+def start() -> None:
+    _ensure_worker()
+
+
+def stop(timeout: float = 10) -> None:
+    """Send what is queued (giving up on retries), then stop the worker."""
+    global _worker
+    if _worker is None:
+        return
+    _stopping.set()
+    _worker.join(timeout)
+    if _worker.is_alive():
+        logger.warning(f"Notification worker still busy after {timeout}s; {_queue.qsize()} emails unsent")
+    _worker = None
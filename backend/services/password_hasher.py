@@ -0,0 +1,112 @@
+"""
+Password hashing off the request path.
+
+bcrypt costs ~100ms+ of CPU per call by design. Running it in FastAPI's
+threadpool lets a burst of logins hold the GIL and the threads every other
+sync endpoint needs, so hashing goes to a small dedicated process pool
+instead. At most hasher_max_pending calls may be queued or running; beyond
+that HasherBusy is raised and the auth routes answer 429, so a login flood
+degrades to rejected logins rather than a slow site.
+
+Hashes are produced at bcrypt_rounds. verify_and_update() reports a fresh hash
+when a stored one was made at a different cost, so raising bcrypt_rounds
+upgrades users transparently as they log in.
+"""
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_executor: ProcessPoolExecutor | None = None
+_pending = 0
+
+
+class HasherBusy(Exception):
+    """Too many hash/verify calls are already queued."""
+
+
+# ── Worker side (runs in the pool processes) ──────────────────────────────────
+
+@lru_cache()
+def _context(rounds: int):
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+
+def _verify_and_update(password: str, hashed: str, rounds: int) -> tuple[bool, str | None]:
+    return _context(rounds).verify_and_update(password, hashed)
+
+
+def _warm(rounds: int) -> None:
+    _context(rounds)  # the context itself stays in the worker; it is not picklable
+
+
+# ── Caller side ───────────────────────────────────────────────────────────────
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: forking a process that already runs an event loop and DB pools is unsafe
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.hasher_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+async def _submit(fn, *args):
+    global _pending
+    if _pending >= settings.hasher_max_pending:
+        raise HasherBusy()
+    _pending += 1
+    try:
+        executor = _get_executor()
+        try:
+            return await asyncio.wrap_future(executor.submit(fn, *args))
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed) and took the pool with it; replace it once
+            logger.warning("Password hasher pool is broken, starting a new one")
+            _discard(executor)
+            return await asyncio.wrap_future(_get_executor().submit(fn, *args))
+    finally:
+        _pending -= 1
+
+
+def _discard(executor: ProcessPoolExecutor) -> None:
+    global _executor
+    if _executor is executor:  # concurrent callers share one replacement
+        _executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def hash_password(password: str) -> str:
+    return await _submit(_hash, password, settings.bcrypt_rounds)
+
+
+async def verify_and_update(password: str, hashed: str) -> tuple[bool, str | None]:
+    """(matches, new_hash); new_hash is set when the stored hash should be replaced."""
+    return await _submit(_verify_and_update, password, hashed, settings.bcrypt_rounds)
+
+
+def start() -> None:
+    """Spawn the worker processes ahead of the first login."""
+    executor = _get_executor()
+    for _ in range(settings.hasher_workers):
+        executor.submit(_warm, settings.bcrypt_rounds)
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -1,39 +1,47 @@
 import hmac
 import hashlib
-import razorpay
+import logging
+from functools import lru_cache
 from config import get_settings
+from metrics import observe_upstream
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 
+@lru_cache()
 def get_razorpay_client():
+    """One client per process, so its requests session keeps connections alive."""
+    import razorpay  # ~0.1 s to import, so deferred to the first gateway call (or health.preload)
     return razorpay.Client(auth=(settings.razorpay_key_id, settings.razorpay_key_secret))
 
 
-def create_order(amount_inr: float, receipt: str, notes: dict = None) -> dict:
-    """Create a Razorpay order. Amount in INR (converted to paise internally)."""
+def create_order(amount_paise: int, receipt: str, notes: dict = None) -> dict:
+    """Create a Razorpay order. Amount in paise."""
     client = get_razorpay_client()
-    order = client.order.create({
-        "amount": int(amount_inr * 100),  # paise
-        "currency": "INR",
-        "receipt": receipt,
-        "notes": notes or {},
-    })
+    with observe_upstream("razorpay", "order.create"):
+        order = client.order.create({
+            "amount": amount_paise,
+            "currency": "INR",
+            "receipt": receipt,
+            "notes": notes or {},
+        })
     return order
 
 
-def create_subscription_plan(amount_inr: float, plan_name: str) -> dict:
-    """Create or reuse a monthly plan."""
+def create_subscription_plan(amount_paise: int, plan_name: str) -> dict:
+    """Create or reuse a monthly plan. Amount in paise."""
     client = get_razorpay_client()
-    plan = client.plan.create({
-        "period": "monthly",
-        "interval": 1,
-        "item": {
-            "name": plan_name,
-            "amount": int(amount_inr * 100),
-            "currency": "INR",
-        },
-    })
+    with observe_upstream("razorpay", "plan.create"):
+        plan = client.plan.create({
+            "period": "monthly",
+            "interval": 1,
+            "item": {
+                "name": plan_name,
+                "amount": amount_paise,
+                "currency": "INR",
+            },
+        })
     return plan
 
 
@@ -48,7 +56,8 @@ def create_subscription(plan_id: str, total_count: int = 120, notify_email: str
     }
     if notify_email:
         payload["notify_email"] = notify_email
-    sub = client.subscription.create(payload)
+    with observe_upstream("razorpay", "subscription.create"):
+        sub = client.subscription.create(payload)
     return sub
 
 
@@ -81,7 +90,31 @@ def fetch_payment_details(payment_id: str) -> dict:
     """
     client = get_razorpay_client()
     try:
-        return client.payment.fetch(payment_id)
-    except Exception as e:
-        print(f"[Razorpay] Failed to fetch payment {payment_id}: {e}")
+        with observe_upstream("razorpay", "payment.fetch"):
+            return client.payment.fetch(payment_id)
+    except Exception:
+        logger.exception(f"Failed to fetch Razorpay payment {payment_id}")
         return {}
+
+
+def fetch_settlement_report(year: int, month: int, day: int | None = None, page_size: int = 1000) -> list[dict]:
+    """
+    Fetch the combined settlement recon report for a day (or a whole month).
+    Pages through the report in `page_size` chunks so a busy day costs a
+    handful of requests instead of one payment.fetch per transaction.
+    fee and tax are in paise, settled_at is a unix timestamp.
+    """
+    client = get_razorpay_client()
+    params = {"year": year, "month": month, "count": page_size}
+    if day is not None:
+        params["day"] = day
+    items: list[dict] = []
+    skip = 0
+    while True:
+        with observe_upstream("razorpay", "settlement.report"):
+            page = client.settlement.report({**params, "skip": skip})
+        batch = page.get("items", [])
+        items.extend(batch)
+        if len(batch) < page_size:
+            return items
+        skip += page_size
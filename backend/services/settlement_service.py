@@ -0,0 +1,128 @@
+"""
+Settlement reconciliation: pulls Razorpay's settlement recon report in bulk and
+applies fees, tax, net receivable and settlement ids to PaymentTransaction rows.
+
+The report rows are loaded into a temporary staging table and joined against
+payment_transactions on gateway_payment_id, so a whole day is reconciled with
+one set-based UPDATE instead of a payment.fetch per transaction.
+"""
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+from sqlalchemy import (
+    Table, Column, MetaData, String, BigInteger, DateTime,
+    select, update, func, exists, and_,
+)
+from sqlalchemy.orm import Session
+from models.payment_transaction import PaymentTransaction
+from money import to_rupees
+
+# Settlement days are Indian business days
+IST = ZoneInfo("Asia/Kolkata")
+
+
+def _staging_table() -> Table:
+    return Table(
+        "settlement_recon_staging",
+        MetaData(),
+        Column("payment_id", String(255), primary_key=True),
+        Column("fee", BigInteger, nullable=False),       # paise, includes tax
+        Column("tax", BigInteger, nullable=False),       # paise
+        Column("settlement_id", String(255)),
+        Column("settlement_utr", String(255)),
+        Column("settled_at", DateTime(timezone=True)),
+        prefixes=["TEMPORARY"],
+        postgresql_on_commit="DROP",
+    )
+
+
+def _staging_rows(report_items: list[dict]) -> list[dict]:
+    """Keep settled payment rows only (refunds/adjustments carry their own entity ids)."""
+    rows = {}
+    for item in report_items:
+        if item.get("type") != "payment" or not item.get("settled"):
+            continue
+        settled_at = item.get("settled_at")
+        rows[item["entity_id"]] = {
+            "payment_id": item["entity_id"],
+            "fee": item.get("fee") or 0,
+            "tax": item.get("tax") or 0,
+            "settlement_id": item.get("settlement_id"),
+            "settlement_utr": item.get("settlement_utr"),
+            "settled_at": datetime.fromtimestamp(settled_at, tz=timezone.utc) if settled_at else None,
+        }
+    return list(rows.values())
+
+
+def reconcile_report(db: Session, report_items: list[dict]) -> dict:
+    """
+    Apply a settlement recon report to payment_transactions in one transaction.
+    Returns counts of report rows, matched transactions and unmatched payment ids.
+    """
+    rows = _staging_rows(report_items)
+    if not rows:
+        return {"report_rows": 0, "reconciled": 0, "unmatched": 0}
+
+    staging = _staging_table()
+    txn = PaymentTransaction.__table__
+    conn = db.connection()
+    staging.create(conn)
+    conn.execute(staging.insert(), rows)
+
+    # Razorpay's fee already includes GST, so fee - tax is the gateway's own charge
+    result = conn.execute(
+        update(txn)
+        .where(txn.c.gateway_payment_id == staging.c.payment_id)
+        .values(
+            gateway_fee_paise=staging.c.fee - staging.c.tax,
+            gateway_tax_paise=staging.c.tax,
+            gateway_total_deduction_paise=staging.c.fee,
+            net_receivable_paise=txn.c.gross_amount_paise - staging.c.fee,
+            settlement_id=staging.c.settlement_id,
+            settlement_utr=staging.c.settlement_utr,
+            settled_at=staging.c.settled_at,
+            reconciled_at=func.now(),
+        )
+    )
+    unmatched = conn.execute(
+        select(func.count()).select_from(staging).where(
+            ~exists().where(txn.c.gateway_payment_id == staging.c.payment_id)
+        )
+    ).scalar_one()
+    db.commit()
+    return {"report_rows": len(rows), "reconciled": result.rowcount, "unmatched": unmatched}
+
+
+def settlement_ledger(db: Session, day: date) -> list[dict]:
+    """Per-settlement totals (in rupees) for transactions settled on `day` (IST)."""
+    txn = PaymentTransaction.__table__
+    start = datetime.combine(day, time.min, tzinfo=IST)
+    rows = db.execute(
+        select(
+            txn.c.settlement_id,
+            txn.c.settlement_utr,
+            func.count().label("payments"),
+            func.sum(txn.c.gross_amount_paise).label("gross_amount"),
+            func.sum(txn.c.gateway_fee_paise).label("gateway_fee"),
+            func.sum(txn.c.gateway_tax_paise).label("gateway_tax"),
+            func.sum(txn.c.net_receivable_paise).label("net_receivable"),
+        )
+        .where(and_(
+            txn.c.settlement_id.isnot(None),
+            txn.c.settled_at >= start,
+            txn.c.settled_at < start + timedelta(days=1),
+        ))
+        .group_by(txn.c.settlement_id, txn.c.settlement_utr)
+        .order_by(txn.c.settlement_id)
+    ).all()
+    return [
+        {
+            "settlement_id": r.settlement_id,
+            "settlement_utr": r.settlement_utr,
+            "payments": r.payments,
+            "gross_amount": to_rupees(r.gross_amount),
+            "gateway_fee": to_rupees(r.gateway_fee),
+            "gateway_tax": to_rupees(r.gateway_tax),
+            "net_receivable": to_rupees(r.net_receivable),
+        }
+        for r in rows
+    ]
@@ -0,0 +1,108 @@
+"""
+Blob storage for generated certificates and the template images they are
+rendered with.
+
+LocalStorage writes under a directory on this instance's disk; S3Storage
+talks to any S3-compatible service (AWS S3, MinIO, Cloudflare R2 via
+s3_endpoint_url) so several instances can share one store. boto3 is only
+installed with requirements-s3.txt. Keys are chosen by the caller;
+certificates and images use content-addressed keys (see certificate_service
+and image_service), so a stored object never changes once written.
+"""
+import logging
+import os
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+from config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class LocalStorage:
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def get(self, key: str) -> bytes | None:
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes, content_type: str = "application/octet-stream") -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write-then-rename so a concurrent reader never sees a partial file
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def check(self) -> str:
+        try:
+            with tempfile.NamedTemporaryFile(dir=self.root, prefix=".probe_"):
+                pass
+            return "ok"
+        except OSError as e:
+            return f"error: {e.strerror}"
+
+
+class S3Storage:
+    def __init__(self, bucket: str, prefix: str = ""):
+        try:
+            import boto3  # optional dependency (requirements-s3.txt)
+            from botocore.config import Config
+        except ImportError as e:
+            raise RuntimeError('certificate_storage = "s3" needs boto3: pip install -r requirements-s3.txt') from e
+
+        self.bucket = bucket
+        self.prefix = prefix
+
+        def client(config: Config):
+            return boto3.client(
+                "s3",
+                endpoint_url=settings.s3_endpoint_url or None,
+                region_name=settings.s3_region or None,
+                aws_access_key_id=settings.s3_access_key_id or None,
+                aws_secret_access_key=settings.s3_secret_access_key or None,
+                config=config,
+            )
+
+        self.client = client(Config(connect_timeout=5, read_timeout=15, retries={"max_attempts": 3}))
+        # Readiness probes give up quickly instead of waiting out those retries
+        self.probe_client = client(Config(connect_timeout=2, read_timeout=2, retries={"max_attempts": 1}))
+
+    def get(self, key: str) -> bytes | None:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)["Body"].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+    def put(self, key: str, data: bytes, content_type: str = "application/octet-stream") -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data, ContentType=content_type)
+
+    def check(self) -> str:
+        try:
+            self.probe_client.head_bucket(Bucket=self.bucket)
+            return "ok"
+        except Exception as e:
+            return f"error: {type(e).__name__}"
+
+
+@lru_cache()
+def get_certificate_storage() -> LocalStorage | S3Storage:
+    if settings.certificate_storage == "s3":
+        return S3Storage(settings.s3_bucket, prefix="certificates/")
+    return LocalStorage(settings.certificate_dir)
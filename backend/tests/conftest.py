@@ -0,0 +1,114 @@
+"""
+Tests run against a real, disposable PostgreSQL database named by
+TEST_DATABASE_URL (its public schema is dropped and rebuilt), from the
+backend directory:
+
+    TEST_DATABASE_URL=postgresql://postgres@localhost/dhyan_test pytest
+
+Without TEST_DATABASE_URL every test is skipped.
+"""
+import asyncio
+import os
+import tempfile
+
+# Settings are read once, at first import, so the environment is set up before any app module is imported
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+if TEST_DATABASE_URL:
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+os.environ["RATE_LIMIT_STORAGE_URI"] = "memory://"
+os.environ["PRELOAD_ON_START"] = "false"
+os.environ["NEXTAUTH_SECRET"] = "test-nextauth-secret"
+os.environ["CERTIFICATE_DIR"] = tempfile.mkdtemp(prefix="certificates-")
+os.environ["HASHER_WORKERS"] = "1"
+os.environ["BCRYPT_ROUNDS"] = "4"
+
+import pytest
+from sqlalchemy import text
+
+
+@pytest.fixture(scope="session")
+def schema():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    from database import engine
+    import migrations
+    with engine.connect() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public"))
+        conn.commit()
+    migrations.migrate(engine)
+
+
+@pytest.fixture
+def db(schema):
+    """Session on an emptied database, with the in-process caches cleared."""
+    from database import Base, SessionLocal, engine
+    from services import auth_service, certificate_service
+    import profiling
+    with engine.connect() as conn:
+        conn.execute(text(f"TRUNCATE {', '.join(Base.metadata.tables)} RESTART IDENTITY CASCADE"))
+        conn.commit()
+    auth_service._user_cache.clear()
+    auth_service._verified_tokens.clear()
+    certificate_service.invalidate_template_cache()
+    profiling._profiles.clear()
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture(scope="session")
+def app_client(schema):
+    from fastapi.testclient import TestClient
+    import main
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def client(app_client, db):
+    return app_client
+
+
+def make_user(db, email="donor@example.com", **fields):
+    from models import User
+    user = User(email=email, is_active=True, **fields)
+    db.add(user)
+    db.commit()
+    return user
+
+
+def auth_headers(user) -> dict:
+    from services.auth_service import create_access_token
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user.id), 'email': user.email})}"}
+
+
+def make_donation(db, commit=True, **fields):
+    from models import Donation, DonationStatus, PaymentGateway
+    values = dict(
+        donor_name="Asha Das", donor_email="donor@example.com", donor_phone="9876543210",
+        amount_paise=100000, gateway=PaymentGateway.RAZORPAY, status=DonationStatus.SUCCESS,
+    )
+    values.update(fields)
+    donation = Donation(**values)
+    db.add(donation)
+    if commit:
+        db.commit()
+    return donation
+
+
+def run_async(main):
+    """
+    asyncio.run(main()) on an async pool of its own: pooled connections
+    belong to the loop that opened them (the TestClient's), so they are
+    dropped first, and the ones opened here are closed before the loop ends.
+    """
+    from database import async_engine
+    async_engine.sync_engine.dispose(close=False)
+
+    async def run():
+        try:
+            return await main()
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(run())
@@ -0,0 +1,28 @@
+import time
+from conftest import auth_headers, make_user
+from services import auth_service
+
+
+def test_me_reads_the_profile_fresh(client, db):
+    user = make_user(db, phone="9876543210")
+    headers = auth_headers(user)
+    assert client.get("/api/auth/me", headers=headers).json()["phone"] == "9876543210"
+
+    # Changed by another worker: this process's snapshot is not invalidated
+    user.phone, user.pan_number = "9123456780", "ABCDE1234F"
+    db.commit()
+    assert auth_service.cached_user(user.id) is not None
+    me = client.get("/api/auth/me", headers=headers).json()
+    assert (me["phone"], me["pan_number"]) == ("9123456780", "ABCDE1234F")
+
+
+def test_deactivation_elsewhere_applies_within_the_ttl(client, db, monkeypatch):
+    monkeypatch.setattr(auth_service.settings, "auth_cache_seconds", 0.2)
+    user = make_user(db)
+    headers = auth_headers(user)
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+
+    user.is_active = False
+    db.commit()
+    time.sleep(0.3)
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
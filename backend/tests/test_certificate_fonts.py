@@ -0,0 +1,26 @@
+import re
+from datetime import datetime
+from models import Donation, DonationCause, PaymentGateway
+from services import fonts
+from services.certificate_service import _render_args, render_80g_certificate
+
+NAME = "राम कुमार शर्मा"
+
+
+def test_shipped_fonts_cover_devanagari_and_the_rupee_sign():
+    families = fonts.registered_families()
+    assert all(ord(char) in families["Shobhika"].chars for char in NAME)
+    assert fonts.text_runs(f"{NAME}, ₹500", "Helvetica") == [
+        ("Shobhika-Regular", f"{NAME}, "), ("DejaVuSans", "₹500"),
+    ]
+
+
+def test_certificate_embeds_the_devanagari_font():
+    donation = Donation(
+        id=1, donor_name=NAME, donor_email="ram@example.com", donor_phone="9876543210", amount_paise=50000,
+        cause=DonationCause.GAUSEWA, gateway=PaymentGateway.RAZORPAY, gateway_payment_id="pay_1",
+        created_at=datetime(2025, 4, 1),
+    )
+    pdf = render_80g_certificate(**_render_args(donation, None))
+    embedded = set(re.findall(rb"/BaseFont /(?:[A-Z]{6}\+)?([\w-]+)", pdf))
+    assert b"Shobhika-Regular" in embedded or b"Shobhika-Bold" in embedded
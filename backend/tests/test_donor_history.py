@@ -0,0 +1,78 @@
+import asyncio
+from sqlalchemy import select
+from conftest import auth_headers, make_donation, make_user, run_async
+from database import AsyncSessionLocal
+from models import Donation, DonationStatus, DonorSummary
+from services.donor_history import set_status
+
+
+def summary_totals(db):
+    db.expire_all()
+    return db.execute(select(DonorSummary.donation_count, DonorSummary.amount_paise)).all()
+
+
+def test_racing_confirmations_count_once(db):
+    user = make_user(db)
+    donation_id = make_donation(db, user_id=user.id, status=DonationStatus.PENDING).id
+
+    async def race():
+        async with AsyncSessionLocal() as verify, AsyncSessionLocal() as webhook:
+            first = await verify.get(Donation, donation_id)
+            second = await webhook.get(Donation, donation_id)
+            assert first.status == second.status == DonationStatus.PENDING
+            assert await set_status(verify, first, DonationStatus.SUCCESS, gateway_payment_id="pay_1")
+            # Blocks on the row lock until the first transaction commits, then finds nothing to change
+            losing = asyncio.create_task(set_status(webhook, second, DonationStatus.SUCCESS, gateway_payment_id="pay_1"))
+            await asyncio.sleep(0.2)
+            await verify.commit()
+            assert await losing is False
+            await webhook.commit()
+
+    run_async(race)
+    assert summary_totals(db) == [(1, 100000)]
+
+
+def test_leaving_success_subtracts(db):
+    user = make_user(db)
+    donation_id = make_donation(db, user_id=user.id, status=DonationStatus.PENDING).id
+
+    async def transitions():
+        async with AsyncSessionLocal() as session:
+            donation = await session.get(Donation, donation_id)
+            assert await set_status(session, donation, DonationStatus.SUCCESS)
+            assert not await set_status(session, donation, DonationStatus.SUCCESS)
+            assert await set_status(session, donation, DonationStatus.REFUNDED)
+            assert not await set_status(session, donation, DonationStatus.REFUNDED)
+            await session.commit()
+
+    run_async(transitions)
+    assert summary_totals(db) == [(0, 0)]
+
+
+def test_verify_twice_counts_once(client, db, monkeypatch):
+    from routers import donations
+    monkeypatch.setattr(donations.razorpay_service, "verify_payment_signature", lambda *args: True)
+    monkeypatch.setattr(donations, "_process_certificate", lambda donation_id: None)
+    user = make_user(db)
+    donation = make_donation(db, user_id=user.id, status=DonationStatus.PENDING, gateway_order_id="order_1")
+    body = {"donation_id": donation.id, "gateway": "razorpay", "gateway_order_id": "order_1",
+            "gateway_payment_id": "pay_1", "gateway_signature": "sig"}
+    assert client.post("/api/donations/verify", json=body).json()["message"] == "Payment verified"
+    assert client.post("/api/donations/verify", json=body).json()["message"] == "Already verified"
+    assert summary_totals(db) == [(1, 100000)]
+
+
+def test_history_pages_and_revalidates(client, db):
+    user = make_user(db)
+    for _ in range(5):
+        make_donation(db, user_id=user.id, commit=False)
+    db.commit()
+    headers = auth_headers(user)
+    first = client.get("/api/donations/history", params={"limit": 3}, headers=headers)
+    page = first.json()
+    assert len(page["donations"]) == 3
+    rest = client.get("/api/donations/history", params={"limit": 3, "before": page["next_before"]}, headers=headers).json()
+    assert len(rest["donations"]) == 2 and rest["next_before"] is None
+    cached = client.get("/api/donations/history", params={"limit": 3},
+                        headers={**headers, "If-None-Match": first.headers["ETag"]})
+    assert cached.status_code == 304
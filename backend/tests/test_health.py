@@ -0,0 +1,32 @@
+import time
+from types import SimpleNamespace
+from conftest import run_async
+import health
+
+
+def test_warm_up_retries_until_storage_loads(db, monkeypatch):
+    attempts = []
+
+    def storage():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise OSError("bucket unreachable")
+
+    async def schema_ready():
+        pass
+
+    monkeypatch.setattr(health, "init_schema", schema_ready)
+    monkeypatch.setattr(health, "get_certificate_storage", storage)
+    monkeypatch.setattr(health, "_warm", False)
+    monkeypatch.setattr(health.settings, "db_init_retry_initial", 0.01)
+    monkeypatch.setattr(health.settings, "preload_on_start", False)
+    run_async(health.warm_up)
+    assert len(attempts) == 2
+    assert health._warm
+
+
+def test_storage_check_is_bounded(monkeypatch):
+    slow = SimpleNamespace(check=lambda: time.sleep(0.5) or "ok")
+    monkeypatch.setattr(health, "get_certificate_storage", lambda: slow)
+    monkeypatch.setattr(health, "STORAGE_CHECK_TIMEOUT", 0.05)
+    assert run_async(health._check_storage) == "error: TimeoutError"
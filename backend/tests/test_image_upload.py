@@ -0,0 +1,68 @@
+import io
+import os
+from pathlib import Path
+from PIL import Image
+from conftest import auth_headers, make_user
+from services import image_service
+from services.certificate_layout import image_fingerprint
+from services.storage import get_certificate_storage
+
+
+def image(size, fmt="PNG") -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", size, "orange").save(out, fmt)
+    return out.getvalue()
+
+
+def stored(key: str) -> Image.Image:
+    return Image.open(io.BytesIO(get_certificate_storage().get(key)))
+
+
+def test_normalize_keeps_the_aspect_ratio(tmp_path):
+    box_w, box_h = image_service._target_size("logo")
+    src = tmp_path / "square.png"
+    src.write_bytes(image((2000, 2000)))
+    with stored(image_service.normalize_image(src, "logo")) as img:
+        assert img.size == (box_h, box_h)
+    src.write_bytes(image((6000, 1000)))
+    with stored(image_service.normalize_image(src, "logo")) as img:
+        assert img.size == (box_w, round(box_w / 6))
+
+
+def test_uploads_are_kept_in_certificate_storage(client, db, monkeypatch, tmp_path):
+    monkeypatch.setattr(image_service, "IMAGE_CACHE_DIR", tmp_path / "cache")  # as on another instance
+    admin = make_user(db, email="admin@example.com", is_admin=True)
+    response = client.post("/api/admin/template/logo", headers=auth_headers(admin),
+                           files={"file": ("logo.png", image((600, 200)), "image/png")})
+    key = response.json()["logo_path"]
+    assert key.startswith("images/logo_")
+    assert image_service.image_file(key).read_bytes() == get_certificate_storage().get(key)
+
+
+def test_image_fingerprints_depend_on_content_only(tmp_path):
+    legacy = tmp_path / "logo.png"
+    legacy.write_bytes(image((600, 200)))
+    fingerprint = image_fingerprint(str(legacy))
+    os.utime(legacy, ns=(0, 0))
+    assert image_fingerprint(str(legacy)) == fingerprint
+    legacy.write_bytes(image((600, 201)))
+    assert image_fingerprint(str(legacy)) != fingerprint
+
+    key = image_service.normalize_image(legacy, "logo")
+    assert image_fingerprint(key) == image_fingerprint(str(image_service.image_file(key)))
+
+
+def test_uploads_are_staged_outside_the_served_directory(client, db, monkeypatch):
+    admin = make_user(db, email="admin@example.com", is_admin=True)
+    staged = []
+    normalize = image_service.normalize_image
+    monkeypatch.setattr(image_service, "normalize_image", lambda src, kind: staged.append(src) or normalize(src, kind))
+    before = set(image_service.UPLOAD_DIR.iterdir())
+
+    response = client.post("/api/admin/template/logo", headers=auth_headers(admin),
+                           files={"file": ("logo.png", b"not an image", "image/png")})
+
+    assert response.status_code == 400
+    assert image_service.UPLOAD_DIR.resolve() not in Path(staged[0]).resolve().parents
+    assert not Path(staged[0]).exists()
+    assert set(image_service.UPLOAD_DIR.iterdir()) == before
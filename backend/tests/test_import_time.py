@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+DEFERRED = {"reportlab", "PIL", "razorpay", "jhora", "swisseph"}
+
+
+def imported_modules() -> dict[str, int]:
+    """Top-level packages `import main` loads, with their cumulative import time in µs (from -X importtime)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True, text=True, check=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        package = name.strip().split(".")[0]
+        modules[package] = max(modules.get(package, 0), int(cumulative))
+    return modules
+
+
+def test_heavy_dependencies_are_not_imported_at_startup():
+    modules = imported_modules()
+    assert "fastapi" in modules  # the import tree was actually read
+    assert DEFERRED.isdisjoint(modules), {name: modules[name] for name in DEFERRED & modules.keys()}
@@ -0,0 +1,29 @@
+import pytest
+import main
+from config import get_settings
+
+
+@pytest.mark.parametrize("path", ["/metrics", "/metrics/db-pool"])
+def test_metrics_require_the_token(client, monkeypatch, path):
+    monkeypatch.setattr(main.settings, "metrics_token", "scrape-me")
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get(path, headers={"Authorization": "Bearer scrape-me"}).status_code == 200
+
+
+def test_pool_status_reports_the_configured_overflow(client):
+    status = client.get("/metrics/db-pool").json()
+    assert status["sync"]["max_overflow"] == status["async"]["max_overflow"] == get_settings().db_max_overflow
+
+
+@pytest.mark.parametrize("workers,max_connections", [(1, 20), (2, 20), (4, 20), (4, 100), (8, 20)])
+def test_derived_pools_fit_the_connection_budget(monkeypatch, workers, max_connections):
+    import database
+    from sqlalchemy.pool import QueuePool
+    monkeypatch.setattr(database.settings, "web_concurrency", workers)
+    monkeypatch.setattr(database.settings, "db_max_connections", max_connections)
+    monkeypatch.setattr(database.settings, "rate_limit_storage_uri", "postgres://")
+    pool = database._pool_kwargs(QueuePool)
+    per_worker = 2 * (pool["pool_size"] + pool["max_overflow"]) + database.RATE_LIMIT_CONNECTIONS
+    assert per_worker * workers <= max(max_connections, 3 * workers)  # never less than one connection each
+    assert pool["pool_size"] >= 1
@@ -0,0 +1,92 @@
+import os
+import time
+import pytest
+from jose import jwt
+from sqlalchemy import select, text
+from conftest import make_donation, make_user
+from models import Donation, DonorSummary, User
+from services.auth_service import OAUTH_ASSERTION_AUDIENCE
+from services.donor_history import link_guest_donations
+
+
+def assertion(provider="google", sub="g-123", email="donor@example.com", secret="test-nextauth-secret", ttl=60):
+    now = int(time.time())
+    claims = {"aud": OAUTH_ASSERTION_AUDIENCE, "iat": now, "exp": now + ttl, "provider": provider, "sub": sub, "email": email}
+    return jwt.encode(claims, secret, algorithm="HS256")
+
+
+def sign_in(client, token, email="donor@example.com"):
+    headers = {"X-OAuth-Assertion": token} if token else {}
+    body = {"provider": "google", "oauth_sub": "g-123", "email": email, "name": "Asha"}
+    return client.post("/api/auth/oauth", json=body, headers=headers)
+
+
+@pytest.mark.parametrize("token", [
+    None,
+    "not-a-jwt",
+    assertion(secret="someone-else"),
+    assertion(email="attacker@example.com"),
+    assertion(ttl=-10),
+    assertion(ttl=3600),
+])
+def test_oauth_requires_a_valid_assertion(client, db, token):
+    make_donation(db, user_id=None)
+    response = sign_in(client, token)
+    assert response.status_code == 401
+    assert db.scalar(select(Donation.user_id)) is None
+
+
+def test_oauth_links_guest_donations(client, db):
+    make_donation(db, user_id=None, donor_email="Donor@Example.com")
+    make_donation(db, user_id=None, donor_email="someone.else@example.com")
+    response = sign_in(client, assertion())
+    assert response.status_code == 200
+    user_id = response.json()["user_id"]
+    assert db.scalars(select(Donation.donor_email).where(Donation.user_id == user_id)).all() == ["Donor@Example.com"]
+    summary = db.scalars(select(DonorSummary)).one()
+    assert (summary.user_id, summary.donation_count, summary.amount_paise) == (user_id, 1, 100000)
+
+
+def test_password_accounts_do_not_link(client, db):
+    make_donation(db, user_id=None)
+    response = client.post("/api/auth/signup", json={"email": "donor@example.com", "name": "A", "password": "pw-123456"})
+    assert response.status_code == 200
+    assert db.scalar(select(Donation.user_id)) is None
+
+
+def test_oauth_takes_over_an_unverified_password_account(client, db):
+    make_donation(db, user_id=None)
+    password = {"email": "donor@example.com", "password": "attacker-pw-1"}
+    assert client.post("/api/auth/signup", json={**password, "name": "Not Asha"}).status_code == 200
+
+    response = sign_in(client, assertion())
+    assert response.status_code == 200
+    user = db.get(User, response.json()["user_id"])
+    assert (user.is_verified, user.hashed_password, user.oauth_sub) == (True, None, "g-123")
+    assert db.scalar(select(Donation.user_id)) == user.id
+    assert client.post("/api/auth/login", json=password).status_code == 401
+
+
+@pytest.mark.slow
+def test_linking_is_fast_on_a_large_table(db):
+    """Claiming a donor's few guest donations among LINK_TEST_ROWS (default 1M) others takes milliseconds."""
+    rows = int(os.environ.get("LINK_TEST_ROWS", 1_000_000))
+    db.execute(text("""
+        INSERT INTO donations (donor_name, donor_email, donor_phone, amount_paise, gateway, status, created_at)
+        SELECT 'Guest', 'guest' || i || '@example.com', lpad((7000000000 + i)::text, 10, '0'), 50000,
+               'RAZORPAY', 'SUCCESS', now() - i * interval '1 minute'
+        FROM generate_series(1, :rows) AS i
+    """), {"rows": rows})
+    for _ in range(5):
+        make_donation(db, user_id=None, donor_email="Donor@Example.com", commit=False)
+    db.commit()
+    db.execute(text("ANALYZE donations"))
+    user = make_user(db)
+
+    started = time.perf_counter()
+    linked = link_guest_donations(db, user.id, user.email)
+    db.commit()
+    elapsed = time.perf_counter() - started
+
+    assert linked == 5
+    assert elapsed < 0.05, f"linking took {elapsed * 1000:.1f} ms over {rows} donations"
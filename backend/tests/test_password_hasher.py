@@ -0,0 +1,13 @@
+from conftest import run_async
+from services import password_hasher
+
+
+def test_a_killed_worker_is_replaced():
+    async def login_after_crash():
+        hashed = await password_hasher.hash_password("pw-123456")
+        for process in list(password_hasher._executor._processes.values()):
+            process.kill()
+            process.join()
+        return await password_hasher.verify_and_update("pw-123456", hashed)
+
+    assert run_async(login_after_crash)[0] is True
@@ -0,0 +1,79 @@
+import os
+import sys
+import anyio.to_thread
+import pytest
+from conftest import auth_headers, make_user, run_async
+import main
+import profiling
+
+TOKEN = "profile-me"
+
+
+@pytest.fixture
+def admin(db, monkeypatch):
+    monkeypatch.setattr(profiling.settings, "profiling_token", TOKEN)
+    monkeypatch.setattr(profiling, "_sample_rate", 0.0)
+    return auth_headers(make_user(db, email="admin@example.com", is_admin=True))
+
+
+def profiled(client, method, path, headers, **kwargs):
+    response = client.request(method, path, headers={**headers, "X-Profile": TOKEN}, **kwargs)
+    return response, profiling.get_profile(int(response.headers["X-Profile-Id"]))
+
+
+@pytest.mark.parametrize("path, function", [
+    ("/api/admin/export/csv", "export_donations_csv"),  # sync endpoint
+    ("/api/admin/export/receipts?start=2025-04-01&end=2025-04-30", "iter_receipts_zip"),  # streamed sync iterator
+])
+def test_threadpool_work_is_profiled(client, admin, path, function):
+    response, profile = profiled(client, "GET", path, admin)
+    assert response.status_code == 200
+    assert function in profile["report"]
+
+
+def test_query_budget_failure_ends_the_profile(client, admin, monkeypatch):
+    monkeypatch.setitem(main.QUERY_BUDGETS, ("GET", "/api/admin/profiles"), 0)
+    monkeypatch.setattr(main.settings, "enforce_query_budgets", True)
+    response = client.get("/api/admin/profiles", headers={**admin, "X-Profile": TOKEN})
+    assert response.status_code == 500
+    assert profiling._active is None
+
+    monkeypatch.undo()
+    monkeypatch.setattr(profiling.settings, "profiling_token", TOKEN)
+    response, profile = profiled(client, "GET", "/api/admin/export/csv", admin)
+    assert profile is not None
+
+
+def test_sample_rate_is_per_worker(client, admin):
+    response = client.put("/api/admin/profiling", json={"sample_rate": 0.5}, headers=admin)
+    assert response.json() == {"sample_rate": 0.5, "scope": "worker", "worker_pid": os.getpid()}
+    assert client.get("/api/admin/profiles", headers=admin).json()["worker_pid"] == os.getpid()
+
+
+def test_profile_ends_when_the_client_leaves_before_the_body(admin):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/health/live", "raw_path": b"/health/live", "query_string": b"", "root_path": "",
+        "headers": [(b"x-profile", TOKEN.encode())], "client": ("127.0.0.1", 50000), "server": ("test", 80),
+    }
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        raise OSError("client went away")
+
+    async def request():
+        with pytest.raises(Exception):
+            await main.app(scope, receive, send)
+
+    run_async(request)
+    assert profiling._active is None
+    assert sys.getprofile() is None  # the profiler was stopped, not left hooked to the loop thread
+
+
+def test_threadpool_is_unwrapped_without_a_profile(client, admin):
+    assert client.get("/api/admin/export/csv", headers=admin).status_code == 200
+    assert anyio.to_thread.run_sync is profiling._run_sync
+    profiled(client, "GET", "/api/admin/export/csv", admin)
+    assert anyio.to_thread.run_sync is profiling._run_sync
@@ -0,0 +1,140 @@
+"""
+Every donations, certificates and admin endpoint has a QUERY_BUDGETS entry,
+and every budgeted endpoint stays within it, with cold caches. Statements are counted both as the
+middleware reports them (X-DB-Queries) and on the engines themselves, which
+also catches those run while a streamed body (CSV/ZIP export) is generated.
+"""
+import io
+import json
+from contextlib import contextmanager
+from datetime import date
+from urllib.parse import urlparse, parse_qs
+import pytest
+from PIL import Image
+from sqlalchemy import event
+from conftest import auth_headers, make_donation, make_user
+import main
+from database import engine, async_engine
+from models import DonationStatus, PaymentTransaction
+from routers import admin, donations
+from services import cashfree_service, razorpay_service
+from services.certificate_service import signed_certificate_url
+
+BUDGETED_PREFIXES = ("/api/donations", "/api/admin", "/api/certificates")
+
+
+@contextmanager
+def statements():
+    count = [0]
+
+    def counted(*args):
+        count[0] += 1
+
+    for e in (engine, async_engine.sync_engine):
+        event.listen(e, "before_cursor_execute", counted)
+    try:
+        yield count
+    finally:
+        for e in (engine, async_engine.sync_engine):
+            event.remove(e, "before_cursor_execute", counted)
+
+
+def png() -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (1200, 400), "orange").save(out, "PNG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def world(db, client, monkeypatch):
+    monkeypatch.setattr(razorpay_service, "create_order", lambda **kwargs: {"id": "order_new"})
+    monkeypatch.setattr(razorpay_service, "verify_payment_signature", lambda *args: True)
+    monkeypatch.setattr(razorpay_service, "verify_webhook_signature", lambda *args: True)
+    monkeypatch.setattr(razorpay_service, "fetch_settlement_report", lambda *args: [{
+        "type": "payment", "settled": True, "entity_id": "pay_done", "fee": 2360, "tax": 360,
+        "settlement_id": "setl_1", "settlement_utr": "UTR1", "settled_at": 1790000000,
+    }])
+    monkeypatch.setattr(cashfree_service, "verify_webhook_signature", lambda *args: True)
+    monkeypatch.setattr(donations, "_process_certificate", lambda donation_id: None)
+    monkeypatch.setattr(admin, "send_donation_confirmation", lambda **kwargs: True)
+
+    from passlib.context import CryptContext
+    make_user(db, email="login@example.com",
+              hashed_password=CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("pw-123456"))
+    donor = make_user(db)
+    admin_user = make_user(db, email="admin@example.com", is_admin=True)
+    done = make_donation(db, user_id=donor.id, gateway_order_id="order_done", gateway_payment_id="pay_done")
+    db.add(PaymentTransaction(donation_id=done.id, user_id=donor.id, gateway="razorpay",
+                              gateway_order_id="order_done", gateway_payment_id="pay_done", gross_amount_paise=100000))
+    pending = [make_donation(db, user_id=donor.id, status=DonationStatus.PENDING, gateway_order_id=f"order_{i}")
+               for i in range(3)]
+    db.commit()
+    return {"donor": auth_headers(donor), "admin": auth_headers(admin_user), "done": done.id,
+            "pending": [d.id for d in pending]}
+
+
+def certificate_link(world):
+    query = parse_qs(urlparse(signed_certificate_url(world["done"])).query)
+    return {"expires": query["expires"][0], "signature": query["signature"][0]}
+
+
+CALLS = {
+    ("POST", "/api/auth/signup"): lambda w: dict(json={"email": "new@example.com", "name": "N", "password": "pw-123456"}),
+    ("POST", "/api/auth/login"): lambda w: dict(json={"email": "login@example.com", "password": "pw-123456"}),
+    ("GET", "/api/auth/me"): lambda w: dict(headers=w["donor"]),
+    ("POST", "/api/donations/create-order"): lambda w: dict(json={
+        "amount": 500, "donor": {"name": "Asha", "email": "donor@example.com", "phone": "9876543210"}}),
+    ("POST", "/api/donations/verify"): lambda w: dict(json={
+        "donation_id": w["pending"][0], "gateway_order_id": "order_0", "gateway_payment_id": "pay_0",
+        "gateway_signature": "sig"}),
+    ("POST", "/api/donations/webhook/razorpay"): lambda w: dict(content=json.dumps({
+        "event": "payment.captured", "payload": {"payment": {"entity": {"id": "pay_1", "order_id": "order_1"}}}})),
+    ("POST", "/api/donations/webhook/cashfree"): lambda w: dict(content=json.dumps({
+        "type": "PAYMENT_SUCCESS_WEBHOOK", "data": {"order": {"order_id": "order_2"}, "payment": {"cf_payment_id": 7}}})),
+    ("GET", "/api/donations/history"): lambda w: dict(headers=w["donor"]),
+    ("GET", "/api/donations/{donation_id}/certificate"): lambda w: dict(
+        path=f"/api/donations/{w['done']}/certificate", headers=w["donor"]),
+    ("GET", "/api/certificates/{donation_id}"): lambda w: dict(
+        path=f"/api/certificates/{w['done']}", params=certificate_link(w)),
+    ("GET", "/api/admin/template"): lambda w: dict(headers=w["admin"]),
+    ("PUT", "/api/admin/template"): lambda w: dict(headers=w["admin"], json={"header_text": "80G receipt"}),
+    ("GET", "/api/admin/template/versions"): lambda w: dict(headers=w["admin"]),
+    ("POST", "/api/admin/template/logo"): lambda w: dict(
+        headers=w["admin"], files={"file": ("logo.png", png(), "image/png")}),
+    ("POST", "/api/admin/template/signature"): lambda w: dict(
+        headers=w["admin"], files={"file": ("signature.png", png(), "image/png")}),
+    ("GET", "/api/admin/donations"): lambda w: dict(headers=w["admin"]),
+    ("GET", "/api/admin/donations/summary"): lambda w: dict(headers=w["admin"]),
+    ("POST", "/api/admin/donations/{donation_id}/resend-certificate"): lambda w: dict(
+        path=f"/api/admin/donations/{w['done']}/resend-certificate", headers=w["admin"]),
+    ("GET", "/api/admin/export/csv"): lambda w: dict(headers=w["admin"]),
+    ("GET", "/api/admin/export/receipts"): lambda w: dict(
+        headers=w["admin"], params={"start": "2000-01-01", "end": date.today().isoformat()}),
+    ("POST", "/api/admin/reconcile/settlements"): lambda w: dict(headers=w["admin"], params={"day": "2026-09-15"}),
+    ("GET", "/api/admin/reconcile/ledger"): lambda w: dict(headers=w["admin"], params={"day": "2026-09-15"}),
+    ("GET", "/api/admin/profiles"): lambda w: dict(headers=w["admin"]),
+    ("GET", "/api/admin/profiles/{profile_id}"): lambda w: dict(path="/api/admin/profiles/1", headers=w["admin"]),
+    ("PUT", "/api/admin/profiling"): lambda w: dict(headers=w["admin"], json={"sample_rate": 0}),
+}
+EXPECTED_STATUS = {("GET", "/api/admin/profiles/{profile_id}"): 404}
+
+
+def test_every_endpoint_has_a_budget_and_a_call():
+    routes = {
+        (method, route.path)
+        for route in main.app.routes if getattr(route, "path", "").startswith(BUDGETED_PREFIXES)
+        for method in route.methods
+    }
+    assert routes <= set(main.QUERY_BUDGETS) == set(CALLS)
+
+
+@pytest.mark.parametrize("endpoint", sorted(CALLS), ids=" ".join)
+def test_query_budget(client, world, endpoint):
+    method, path = endpoint
+    kwargs = CALLS[endpoint](world)
+    with statements() as count:
+        response = client.request(method, kwargs.pop("path", path), **kwargs)
+    budget = main.QUERY_BUDGETS[endpoint]
+    assert response.status_code == EXPECTED_STATUS.get(endpoint, 200), response.text
+    assert int(response.headers["X-DB-Queries"]) <= budget
+    assert count[0] <= budget, f"{count[0]} statements including the streamed body (budget {budget})"
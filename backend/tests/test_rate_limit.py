@@ -0,0 +1,106 @@
+import asyncio
+import multiprocessing
+import time
+import uuid
+import httpx
+import pytest
+from limits import parse
+from limits.strategies import SlidingWindowCounterRateLimiter
+from conftest import run_async
+from config import get_settings
+from rate_limit import PostgresStorage, limiter
+
+PROCESSES = 4
+HITS_PER_PROCESS = 40
+
+
+def _hit(key: str, start, accepted) -> None:
+    """One worker process: wait for the others, then hit the shared limit as fast as possible."""
+    strategy = SlidingWindowCounterRateLimiter(PostgresStorage("postgres://"))
+    limit = parse("50/day")
+    start.wait()
+    accepted.put(sum(strategy.hit(limit, key) for _ in range(HITS_PER_PROCESS)))
+
+
+def test_limit_is_shared_exactly_across_processes(db):
+    key = f"test/{uuid.uuid4()}"
+    ctx = multiprocessing.get_context("spawn")
+    start, accepted = ctx.Barrier(PROCESSES), ctx.Queue()
+    workers = [ctx.Process(target=_hit, args=(key, start, accepted)) for _ in range(PROCESSES)]
+    for worker in workers:
+        worker.start()
+    counts = [accepted.get(timeout=60) for _ in workers]
+    for worker in workers:
+        worker.join(timeout=10)
+
+    assert sum(counts) == 50
+    strategy = SlidingWindowCounterRateLimiter(PostgresStorage("postgres://"))
+    assert strategy.get_window_stats(parse("50/day"), key).remaining == 0
+
+
+@pytest.fixture
+def fresh_limits():
+    limiter.reset()
+    yield
+    limiter.reset()
+
+
+def test_each_request_counts_once(client, fresh_limits):
+    allowed = int(get_settings().rate_limit_login.split("/")[0])
+    statuses = [
+        client.post("/api/auth/login", json={"email": "nobody@example.com", "password": "wrong-password"}).status_code
+        for _ in range(allowed + 1)
+    ]
+    assert statuses == [401] * allowed + [429]
+
+
+def test_forwarded_for_is_read_from_the_right(client, fresh_limits, monkeypatch):
+    import rate_limit
+    monkeypatch.setattr(rate_limit.settings, "trusted_proxy_hops", 1)
+    allowed = int(get_settings().rate_limit_login.split("/")[0])
+    statuses = [
+        client.post("/api/auth/login", json={"email": "nobody@example.com", "password": "wrong-password"},
+                    headers={"X-Forwarded-For": f"10.0.0.{i}, 203.0.113.7"}).status_code
+        for i in range(allowed + 1)
+    ]
+    assert statuses == [401] * allowed + [429]
+    other = client.post("/api/auth/login", json={"email": "nobody@example.com", "password": "wrong-password"},
+                        headers={"X-Forwarded-For": "203.0.113.8"})
+    assert other.status_code == 401
+
+
+def test_forwarded_for_is_ignored_without_trusted_proxies(client, fresh_limits):
+    allowed = int(get_settings().rate_limit_login.split("/")[0])
+    statuses = [
+        client.post("/api/auth/login", json={"email": "nobody@example.com", "password": "wrong-password"},
+                    headers={"X-Forwarded-For": f"198.51.100.{i}"}).status_code
+        for i in range(allowed + 1)
+    ]
+    assert statuses[-1] == 429
+
+
+def test_limit_check_does_not_block_the_event_loop(db, fresh_limits, monkeypatch):
+    import main
+    hit = limiter._limiter.hit
+
+    def slow_hit(*args, **kwargs):
+        time.sleep(0.5)  # a slow rate-limit storage round trip
+        return hit(*args, **kwargs)
+
+    monkeypatch.setattr(limiter._limiter, "hit", slow_hit)
+    live_after = None
+
+    async def requests():
+        nonlocal live_after
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as http:
+            started = time.perf_counter()
+            login = asyncio.create_task(http.post(
+                "/api/auth/login", json={"email": "nobody@example.com", "password": "wrong-password"},
+            ))
+            await asyncio.sleep(0.1)
+            assert (await http.get("/health/live")).status_code == 200
+            live_after = time.perf_counter() - started
+            assert (await login).status_code == 401
+
+    run_async(requests)
+    assert live_after < 0.4
@@ -0,0 +1,120 @@
+import json
+from datetime import date, datetime, timezone
+from conftest import auth_headers, make_donation, make_user
+from models import DonationStatus, PaymentMethod, PaymentTransaction
+from services import settlement_service
+
+
+def settle(db, payment_id, settled_at):
+    donation = make_donation(db, gateway_payment_id=payment_id)
+    db.add(PaymentTransaction(donation_id=donation.id, gateway="razorpay", gateway_payment_id=payment_id,
+                              gross_amount_paise=donation.amount_paise))
+    db.commit()
+    settlement_service.reconcile_report(db, [{
+        "type": "payment", "settled": True, "entity_id": payment_id, "fee": 2360, "tax": 360,
+        "settlement_id": f"setl_{payment_id}", "settlement_utr": "UTR1", "settled_at": int(settled_at.timestamp()),
+    }])
+
+
+def test_ledger_buckets_by_indian_date(db):
+    settle(db, "pay_evening", datetime(2025, 4, 1, 18, 0, tzinfo=timezone.utc))   # 23:30 IST on the 1st
+    settle(db, "pay_night", datetime(2025, 4, 1, 20, 0, tzinfo=timezone.utc))     # 01:30 IST on the 2nd
+
+    assert [s["settlement_id"] for s in settlement_service.settlement_ledger(db, date(2025, 4, 1))] == ["setl_pay_evening"]
+    assert [s["settlement_id"] for s in settlement_service.settlement_ledger(db, date(2025, 4, 2))] == ["setl_pay_night"]
+
+
+def test_reconcile_defaults_to_yesterday_in_india(client, db, monkeypatch):
+    from routers import admin
+
+    class Now(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2025, 4, 1, 20, 0, tzinfo=timezone.utc).astimezone(tz)  # 01:30 IST on the 2nd
+
+    requested = []
+    monkeypatch.setattr(admin, "datetime", Now)
+    monkeypatch.setattr(admin.razorpay_service, "fetch_settlement_report", lambda *day: requested.append(day) or [])
+    headers = auth_headers(make_user(db, email="admin@example.com", is_admin=True))
+    response = client.post("/api/admin/reconcile/settlements", headers=headers)
+    assert response.status_code == 200
+    assert requested == [(2025, 4, 1)]
+
+
+def test_verify_leaves_fees_to_reconciliation(client, db, monkeypatch):
+    from routers import donations
+
+    def no_fetch(payment_id):
+        raise AssertionError("verify must not call payment.fetch")
+
+    monkeypatch.setattr(donations.razorpay_service, "verify_payment_signature", lambda *args: True)
+    monkeypatch.setattr(donations.razorpay_service, "fetch_payment_details", no_fetch)
+    monkeypatch.setattr(donations, "_process_certificate", lambda donation_id: None)
+    donation = make_donation(db, status=DonationStatus.PENDING, gateway_order_id="order_1")
+    response = client.post("/api/donations/verify", json={
+        "donation_id": donation.id, "gateway": "razorpay", "gateway_order_id": "order_1",
+        "gateway_payment_id": "pay_1", "gateway_signature": "sig",
+    })
+    assert response.status_code == 200
+    assert response.json()["gateway_fee"] is None
+    txn = db.query(PaymentTransaction).filter_by(gateway_payment_id="pay_1").one()
+    assert (txn.gateway_fee_paise, txn.gateway_total_deduction_paise, txn.net_receivable_paise) == (None, None, None)
+    assert txn.payment_method is None
+    db.rollback()
+
+    settlement_service.reconcile_report(db, [{
+        "type": "payment", "settled": True, "entity_id": "pay_1", "fee": 2360, "tax": 360,
+        "settlement_id": "setl_1", "settlement_utr": "UTR1", "settled_at": 1743500000,
+    }])
+    txn = db.query(PaymentTransaction).filter_by(gateway_payment_id="pay_1").one()
+    assert (txn.gateway_fee_paise, txn.gateway_tax_paise, txn.net_receivable_paise) == (2000, 360, 97640)
+
+
+def test_payment_captured_webhook_records_the_transaction(client, db, monkeypatch):
+    from routers import donations
+    monkeypatch.setattr(donations.razorpay_service, "verify_webhook_signature", lambda *args: True)
+    monkeypatch.setattr(donations, "_process_certificate", lambda donation_id: None)
+    donation = make_donation(db, status=DonationStatus.PENDING, gateway_order_id="order_1")
+    event = {"event": "payment.captured", "payload": {"payment": {"entity": {
+        "id": "pay_1", "order_id": "order_1", "method": "upi", "vpa": "asha@upi", "fee": 2360, "tax": 360,
+    }}}}
+    for _ in range(2):  # Razorpay redelivers
+        assert client.post("/api/donations/webhook/razorpay", content=json.dumps(event)).status_code == 200
+
+    txn = db.query(PaymentTransaction).filter_by(donation_id=donation.id).one()
+    assert (txn.gateway_payment_id, txn.payment_method, txn.upi_vpa) == ("pay_1", PaymentMethod.UPI, "asha@upi")
+    assert (txn.gateway_fee_paise, txn.gateway_tax_paise, txn.net_receivable_paise) == (2000, 360, 97640)
+    result = settlement_service.reconcile_report(db, [{
+        "type": "payment", "settled": True, "entity_id": "pay_1", "fee": 2360, "tax": 360,
+        "settlement_id": "setl_1", "settlement_utr": "UTR1", "settled_at": 1743500000,
+    }])
+    assert (result["reconciled"], result["unmatched"]) == (1, 0)
+
+
+def test_webhook_completes_the_transaction_verify_recorded(client, db, monkeypatch):
+    from routers import donations
+    monkeypatch.setattr(donations.razorpay_service, "verify_payment_signature", lambda *args: True)
+    monkeypatch.setattr(donations.razorpay_service, "verify_webhook_signature", lambda *args: True)
+    monkeypatch.setattr(donations, "_process_certificate", lambda donation_id: None)
+    donation = make_donation(db, status=DonationStatus.PENDING, gateway_order_id="order_1")
+    assert client.post("/api/donations/verify", json={
+        "donation_id": donation.id, "gateway": "razorpay", "gateway_order_id": "order_1",
+        "gateway_payment_id": "pay_1", "gateway_signature": "sig",
+    }).status_code == 200
+    settlement_service.reconcile_report(db, [{
+        "type": "payment", "settled": True, "entity_id": "pay_1", "fee": 2360, "tax": 360,
+        "settlement_id": "setl_1", "settlement_utr": "UTR1", "settled_at": 1743500000,
+    }])
+
+    entity = {"id": "pay_1", "order_id": "order_1", "method": "card", "fee": 9999, "tax": 0,
+              "card": {"network": "RuPay", "last4": "4242"}, "email": "asha@example.com",
+              "contact": "+919876543210", "acquirer_data": {"rrn": "512345678901"}}
+    event = {"event": "payment.captured", "payload": {"payment": {"entity": entity}}}
+    assert client.post("/api/donations/webhook/razorpay", content=json.dumps(event)).status_code == 200
+
+    db.expire_all()
+    txn = db.query(PaymentTransaction).filter_by(donation_id=donation.id).one()
+    assert (txn.payer_email, txn.payer_contact, txn.acquirer_rrn) == ("asha@example.com", "+919876543210", "512345678901")
+    assert (txn.payment_method, txn.card_network, txn.card_last4) == (PaymentMethod.CARD, "RuPay", "4242")
+    assert (txn.gateway_fee_paise, txn.net_receivable_paise) == (2000, 97640)  # reconciled fees are kept
+    assert txn.payload.payload == entity
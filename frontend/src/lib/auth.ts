@@ -6,6 +6,38 @@ import CredentialsProvider from "next-auth/providers/credentials";
 
 const API = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8001/api";
 
+const base64url = (bytes: Uint8Array) =>
+  btoa(String.fromCharCode(...bytes)).replace(/\+/g, "-").replace(/\//g, "_").replace(/=+$/, "");
+
+// Short-lived HS256 JWT, signed with NEXTAUTH_SECRET, that lets the backend
+// trust the provider/sub/email of an OAuth sign-in (X-OAuth-Assertion).
+async function oauthAssertion(provider: string, sub: string, email: string) {
+  const enc = new TextEncoder();
+  const now = Math.floor(Date.now() / 1000);
+  const header = base64url(enc.encode(JSON.stringify({ alg: "HS256", typ: "JWT" })));
+  const payload = base64url(enc.encode(JSON.stringify({
+    aud: "dhyan-backend/oauth", iat: now, exp: now + 60, provider, sub, email,
+  })));
+  const key = await crypto.subtle.importKey(
+    "raw", enc.encode(process.env.NEXTAUTH_SECRET!), { name: "HMAC", hash: "SHA-256" }, false, ["sign"],
+  );
+  const signature = await crypto.subtle.sign("HMAC", key, enc.encode(`${header}.${payload}`));
+  return `${header}.${payload}.${base64url(new Uint8Array(signature))}`;
+}
+
+async function backendOAuthSignIn(body: {
+  provider: string; oauth_sub: string; email: string; name?: string | null; avatar_url?: string | null;
+}) {
+  return fetch(`${API}/auth/oauth`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      "X-OAuth-Assertion": await oauthAssertion(body.provider, body.oauth_sub, body.email),
+    },
+    body: JSON.stringify(body),
+  });
+}
+
 export const { handlers, signIn, signOut, auth } = NextAuth({
   providers: [
     Google({
@@ -57,16 +89,12 @@ export const { handlers, signIn, signOut, auth } = NextAuth({
       // For OAuth providers, sync user to our backend
       if (account?.provider && account.provider !== "credentials") {
         try {
-          await fetch(`${API}/auth/oauth`, {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({
-              provider: account.provider,
-              oauth_sub: account.providerAccountId,
-              email: user.email,
-              name: user.name,
-              avatar_url: user.image,
-            }),
+          await backendOAuthSignIn({
+            provider: account.provider,
+            oauth_sub: account.providerAccountId,
+            email: user.email!,
+            name: user.name,
+            avatar_url: user.image,
           });
         } catch {}
       }
@@ -81,16 +109,12 @@ export const { handlers, signIn, signOut, auth } = NextAuth({
       // For OAuth, get our backend JWT
       if (account && account.provider !== "credentials") {
         try {
-          const res = await fetch(`${API}/auth/oauth`, {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({
-              provider: account.provider,
-              oauth_sub: account.providerAccountId,
-              email: token.email,
-              name: token.name,
-              avatar_url: token.picture,
-            }),
+          const res = await backendOAuthSignIn({
+            provider: account.provider,
+            oauth_sub: account.providerAccountId,
+            email: token.email!,
+            name: token.name,
+            avatar_url: token.picture,
           });
           if (res.ok) {
             const data = await res.json();